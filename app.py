@@ -1,5 +1,6 @@
-from flask import Flask, request, render_template, redirect, url_for, flash, session, jsonify
+from flask import Flask, request, render_template, redirect, url_for, flash, session, jsonify, g, Response, stream_with_context
 import os
+import json
 import datetime
 import collections
 import time
@@ -9,6 +10,8 @@ from functools import wraps
 import bcrypt
 import firebase_admin
 from firebase_admin import credentials, firestore
+from services.firebase_service import firebase_status, report_firebase_error
+from services.repositories import AdminRepository, PlanRepository, UserRepository
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -18,15 +21,33 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'Bv5hqlS2CsklVLlN5A1bgnTIa6l3tY84zZsQQCdo7Zo')
 
-# Initialize Firebase at app startup
-try:
-    if not firebase_admin._apps:
-        firebase_admin.initialize_app(options={
-            'projectId': os.getenv("FIREBASE_PROJECT_ID")
-        })
-    logger.info("Firebase initialized successfully at startup")
-except Exception as e:
-    logger.error(f"Failed to initialize Firebase at startup: {str(e)}")
+# Firebase and Storage connect on first use; warm them up without holding up
+# startup (STARTUP_WARMUP) and report their state on /ready
+from services.startup_service import start_warmup, readiness
+start_warmup(logger.info)
+
+# Interactions are written behind in batches; starting the writer replays any
+# journal of interactions a previous run could not commit. gunicorn's master
+# imports the app before forking (APP_PRELOAD); each worker starts its own
+# writer in post_fork instead.
+from services.interaction_recorder import start_recorder, interaction_stats
+from services.signed_url_service import signed_url_stats
+if os.getenv("APP_PRELOAD") != "1":
+    start_recorder()
+
+# Per-request latency, reported in the Server-Timing header and the app log
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        response.headers['Server-Timing'] = f"app;dur={elapsed_ms:.1f}"
+        logger.info(f"{request.method} {request.path} {response.status_code} {elapsed_ms:.1f} ms")
+    return response
 
 # Admin authentication
 def admin_required(f):
@@ -47,43 +68,25 @@ def admin_login():
         logger.info(f"Login attempt for username: {username}")
         
         try:
-            # Use the simple_initialize_firebase function from the updated service
-            from services.firebase_service import simple_initialize_firebase, db, firestore
+            from services.firebase_service import get_db
             
             logger.info("Attempting to initialize Firebase...")
-            init_result = simple_initialize_firebase()
-            if not init_result:
+            db = get_db(logger.info)
+            if db is None:
                 logger.error("Failed to initialize Firebase")
                 flash('Authentication error: Firebase initialization failed')
                 return render_template("admin/login.html")
 
             logger.info("Firebase initialized successfully, proceeding with login...")
             
-            # Try to find the admin user - first check if we created it with a known ID
-            admin_user = None
-            
-            # First try to get the user with the known document ID
+            # The default admin is a direct ID lookup; anyone else is queried by username
             try:
-                admin_user_doc = db.collection('admin_users').document('admin_user').get()
-                if admin_user_doc.exists and admin_user_doc.to_dict().get('username') == username:
-                    admin_user = admin_user_doc
-                    logger.info("Found admin user with direct ID lookup")
+                logger.info(f"Looking up admin user with username: {username}...")
+                admin_user = AdminRepository(db).find_by_username(username)
             except Exception as e:
-                logger.warning(f"Error looking up admin by ID: {str(e)}")
-            
-            # If not found with direct ID, try query
-            if not admin_user:
-                try:
-                    logger.info(f"Querying admin user with username: {username}...")
-                    admin_ref = db.collection('admin_users').where('username', '==', username).limit(1)
-                    admin_docs = admin_ref.get()
-                    admin_user = next(admin_docs, None)
-                    if admin_user:
-                        logger.info("Found admin user with query")
-                except Exception as e:
-                    logger.error(f"Error retrieving admin user by query: {str(e)}")
-                    flash('Error retrieving user data')
-                    return render_template("admin/login.html")
+                logger.error(f"Error retrieving admin user: {str(e)}")
+                flash('Error retrieving user data')
+                return render_template("admin/login.html")
             
             if admin_user:
                 try:
@@ -119,9 +122,7 @@ def admin_login():
                         
                         # Update last login
                         logger.info("Updating last login timestamp...")
-                        admin_user.reference.update({
-                            'last_login': firestore.SERVER_TIMESTAMP
-                        })
+                        AdminRepository(db).record_login(admin_user.id)
                         
                         logger.info("Login successful, redirecting to dashboard...")
                         return redirect(url_for('admin_dashboard'))
@@ -147,66 +148,42 @@ def admin_login():
 @admin_required
 def admin_dashboard():
     try:
-        # Use simple_initialize_firebase instead of initialize_firebase
-        from services.firebase_service import simple_initialize_firebase, db, firestore
+        from services.firebase_service import get_db
         
-        if not simple_initialize_firebase():
+        db = get_db()
+        if db is None:
             flash('Error connecting to Firebase')
             return render_template("admin/dashboard.html", error="Firebase connection failed")
         
-        # Fetch statistics
-        stats = {
-            'total_users': 0,
-            'total_plans': 0,
-            'active_today': 0,
-            'plans_today': 0
-        }
-        
-        # Get current date for today's stats
-        today = datetime.datetime.now().date()
-        
-        users_ref = db.collection('users')
-        users = users_ref.stream()
-        
-        for user in users:
-            user_data = user.to_dict()
-            stats['total_users'] += 1
-            stats['total_plans'] += len(user_data.get('pdf_plans', []))
-            
-            # Check today's activity
-            last_activity = user_data.get('last_updated')
-            if last_activity and last_activity.date() == today:
-                stats['active_today'] += 1
-            
-            # Count today's plans
-            for plan in user_data.get('pdf_plans', []):
-                if plan.get('created_at') and plan.get('created_at').date() == today:
-                    stats['plans_today'] += 1
-        
-        # Get recent activities
-        activities = []
-        try:
-            recent_interactions = (
-                db.collectionGroup('interactions')
-                .order_by('timestamp', direction=firestore.Query.DESCENDING)
-                .limit(20)
-                .stream()
-            )
-            
-            for interaction in recent_interactions:
-                interaction_data = interaction.to_dict()
-                activities.append(interaction_data)
-        except Exception as e:
-            logger.warning(f"Error fetching recent activities: {str(e)}")
-        
+        # The counters and the recent activity come from this worker's
+        # listeners once they have reported; until then they are queried
+        from services import live_service
+        from services.async_repository import dashboard_data
+        live = live_service.latest(logger.info)
+        stats, activities = dashboard_data(live=live)
+        cost = stats['plan_summary_cost']
+        logger.info(f"Dashboard plan summary by {cost['method']}: ~{cost['reads']} reads, {cost['elapsed_ms']} ms")
+        
+        # Athlete profile distributions come from the analytics snapshot
+        from services import analytics_service
+        analytics_service.ensure_fresh(db, logger.info)
+        
+        # Cache counters are per worker; the console's own workers only look
+        # users up when it runs alongside the bot, so hide them otherwise
+        from services.user_cache import cache_stats
+        cache = cache_stats()
         return render_template(
             "admin/dashboard.html",
             stats=stats,
             activities=activities,
+            cohort=analytics_service.cohort_report(),
+            live=live_service.enabled(),
+            cache=cache if cache['lookups'] else None,
             timestamp=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         )
         
     except Exception as e:
+        report_firebase_error(e)
         logger.error(f"Dashboard error: {str(e)}")
         logger.error(traceback.format_exc())
         return render_template("admin/dashboard.html", error=str(e))
@@ -216,60 +193,55 @@ def admin_dashboard():
 @admin_required
 def admin_users():
     debug_info = []
+    from services.user_service import PAGE_SIZES, DEFAULT_PAGE_SIZE
+    
+    # Paging, sorting and filter parameters
+    page = {
+        'sort': request.args.get('sort', 'last_updated'),
+        'direction': request.args.get('direction', 'desc'),
+        'page_size': request.args.get('page_size', DEFAULT_PAGE_SIZE, type=int),
+        'cursor': request.args.get('cursor', ''),
+        'filters': {
+            'experience': request.args.get('experience', ''),
+            'sport': request.args.get('sport', '').strip(),
+            'gender': request.args.get('gender', ''),
+            'has_plans': request.args.get('has_plans', '')
+        },
+        'page_sizes': PAGE_SIZES
+    }
+    
     try:
         debug_info.append("Starting admin_users route")
         
-        # Use simple_initialize_firebase instead of initialize_firebase
-        from services.firebase_service import simple_initialize_firebase, db
+        from services.firebase_service import get_db
         
         debug_info.append("Imported Firebase services")
         
-        if not simple_initialize_firebase():
+        db = get_db()
+        if db is None:
             debug_info.append("Firebase initialization failed")
             flash('Error connecting to Firebase')
-            return render_template("admin/users.html", error="Firebase connection failed", debug_info=debug_info)
+            return render_template("admin/users.html", error="Firebase connection failed", debug_info=debug_info, **page)
 
         debug_info.append("Firebase initialized successfully")
-        users_ref = db.collection('users')
         
-        debug_info.append("Getting users stream")
-        users_stream = users_ref.stream()
+        users, next_cursor, scanned = UserRepository(db).list_page(
+            sort=page['sort'],
+            direction=page['direction'],
+            filters=page['filters'],
+            page_size=page['page_size'],
+            cursor=page['cursor']
+        )
         
-        debug_info.append("Processing users")
-        users = []
-        
-        for user in users_stream:
-            try:
-                user_data = user.to_dict()
-                
-                # Handle potential missing or malformed data
-                if not user_data:
-                    debug_info.append(f"User {user.id} has no data, skipping")
-                    continue
-                    
-                user_data['id'] = user.id
-                
-                # Sanitize user data to prevent template rendering errors
-                if 'profile' in user_data and not isinstance(user_data['profile'], dict):
-                    user_data['profile'] = {}
-                    
-                if 'pdf_plans' in user_data and not isinstance(user_data['pdf_plans'], list):
-                    user_data['pdf_plans'] = []
-                
-                users.append(user_data)
-                debug_info.append(f"Added user {user.id} to list")
-            except Exception as e:
-                debug_info.append(f"Error processing user {user.id}: {str(e)}")
-                # Continue with next user
-                continue
-            
-        debug_info.append(f"Processed {len(users)} users total")
-        return render_template("admin/users.html", users=users, debug_info=debug_info)
+        debug_info.append(f"Scanned {scanned} documents for a page of {len(users)} users")
+        return render_template("admin/users.html", users=users, next_cursor=next_cursor,
+                               debug_info=debug_info, **page)
         
     except Exception as e:
+        report_firebase_error(e)
         logger.error(f"Users page error: {str(e)}")
         logger.error(traceback.format_exc())
-        return render_template("admin/users.html", error=str(e), debug_info=debug_info)
+        return render_template("admin/users.html", error=str(e), debug_info=debug_info, **page)
     
 
 # Plans management
@@ -277,117 +249,124 @@ def admin_users():
 @admin_required
 def admin_plans():
     debug_info = []
+    cursor = request.args.get('cursor', '')
     try:
         debug_info.append("Starting admin_plans route")
         
-        # Use simple_initialize_firebase instead of initialize_firebase
-        from services.firebase_service import simple_initialize_firebase, db
+        from services.firebase_service import get_db
         
         debug_info.append("Imported Firebase services")
         
-        if not simple_initialize_firebase():
+        db = get_db()
+        if db is None:
             debug_info.append("Firebase initialization failed")
             flash('Error connecting to Firebase')
             return render_template("admin/plans.html", error="Firebase connection failed", debug_info=debug_info)
 
         debug_info.append("Firebase initialized successfully")
-        users_ref = db.collection('users')
-        
-        debug_info.append("Getting users stream")
-        users_stream = users_ref.stream()
-        
-        debug_info.append("Processing users and plans")
-        plans = []
-        user_count = 0
-        plan_count = 0
-        error_count = 0
-        
-        for user in users_stream:
-            try:
-                user_count += 1
-                user_data = user.to_dict()
-                
-                # Handle potential missing or malformed data
-                if not user_data:
-                    debug_info.append(f"User {user.id} has no data, skipping")
-                    continue
-                
-                # Handle missing or malformed pdf_plans
-                if 'pdf_plans' not in user_data or not isinstance(user_data['pdf_plans'], list):
-                    debug_info.append(f"User {user.id} has no valid pdf_plans, skipping")
-                    continue
-                
-                # Handle missing or malformed profile
-                if 'profile' not in user_data or not isinstance(user_data['profile'], dict):
-                    user_data['profile'] = {'name': 'Unknown User'}
-                
-                for plan in user_data.get('pdf_plans', []):
-                    try:
-                        # Ensure plan is a dictionary
-                        if not isinstance(plan, dict):
-                            debug_info.append(f"Invalid plan type for user {user.id}, skipping")
-                            continue
-                            
-                        plan_count += 1
-                        plan['user_id'] = user.id
-                        plan['user_name'] = user_data.get('profile', {}).get('name', 'Unknown')
-                        
-                        # Handle potential missing created_at
-                        if 'created_at' not in plan:
-                            plan['created_at'] = datetime.datetime.min
-                            
-                        plans.append(plan)
-                    except Exception as plan_error:
-                        error_count += 1
-                        debug_info.append(f"Error processing plan for user {user.id}: {str(plan_error)}")
-                        continue
-                        
-            except Exception as user_error:
-                error_count += 1
-                debug_info.append(f"Error processing user {user.id}: {str(user_error)}")
-                continue
-        
-        debug_info.append(f"Processed {user_count} users, {plan_count} plans, encountered {error_count} errors")
         
-        # Sort plans by created_at date, handling potential missing or invalid dates
-        try:
-            plans.sort(key=lambda x: x.get('created_at', datetime.datetime.min), reverse=True)
-            debug_info.append("Plans sorted successfully")
-        except Exception as sort_error:
-            debug_info.append(f"Error sorting plans: {str(sort_error)}")
-            # Fallback: try to sort without using created_at if that's causing issues
-            try:
-                plans.sort(key=lambda x: x.get('user_name', ''), reverse=False)
-                debug_info.append("Plans sorted by username instead")
-            except:
-                debug_info.append("Unable to sort plans, displaying in original order")
+        # One indexed query per page on the plans collection
+        plans, next_cursor = PlanRepository(db).list_page(cursor=cursor)
+        debug_info.append(f"Loaded {len(plans)} plans from the plans index")
         
-        return render_template("admin/plans.html", plans=plans, debug_info=debug_info)
+        return render_template("admin/plans.html", plans=plans, cursor=cursor, next_cursor=next_cursor, debug_info=debug_info)
         
     except Exception as e:
+        report_firebase_error(e)
         logger.error(f"Plans page error: {str(e)}")
         logger.error(traceback.format_exc())
         return render_template("admin/plans.html", error=str(e), debug_info=debug_info)
 
+@app.route("/plans/file/<path:filename>")
+@admin_required
+def plan_file(filename):
+    """Redirect to a signed URL for a stored plan, minted on first use and cached"""
+    from services.firebase_service import get_bucket
+    from services.signed_url_service import get_signed_url
+
+    bucket = get_bucket(logger.info)
+    if bucket is None:
+        return "Firebase Storage is not available", 503
+
+    try:
+        return redirect(get_signed_url(bucket, filename))
+    except Exception as e:
+        report_firebase_error(e)
+        logger.error(f"Error signing URL for {filename}: {str(e)}")
+        return "Could not create a download link", 500
+
+@app.route("/download/<path:filename>")
+def download_file(filename):
+    """
+    Public download links built by storage_service. Streams the object from the
+    bucket with Range and ETag support; no login, since the links go to users.
+    """
+    import config
+    from services import download_service
+
+    if not download_service.is_downloadable(filename):
+        return "File not found", 404
+
+    bucket = config.storage_bucket
+    if bucket is None:
+        return "Storage is not available", 503
+
+    try:
+        blob = bucket.get_blob(filename)
+    except Exception as e:
+        logger.error(f"Error reading {filename} from storage: {str(e)}")
+        return "Storage is not available", 503
+    if blob is None:
+        return "File not found", 404
+
+    etag = download_service.blob_etag(blob)
+    headers = {
+        'ETag': etag,
+        'Cache-Control': download_service.cache_control(filename),
+        'Accept-Ranges': 'bytes',
+    }
+    if blob.updated is not None:
+        headers['Last-Modified'] = blob.updated.strftime('%a, %d %b %Y %H:%M:%S GMT')
+
+    if download_service.etag_matches(request.headers.get('If-None-Match'), etag):
+        return Response(status=304, headers=headers)
+
+    try:
+        byte_range = download_service.parse_range(request.headers.get('Range'), blob.size,
+                                                  request.headers.get('If-Range'), etag)
+    except ValueError:
+        headers['Content-Range'] = f"bytes */{blob.size}"
+        return Response(status=416, headers=headers)
+
+    status = 200
+    start, end = 0, blob.size - 1
+    if byte_range is not None:
+        status = 206
+        start, end = byte_range
+        headers['Content-Range'] = f"bytes {start}-{end}/{blob.size}"
+    headers['Content-Length'] = str(end - start + 1)
+
+    if not download_service.acquire_slot():
+        return Response("Too many downloads in progress", status=503, headers={'Retry-After': '1'})
+
+    response = Response(download_service.iter_blob(blob, start, end, logger.error), status=status,
+                        headers=headers, mimetype=blob.content_type or 'application/pdf')
+    response.call_on_close(download_service.release_slot)
+    return response
+
 # Admin users management
 @app.route("/admin-users", methods=["GET"])
 @admin_required
 def manage_admin_users():
     try:
-        # Use simple_initialize_firebase instead of initialize_firebase
-        from services.firebase_service import simple_initialize_firebase, db
+        from services.firebase_service import get_db
         
-        if not simple_initialize_firebase():
+        db = get_db()
+        if db is None:
             flash('Error connecting to Firebase')
             return render_template("admin/admin_users.html", error="Firebase connection failed")
 
-        admin_users = []
-        
-        for admin in db.collection('admin_users').stream():
-            admin_data = admin.to_dict()
-            admin_data['id'] = admin.id
-            admin_data.pop('password', None)
-            admin_users.append(admin_data)
+        admin_users = AdminRepository(db).list()
             
         return render_template("admin/admin_users.html", admin_users=admin_users)
         
@@ -399,10 +378,10 @@ def manage_admin_users():
 @admin_required
 def add_admin_user():
     try:
-        # Import the simple_initialize_firebase function
-        from services.firebase_service import simple_initialize_firebase, db, firestore
+        from services.firebase_service import get_db
         
-        if not simple_initialize_firebase():
+        db = get_db()
+        if db is None:
             flash('Error connecting to Firebase')
             return redirect(url_for('manage_admin_users'))
             
@@ -411,23 +390,17 @@ def add_admin_user():
         name = request.form.get('name')
         email = request.form.get('email')
         
+        admins = AdminRepository(db)
+
         # Check if username exists
-        existing = db.collection('admin_users').where('username', '==', username).limit(1).get()
-        if len(list(existing)) > 0:
+        if admins.find_by_username(username) is not None:
             flash('Username already exists')
             return redirect(url_for('manage_admin_users'))
 
         # Hash password
         hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
         
-        db.collection('admin_users').add({
-            'username': username,
-            'password': hashed.decode('utf-8'),
-            'name': name,
-            'email': email,
-            'created_at': firestore.SERVER_TIMESTAMP,
-            'last_login': None
-        })
+        admins.add(username, hashed.decode('utf-8'), name, email)
         
         flash('User added successfully')
         return redirect(url_for('manage_admin_users'))
@@ -441,15 +414,14 @@ def add_admin_user():
 @admin_required
 def get_admin_user(user_id):
     try:
-        # Import the simple_initialize_firebase function
-        from services.firebase_service import simple_initialize_firebase, db
+        from services.firebase_service import get_db
         
-        if not simple_initialize_firebase():
+        db = get_db()
+        if db is None:
             return jsonify({'error': 'Error connecting to Firebase'}), 500
             
-        user_doc = db.collection('admin_users').document(user_id).get()
-        if user_doc.exists:
-            user_data = user_doc.to_dict()
+        user_data = AdminRepository(db).get(user_id)
+        if user_data is not None:
             return jsonify({
                 'name': user_data.get('name'),
                 'email': user_data.get('email')
@@ -463,19 +435,19 @@ def get_admin_user(user_id):
 @admin_required
 def delete_admin_user(user_id):
     try:
-        # Import the simple_initialize_firebase function
-        from services.firebase_service import simple_initialize_firebase, db
+        from services.firebase_service import get_db
         
-        if not simple_initialize_firebase():
+        db = get_db()
+        if db is None:
             return jsonify({'success': False, 'error': 'Error connecting to Firebase'})
             
-        user_doc = db.collection('admin_users').document(user_id).get()
-        if user_doc.exists:
-            user_data = user_doc.to_dict()
+        admins = AdminRepository(db)
+        user_data = admins.get(user_id)
+        if user_data is not None:
             if user_data.get('username') == 'admin':
                 return jsonify({'success': False, 'error': 'Cannot delete default admin user'})
             
-            db.collection('admin_users').document(user_id).delete()
+            admins.delete(user_id)
             return jsonify({'success': True})
         return jsonify({'success': False, 'error': 'User not found'})
     except Exception as e:
@@ -486,10 +458,10 @@ def delete_admin_user(user_id):
 @admin_required
 def edit_admin_user():
     try:
-        # Import the simple_initialize_firebase function
-        from services.firebase_service import simple_initialize_firebase, db, firestore
+        from services.firebase_service import get_db
         
-        if not simple_initialize_firebase():
+        db = get_db()
+        if db is None:
             flash('Error connecting to Firebase')
             return redirect(url_for('manage_admin_users'))
             
@@ -498,19 +470,16 @@ def edit_admin_user():
         email = request.form.get('email')
         password = request.form.get('password')
 
-        user_ref = db.collection('admin_users').document(user_id)
-        
         update_data = {
             'name': name,
-            'email': email,
-            'updated_at': firestore.SERVER_TIMESTAMP
+            'email': email
         }
         
         if password:
             hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
             update_data['password'] = hashed.decode('utf-8')
         
-        user_ref.update(update_data)
+        AdminRepository(db).update(user_id, update_data)
         
         flash('User updated successfully')
         return redirect(url_for('manage_admin_users'))
@@ -521,24 +490,29 @@ def edit_admin_user():
         return redirect(url_for('manage_admin_users'))
 
 @app.route("/backend-data")
+@app.route("/backend-data/<path:path>")
 @admin_required
-def backend_data():
+def backend_data(path=None):
     """
     Display raw backend data from Firestore for debugging purposes.
     This helps diagnose issues with the bot conversation and data structure.
+    
+    Without a path, lists the root collections with their document counts.
+    A collection path shows one page of its documents; a document path shows
+    its fields and subcollections.
     """
     debug_info = []
-    collections_data = {}
+    cursor = request.args.get('cursor', '')
+    page_size = request.args.get('page_size', 0, type=int)
     
     try:
         debug_info.append("Starting backend data route")
         
-        # Use simple_initialize_firebase
-        from services.firebase_service import simple_initialize_firebase, db
-        
-        debug_info.append("Imported Firebase services")
+        from services.firebase_service import get_db
+        from services import async_repository, explorer_service
         
-        if not simple_initialize_firebase():
+        db = get_db()
+        if db is None:
             debug_info.append("Firebase initialization failed")
             flash('Error connecting to Firebase')
             return render_template("admin/backend_data.html", 
@@ -547,98 +521,194 @@ def backend_data():
 
         debug_info.append("Firebase initialized successfully")
         
-        # Get a list of all collections
-        collections = db.collections()
-        collection_names = [collection.id for collection in collections]
-        debug_info.append(f"Found collections: {', '.join(collection_names)}")
-        
-        # Process each collection
-        for collection_name in collection_names:
-            debug_info.append(f"Processing collection: {collection_name}")
-            collection_ref = db.collection(collection_name)
-            documents = collection_ref.stream()
-            
-            collection_docs = []
-            for doc in documents:
-                try:
-                    doc_data = doc.to_dict()
-                    
-                    # Process timestamps for display
-                    processed_data = {}
-                    for key, value in doc_data.items():
-                        if hasattr(value, 'seconds'):  # It's a timestamp
-                            try:
-                                processed_data[key] = datetime.datetime.fromtimestamp(value.seconds)
-                            except:
-                                processed_data[key] = f"Timestamp({value.seconds})"
-                        elif isinstance(value, list):
-                            # For lists (like pdf_plans), count them and show sample
-                            processed_data[key] = f"List with {len(value)} items"
-                            if value and len(value) > 0:
-                                if isinstance(value[0], dict):
-                                    # Show keys of the first item
-                                    processed_data[f"{key}_sample"] = f"Keys: {', '.join(value[0].keys())}"
-                        else:
-                            processed_data[key] = value
-                    
-                    collection_docs.append({
-                        'id': doc.id,
-                        'data': processed_data
-                    })
-                except Exception as e:
-                    debug_info.append(f"Error processing document {doc.id}: {str(e)}")
-            
-            collections_data[collection_name] = collection_docs
+        if not path:
+            summaries = async_repository.collection_summaries()
+            debug_info.append(f"Found collections: {', '.join(summary['name'] for summary in summaries)}")
+            return render_template("admin/backend_data.html", 
+                                   summaries=summaries, 
+                                   debug_info=debug_info)
         
-        # Special handling for users collection - check subcollections
-        if 'users' in collection_names:
-            debug_info.append("Checking user subcollections")
-            users_ref = db.collection('users')
-            users = users_ref.stream()
-            
-            user_subcollections = {}
-            for user in users:
-                try:
-                    # Get user subcollections (like interactions)
-                    user_subs = user.reference.collections()
-                    sub_names = [sub.id for sub in user_subs]
-                    
-                    if sub_names:
-                        user_subcollections[user.id] = sub_names
-                        debug_info.append(f"User {user.id} has subcollections: {', '.join(sub_names)}")
-                        
-                        # For each subcollection, get a sample document
-                        for sub_name in sub_names:
-                            sub_ref = user.reference.collection(sub_name)
-                            sub_docs = sub_ref.limit(5).stream()
-                            
-                            sample_docs = []
-                            for sub_doc in sub_docs:
-                                try:
-                                    sub_data = sub_doc.to_dict()
-                                    sample_docs.append({
-                                        'id': sub_doc.id,
-                                        'data': sub_data
-                                    })
-                                except Exception as e:
-                                    debug_info.append(f"Error processing subdocument {sub_doc.id}: {str(e)}")
-                            
-                            if sample_docs:
-                                collections_data[f"users/{user.id}/{sub_name}_samples"] = sample_docs
-                except Exception as e:
-                    debug_info.append(f"Error processing user subcollections for {user.id}: {str(e)}")
+        segments = explorer_service.split_path(path)
+        if segments is None:
+            flash(f"Invalid path: {path}")
+            return redirect(url_for('backend_data'))
+        path = '/'.join(segments)
+        # Links for each ancestor collection and document
+        breadcrumbs = [{'name': segment, 'path': '/'.join(segments[:i + 1])} for i, segment in enumerate(segments)]
+        
+        if explorer_service.is_collection_path(path):
+            documents, next_cursor = explorer_service.list_documents_page(db, path, page_size=page_size, cursor=cursor)
+            debug_info.append(f"Loaded {len(documents)} documents from {path}")
+            return render_template("admin/backend_data.html", 
+                                   collection_path=path,
+                                   documents=documents,
+                                   cursor=cursor,
+                                   next_cursor=next_cursor,
+                                   page_size=page_size if page_size in explorer_service.PAGE_SIZES else explorer_service.DEFAULT_PAGE_SIZE,
+                                   page_sizes=explorer_service.PAGE_SIZES,
+                                   breadcrumbs=breadcrumbs,
+                                   debug_info=debug_info)
         
+        document = async_repository.get_document(path)
+        if document is None:
+            flash(f"Document not found: {path}")
+            return redirect(url_for('backend_data', path='/'.join(segments[:-1])))
+        debug_info.append(f"Document {path} has subcollections: {', '.join(document['subcollections']) or 'none'}")
         return render_template("admin/backend_data.html", 
-                               collections_data=collections_data, 
+                               document=document,
+                               breadcrumbs=breadcrumbs,
                                debug_info=debug_info)
         
     except Exception as e:
+        report_firebase_error(e)
         logger.error(f"Backend data page error: {str(e)}")
         logger.error(traceback.format_exc())
         return render_template("admin/backend_data.html", 
                                error=str(e), 
                                debug_info=debug_info)
 
+@app.route("/backend-data-export/<path:path>")
+@admin_required
+def export_backend_data(path):
+    """Stream every document of a collection as JSON lines"""
+    from services.firebase_service import get_db
+    from services import explorer_service
+    
+    if not explorer_service.is_collection_path(path):
+        flash(f"Not a collection path: {path}")
+        return redirect(url_for('backend_data'))
+    
+    db = get_db()
+    if db is None:
+        flash('Error connecting to Firebase')
+        return redirect(url_for('backend_data'))
+    
+    path = '/'.join(explorer_service.split_path(path))
+    filename = path.replace('/', '_') + '.jsonl'
+    return Response(
+        stream_with_context(explorer_service.export_collection(db, path)),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@app.route("/export/<dataset>.<fmt>")
+@admin_required
+def export_dataset(dataset, fmt):
+    """Stream users, plans or interactions as CSV or Parquet"""
+    from services.firebase_service import get_db
+    from services import export_service
+    
+    if dataset not in export_service.DATASETS or fmt not in export_service.FORMATS:
+        flash(f"Unknown export: {dataset}.{fmt}")
+        return redirect(url_for('backend_data'))
+    if fmt == 'parquet' and export_service.pa is None:
+        flash('Parquet exports need the pyarrow package')
+        return redirect(url_for('backend_data'))
+    
+    db = get_db()
+    if db is None:
+        flash('Error connecting to Firebase')
+        return redirect(url_for('backend_data'))
+    
+    filename = f"{dataset}-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    return Response(
+        stream_with_context(export_service.stream_export(db, dataset, fmt)),
+        mimetype=export_service.FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@app.route("/export/<dataset>.<fmt>/bucket", methods=["POST"])
+@admin_required
+def export_dataset_to_bucket(dataset, fmt):
+    """Start (or, given an export_id, resume) an export to the bucket in the background"""
+    import config
+    from services.firebase_service import get_db
+    from services import export_service
+    
+    db = get_db()
+    bucket = config.storage_bucket
+    if db is None or bucket is None:
+        flash('Firebase or storage is not available')
+        return redirect(url_for('backend_data'))
+    
+    try:
+        export_id = export_service.start_bucket_export(db, bucket, dataset, fmt,
+                                                       request.form.get('export_id') or None, logger.info)
+    except ValueError as e:
+        flash(str(e))
+        return redirect(url_for('backend_data'))
+    
+    flash(f"Export {export_id} running; progress at {url_for('export_progress', export_id=export_id)}")
+    return redirect(url_for('backend_data'))
+
+@app.route("/export/status/<export_id>")
+@admin_required
+def export_progress(export_id):
+    import config
+    from services import export_service
+    
+    bucket = config.storage_bucket
+    if bucket is None:
+        return jsonify({'error': 'Storage is not available'}), 503
+    status = export_service.export_status(bucket, export_id)
+    if status is None:
+        return jsonify({'error': 'Export not found'}), 404
+    return jsonify(status)
+
+
+@app.route("/events/dashboard")
+@admin_required
+def dashboard_events():
+    """Server-Sent Events with the dashboard counters and new interactions"""
+    from services import live_service
+    
+    if not live_service.enabled():
+        return Response("Live updates are off", status=404)
+    if not live_service.acquire_stream():
+        return Response("Too many live streams", status=503, headers={'Retry-After': '10'})
+    
+    response = Response(
+        stream_with_context(live_service.stream_events(request.headers.get('Last-Event-ID'))),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    response.call_on_close(live_service.release_stream)
+    return response
+
+@app.route("/analytics")
+@admin_required
+def analytics():
+    """Profile distributions of an athlete cohort, from the columnar snapshot"""
+    from services.firebase_service import get_db
+    from services import analytics_service
+    
+    filters = {field: request.args.get(field, '') for field in ('experience', 'gender', 'diet', 'sport')}
+    group_by = request.args.get('group_by', 'experience')
+    options = {'categories': analytics_service.CATEGORIES, 'sports': analytics_service.SPORTS,
+               'filters': filters, 'group_by': group_by}
+    
+    if analytics_service.np is None:
+        return render_template("admin/analytics.html", error="The analytics snapshot needs the numpy package", **options)
+    
+    db = get_db()
+    if db is None:
+        flash('Error connecting to Firebase')
+        return render_template("admin/analytics.html", error="Firebase connection failed", **options)
+    
+    try:
+        if request.args.get('refresh'):
+            analytics_service.refresh_in_background(db, logger.info)
+            flash('Analytics snapshot refresh started')
+        analytics_service.ensure_fresh(db, logger.info)
+        report = analytics_service.cohort_report(filters, group_by)
+        if report is not None:
+            logger.info(f"Cohort report over {report['rows']} users: {report['matched']} matched in {report['elapsed_ms']} ms")
+        return render_template("admin/analytics.html", report=report, **options)
+    
+    except Exception as e:
+        logger.error(f"Analytics page error: {str(e)}")
+        logger.error(traceback.format_exc())
+        return render_template("admin/analytics.html", error=str(e), **options)
 
 @app.route("/plans-diagnostic")
 @admin_required
@@ -649,18 +719,16 @@ def plans_diagnostic():
     """
     debug_info = []
     all_plans = []
-    users_with_plans = 0
-    total_users = 0
     
     try:
         debug_info.append("Starting plans diagnostic route")
         
-        # Use simple_initialize_firebase
-        from services.firebase_service import simple_initialize_firebase, db
+        from services.firebase_service import get_db
         
         debug_info.append("Imported Firebase services")
         
-        if not simple_initialize_firebase():
+        db = get_db()
+        if db is None:
             debug_info.append("Firebase initialization failed")
             flash('Error connecting to Firebase')
             return render_template("admin/plans_diagnostic.html", 
@@ -669,12 +737,19 @@ def plans_diagnostic():
 
         debug_info.append("Firebase initialized successfully")
         
-        # Get all users
-        users_ref = db.collection('users')
-        debug_info.append("Getting users collection reference")
+        # Totals come from aggregation queries instead of reading every user
+        from services.aggregation_service import plan_summary
+        summary = plan_summary(db, logger.info)
+        cost = summary['cost']
+        debug_info.append(f"Summary by {cost['method']}: ~{cost['reads']} document reads in {cost['elapsed_ms']} ms")
+        logger.info(f"Plans diagnostic summary by {cost['method']}: ~{cost['reads']} reads, {cost['elapsed_ms']} ms")
+        
+        # Only users with plans are inspected, at most DIAGNOSTIC_MAX_USERS of them
+        from services.user_service import DIAGNOSTIC_MAX_USERS
+        debug_info.append(f"Getting up to {DIAGNOSTIC_MAX_USERS} users with plan_count > 0")
         
         try:
-            users = list(users_ref.stream())
+            users = list(UserRepository(db).with_plans(DIAGNOSTIC_MAX_USERS))
             debug_info.append(f"Retrieved {len(users)} users from Firestore")
         except Exception as e:
             debug_info.append(f"Error retrieving users: {str(e)}")
@@ -683,7 +758,6 @@ def plans_diagnostic():
         for user in users:
             try:
                 debug_info.append(f"Processing user ID: {user.id}")
-                total_users += 1
                 
                 # Safely get user data
                 try:
@@ -713,8 +787,6 @@ def plans_diagnostic():
                     debug_info.append(f"User {user.id} has an empty pdf_plans list")
                     continue
                 
-                # User has plans
-                users_with_plans += 1
                 debug_info.append(f"User {user.id} has {len(pdf_plans)} plans")
                 
                 # Get profile name safely
@@ -778,25 +850,32 @@ def plans_diagnostic():
             debug_info.append(f"Error sorting plans: {str(sort_error)}")
             # Don't try to sort if it's causing errors
         
-        summary = {
-            'total_users': total_users,
-            'users_with_plans': users_with_plans,
-            'total_plans': len(all_plans),
-            'percentage_with_plans': round(users_with_plans / total_users * 100, 2) if total_users > 0 else 0
-        }
-        
         return render_template("admin/plans_diagnostic.html", 
                                plans=all_plans,
                                summary=summary,
                                debug_info=debug_info)
         
     except Exception as e:
+        report_firebase_error(e)
         logger.error(f"Plans diagnostic page error: {str(e)}")
         logger.error(traceback.format_exc())
         return render_template("admin/plans_diagnostic.html", 
                                error=str(e), 
                                debug_info=debug_info)
 
+def _log_timestamp(value, end=False):
+    """Convert a datetime-local form value (YYYY-MM-DDTHH:MM) to the log timestamp format"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if end and parsed.second == 0 and len(value) <= 16:
+        # A minute-precision end bound includes the whole minute
+        parsed = parsed.replace(second=59, microsecond=999000)
+    return parsed.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
 @app.route("/logs")
 @admin_required
 def system_logs():
@@ -809,9 +888,11 @@ def system_logs():
     
     # Get query parameters
     category = request.args.get('category', 'all')
-    lines = int(request.args.get('lines', 100))
+    lines = min(max(request.args.get('lines', 100, type=int), 1), 1000)
     search = request.args.get('search', '')
     user_id = request.args.get('user_id', '')
+    time_from = request.args.get('from', '')
+    time_to = request.args.get('to', '')
     
     if category not in categories:
         category = 'all'
@@ -820,13 +901,16 @@ def system_logs():
         debug_info.append(f"Reading logs for category: {category}")
         
         # Get logs directory
-        from services.logging_service import ensure_logs_directory
+        from services.logging_service import ensure_logs_directory, log_queue_stats
         logs_dir = ensure_logs_directory()
+        debug_info.append(f"Log writer: {log_queue_stats()}")
         
-        # Get log file path
+        # Get log file path and its rotated archives
+        from services.log_rotation import list_archives
         log_file = os.path.join(logs_dir, f"{category}.log")
+        archives = list_archives(log_file)
         
-        if not os.path.exists(log_file):
+        if not os.path.exists(log_file) and not archives:
             debug_info.append(f"Log file {log_file} does not exist")
             flash(f"No logs found for category: {category}")
             return render_template("admin/logs.html", 
@@ -836,90 +920,65 @@ def system_logs():
                                   lines=lines,
                                   search=search,
                                   user_id=user_id,
+                                  time_from=time_from,
+                                  time_to=time_to,
                                   debug_info=debug_info)
         
-        # Read log file (last N lines)
-        debug_info.append(f"Reading last {lines} lines from {log_file}")
-        
-        with open(log_file, 'r', encoding='utf-8') as f:
-            all_lines = f.readlines()
-        
-        # Get the last N lines, in reverse order (newest first)
-        all_lines = all_lines[-lines:]
-        all_lines.reverse()
-        
-        # Filter lines if search or user_id is provided
-        if search or user_id:
-            filtered_lines = []
-            for line in all_lines:
-                if search and search.lower() in line.lower():
-                    filtered_lines.append(line)
-                elif user_id and f"[User: {user_id}]" in line:
-                    filtered_lines.append(line)
-                elif search and user_id and search.lower() in line.lower() and f"[User: {user_id}]" in line:
-                    filtered_lines.append(line)
-                elif not search and not user_id:
-                    filtered_lines.append(line)
+        if time_from or time_to or user_id:
+            # Time range and user queries go through the sidecar index,
+            # then the archives that overlap the range
+            from services.log_reader import query_logs
+            start_time = _log_timestamp(time_from, end=False)
+            end_time = _log_timestamp(time_to, end=True)
+            debug_info.append(f"Querying index of {log_file} from {start_time} to {end_time}")
+            all_lines = query_logs(log_file, start_time, end_time, user_id=user_id or None,
+                                   search=search, limit=lines)
+        else:
+            # Read the last N matching lines backwards from the end of the file,
+            # continuing into the archives
+            debug_info.append(f"Reading last {lines} lines from {log_file} and {len(archives)} archives")
             
-            debug_info.append(f"Filtered from {len(all_lines)} to {len(filtered_lines)} lines")
-            all_lines = filtered_lines
+            from services.log_reader import tail_lines
+            all_lines = tail_lines(log_file, lines, search=search)
+        debug_info.append(f"Read {len(all_lines)} lines")
         
         # Process lines for display
+        from services.log_format import parse_line
         for line in all_lines:
-            try:
-                # Parse the log line
-                timestamp_match = line.find(']')
-                if timestamp_match > 0:
-                    timestamp = line[1:timestamp_match]
-                    rest = line[timestamp_match+1:].strip()
-                else:
-                    timestamp = ""
-                    rest = line
-                
-                # Extract category
-                category_match = rest.find(']')
-                if category_match > 0:
-                    log_category = rest[1:category_match]
-                    rest = rest[category_match+1:].strip()
-                else:
-                    log_category = ""
-                
-                # Extract user ID if present
-                user_match = rest.find(']')
-                if user_match > 0 and rest.startswith('[User:'):
-                    user = rest[7:user_match]
-                    rest = rest[user_match+1:].strip()
-                else:
-                    user = ""
-                
-                # The rest is the message
-                message = rest
-                
-                # Add to logs list
-                logs.append({
-                    'timestamp': timestamp,
-                    'category': log_category,
-                    'user': user,
-                    'message': message,
-                    'raw': line
-                })
-            except Exception as e:
-                debug_info.append(f"Error parsing log line: {str(e)}")
+            record = parse_line(line)
+            if record is None:
+                # Continuation of a multi-line text entry (data or traceback)
                 logs.append({
                     'timestamp': "",
-                    'category': "ERROR",
+                    'category': "",
                     'user': "",
-                    'message': f"Error parsing log: {str(e)}",
+                    'message': line,
                     'raw': line
                 })
+                continue
+            
+            message = record.message
+            if record.data:
+                message = f"{message} {json.dumps(record.data, ensure_ascii=False, default=str)}"
+            logs.append({
+                'timestamp': record.timestamp,
+                'category': record.category,
+                'user': record.user_id or "",
+                'message': message,
+                'traceback': record.traceback,
+                'raw': line
+            })
         
         return render_template("admin/logs.html", 
                               logs=logs,
+                              archives=[os.path.basename(archive) for archive in archives],
                               categories=categories,
                               selected_category=category,
                               lines=lines,
                               search=search,
                               user_id=user_id,
+                              time_from=time_from,
+                              time_to=time_to,
                               debug_info=debug_info)
         
     except Exception as e:
@@ -933,6 +992,8 @@ def system_logs():
                               lines=lines,
                               search=search,
                               user_id=user_id,
+                              time_from=time_from,
+                              time_to=time_to,
                               debug_info=debug_info)
 
 @app.route("/logs/download/<category>")
@@ -951,22 +1012,42 @@ def download_logs(category):
         logs_dir = ensure_logs_directory()
         
         # Get log file path
+        from services.log_reader import stream_file, stream_log_history
+        from services.log_rotation import list_archives
         log_file = os.path.join(logs_dir, f"{category}.log")
+        archives = list_archives(log_file)
+        
+        # Generate a timestamp for the filename
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
         
-        if not os.path.exists(log_file):
+        archive_name = request.args.get('archive')
+        if archive_name:
+            # A single rotated segment, sent as stored (compressed)
+            matches = [archive for archive in archives if os.path.basename(archive) == archive_name]
+            if not matches:
+                flash(f"Archive not found: {archive_name}")
+                return redirect(url_for('system_logs', category=category))
+            body = stream_file(matches[0])
+            filename = archive_name
+            mimetype = 'application/octet-stream'
+        elif request.args.get('history'):
+            # Every archive decompressed, oldest first, then the live file
+            body = stream_log_history(log_file)
+            filename = f"{category}_logs_history_{timestamp}.log"
+            mimetype = 'text/plain'
+        elif os.path.exists(log_file):
+            body = stream_file(log_file)
+            filename = f"{category}_logs_{timestamp}.log"
+            mimetype = 'text/plain'
+        else:
             flash(f"No logs found for category: {category}")
             return redirect(url_for('system_logs'))
         
-        # Generate a timestamp for the filename
-        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"{category}_logs_{timestamp}.log"
-        
-        # Send the file
-        return send_file(
-            log_file,
-            mimetype='text/plain',
-            as_attachment=True,
-            download_name=filename
+        # Stream the file in chunks instead of loading it
+        return Response(
+            stream_with_context(body),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
         )
         
     except Exception as e:
@@ -974,6 +1055,13 @@ def download_logs(category):
         flash(f"Error downloading logs: {str(e)}")
         return redirect(url_for('system_logs'))
     
+@app.route("/ready")
+def ready():
+    """Readiness probe: 200 once Firestore is connected, with the state of each backend"""
+    start_warmup(logger.info)  # No-op unless this worker has not warmed up yet
+    status = readiness()
+    return status, 200 if status['ready'] else 503
+
 @app.route("/debug-firebase")
 def debug_firebase():
     debug_info = {
@@ -992,13 +1080,12 @@ def debug_firebase():
     try:
         debug_info['initialization_steps'].append("Starting Firebase initialization")
         
-        # Use simple_initialize_firebase for debugging
-        from services.firebase_service import simple_initialize_firebase, db
+        from services.firebase_service import get_db
         
         # Try to initialize Firebase
-        debug_info['initialization_steps'].append("Attempting to initialize Firebase with simple_initialize_firebase")
-        init_success = simple_initialize_firebase()
-        if not init_success:
+        debug_info['initialization_steps'].append("Attempting to get the shared Firebase client")
+        db = get_db()
+        if db is None:
             debug_info['errors'].append("Firebase initialization returned False")
             debug_info['final_status'] = 'failed'
             return debug_info, 500
@@ -1010,20 +1097,17 @@ def debug_firebase():
         
         # Try to query admin_users collection
         debug_info['initialization_steps'].append("Attempting to query admin_users collection")
-        admin_users = db.collection('admin_users').stream()
-        users_found = []
-        
-        for admin in admin_users:
-            admin_data = admin.to_dict()
-            users_found.append({
-                'id': admin.id,
-                'username': admin_data.get('username'),
-                'name': admin_data.get('name')
-            })
+        users_found = [
+            {'id': admin['id'], 'username': admin.get('username'), 'name': admin.get('name')}
+            for admin in AdminRepository(db).list()
+        ]
         
         debug_info.update({
             'final_status': 'success',
             'firebase_apps': len(firebase_admin._apps),
+            'client_lifecycle': firebase_status(),
+            'interaction_writer': interaction_stats(),
+            'signed_urls': signed_url_stats(),
             'users_found': users_found
         })
         
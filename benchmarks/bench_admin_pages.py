@@ -0,0 +1,134 @@
+"""
+Time every admin page against the in-memory Firestore backend seeded with
+synthetic athletes, and count the documents each page reads.
+
+    python benchmarks/bench_admin_pages.py --users 10000
+    python benchmarks/bench_admin_pages.py --users 100000 --save baseline.json
+    python benchmarks/bench_admin_pages.py --users 100000 --baseline baseline.json
+
+Reads are what Firestore would bill for the same queries; timings measure the
+app's own work (rendering, paging, aggregation) with no network in between.
+With --baseline, pages whose reads grew or whose median slowed down by more
+than --tolerance are reported and the script exits with status 1.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["FIRESTORE_BACKEND"] = "memory"
+os.environ["STARTUP_WARMUP"] = "off"
+os.environ.setdefault("ANALYTICS_DIR", tempfile.mkdtemp(prefix="analytics-"))
+
+from services import analytics_service, firebase_service, memory_firestore, synthetic_data
+
+PAGES = [
+    ('login', 'POST', '/login'),
+    ('dashboard', 'GET', '/'),
+    ('users', 'GET', '/users'),
+    ('users, filtered', 'GET', '/users?experience=Avan%C3%A7ado&sport=Corrida&has_plans=yes'),
+    ('plans', 'GET', '/plans'),
+    ('plans diagnostic', 'GET', '/plans-diagnostic'),
+    ('analytics', 'GET', '/analytics?experience=Avan%C3%A7ado&sport=Ciclismo'),
+    ('admin users', 'GET', '/admin-users'),
+    ('backend data', 'GET', '/backend-data'),
+    ('backend data, user', 'GET', '/backend-data/users/{user_id}'),
+    ('backend data export', 'GET', '/backend-data-export/users/{user_id}/interactions'),
+    ('logs', 'GET', '/logs'),
+]
+
+def seed(users, plans_per_user, interactions_per_user):
+    db = memory_firestore.MemoryFirestore()
+    started = time.perf_counter()
+    synthetic_data.generate(db, users, plans_per_user, interactions_per_user, log_message=lambda message: None)
+    print(f"Seeded {db.stats()['documents']} documents for {users} users "
+          f"in {time.perf_counter() - started:.1f} s")
+
+    # Share the client without going through credential-based initialization
+    firebase_service.db = db
+    firebase_service.async_db = memory_firestore.MemoryAsyncFirestore(db)
+    firebase_service._last_health_check = time.monotonic()
+
+    # Build the analytics snapshot up front so no page starts a refresh
+    if analytics_service.np is not None:
+        analytics_service.refresh(db, full=True, log_message=lambda message: None)
+    return db
+
+def measure(client, db, method, path, runs):
+    data = {'username': 'admin', 'password': 'admin'} if method == 'POST' else None
+    samples = []
+    reads = 0
+    status = None
+    for _ in range(runs):
+        db.reads = 0
+        started = time.perf_counter()
+        response = client.open(path, method=method, data=data)
+        response.get_data()
+        samples.append(time.perf_counter() - started)
+        response.close()
+        reads = db.reads
+        status = response.status_code
+    samples.sort()
+    return {'median_ms': round(samples[len(samples) // 2] * 1000, 2), 'reads': reads, 'status': status}
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for label, result in results.items():
+        before = baseline.get(label)
+        if before is None:
+            continue
+        if result['reads'] > before['reads']:
+            regressions.append(f"{label}: reads {before['reads']} -> {result['reads']}")
+        if result['median_ms'] > before['median_ms'] * (1 + tolerance):
+            regressions.append(f"{label}: median {before['median_ms']} -> {result['median_ms']} ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--plans-per-user', type=int, default=2)
+    parser.add_argument('--interactions-per-user', type=int, default=10)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--save', help="write the results to this JSON file")
+    parser.add_argument('--baseline', help="compare with results saved by --save")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed relative slowdown against --baseline")
+    args = parser.parse_args()
+
+    db = seed(args.users, args.plans_per_user, args.interactions_per_user)
+    user_id = next(iter(db.collection('users').limit(1).stream())).id
+
+    from app import app
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+        session['admin_id'] = 'admin_user'
+        session['admin_name'] = 'Benchmark'
+
+    results = {}
+    print(f"{'page':<22} {'status':>6} {'median':>11} {'reads':>9}")
+    for label, method, path in PAGES:
+        result = measure(client, db, method, path.format(user_id=user_id), args.runs)
+        results[label] = result
+        print(f"{label:<22} {result['status']:>6} {result['median_ms']:>8.1f} ms {result['reads']:>9}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'users': args.users, 'pages': results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('users') != args.users:
+            print(f"Note: the baseline was seeded with {baseline.get('users')} users")
+        regressions = compare(results, baseline['pages'], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+if __name__ == "__main__":
+    main()
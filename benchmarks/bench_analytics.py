@@ -0,0 +1,107 @@
+"""
+Measure the analytics snapshot on synthetic athletes in the in-memory
+Firestore backend: the cohort report computed by scanning every user document,
+next to a full snapshot build, an incremental refresh after some profiles
+change, and cohort queries over the memory-mapped columns.
+
+    python benchmarks/bench_analytics.py --users 20000
+    python benchmarks/bench_analytics.py --users 100000 --changed 500 --runs 20
+
+Reads are what Firestore would bill. Needs the numpy package.
+"""
+import os
+import sys
+import time
+import random
+import datetime
+import argparse
+import tempfile
+import collections
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["FIRESTORE_BACKEND"] = "memory"
+os.environ["ANALYTICS_DIR"] = tempfile.mkdtemp(prefix="analytics-")
+
+from services import analytics_service, memory_firestore, normalization_service, synthetic_data
+
+COHORTS = [
+    {},
+    {'experience': 'Avançado'},
+    {'experience': 'Iniciante', 'sport': 'Corrida'},
+    {'gender': 'Feminino', 'diet': 'Vegano', 'sport': 'Triathlon'},
+]
+
+def scan_report(db, filters):
+    # Without the snapshot: read every profile and normalize it for each report
+    counts = collections.defaultdict(collections.Counter)
+    sums = collections.Counter()
+    for snapshot in db.collection('users').stream():
+        row = normalization_service.normalize_profile((snapshot.to_dict() or {}).get('profile'))
+        if any(row[field] != value for field, value in filters.items() if field != 'sport'):
+            continue
+        if 'sport' in filters and filters['sport'] not in row['sports']:
+            continue
+        for field in normalization_service.CATEGORIES:
+            counts[field][row[field]] += 1
+        for field in normalization_service.NUMERIC_FIELDS:
+            if row[field] is not None:
+                sums[field] += row[field]
+    return counts, sums
+
+def timed(db, function):
+    db.reads = 0
+    started = time.perf_counter()
+    result = function()
+    return result, (time.perf_counter() - started) * 1000, db.reads
+
+def touch(db, changed, seed):
+    # Profiles edited after the snapshot, the way the bot saves an answer
+    rng = random.Random(seed)
+    ids = [snapshot.id for snapshot in db.collection('users').select([]).stream()]
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for user_id in rng.sample(ids, min(changed, len(ids))):
+        db.collection('users').document(user_id).set(
+            {'profile': {'weight': f"{rng.randint(50, 100)}kg", 'height': f"1,{rng.randint(55, 95)}"},
+             'last_updated': now}, merge=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--changed', type=int, default=200, help="profiles edited before the incremental refresh")
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    if analytics_service.np is None:
+        print("Skipped: the numpy package is not installed")
+        sys.exit(1)
+
+    db = memory_firestore.MemoryFirestore()
+    synthetic_data.generate(db, args.users, log_message=lambda message: None)
+    print(f"Seeded {db.stats()['documents']} documents for {args.users} users")
+    quiet = lambda message: None
+
+    _, elapsed, reads = timed(db, lambda: scan_report(db, COHORTS[2]))
+    print(f"{'scan every user, one report':<52} {elapsed:10.1f} ms {reads:>9} reads")
+
+    meta, elapsed, reads = timed(db, lambda: analytics_service.refresh(db, full=True, log_message=quiet))
+    print(f"{'full snapshot build':<52} {elapsed:10.1f} ms {reads:>9} reads   {meta['rows']} rows")
+
+    # Leave the generated last_updated values behind the high-water mark
+    time.sleep(0.01)
+    touch(db, args.changed, seed=2)
+    meta, elapsed, reads = timed(db, lambda: analytics_service.refresh(db, log_message=quiet))
+    print(f"{'incremental refresh':<52} {elapsed:10.1f} ms {reads:>9} reads   {meta['rows']} rows "
+          f"({args.changed} edited, overlap {analytics_service.ANALYTICS_OVERLAP} s)")
+
+    for filters in COHORTS:
+        samples = []
+        for _ in range(args.runs):
+            report = analytics_service.cohort_report(filters)
+            samples.append(report['elapsed_ms'])
+        samples.sort()
+        label = ', '.join(f"{key}={value}" for key, value in filters.items()) or 'everyone'
+        print(f"{'cohort ' + label:<52} {samples[len(samples) // 2]:10.2f} ms {0:>9} reads   "
+              f"{report['matched']} matched")
+
+if __name__ == "__main__":
+    main()
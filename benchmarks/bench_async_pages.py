@@ -0,0 +1,182 @@
+"""
+Compare sequential reads with async_repository for the dashboard and the
+/backend-data collection list.
+
+    python benchmarks/bench_async_pages.py --collections 12 --latency-ms 40
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python benchmarks/bench_async_pages.py --collections 12
+
+With FIRESTORE_EMULATOR_HOST set the collections are seeded in the emulator
+under a fresh project id; otherwise in-process stand-ins for the sync and
+async clients sleep --latency-ms (+/- --jitter) per RPC.
+"""
+import os
+import sys
+import time
+import uuid
+import types
+import random
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+from google.auth.credentials import AnonymousCredentials
+from services import aggregation_service, async_repository, explorer_service, firebase_service, stats_service
+
+class AnonymousCredential(credentials.Base):
+    """Lets firebase_admin create clients for the emulator or the stand-ins"""
+    def get_credential(self):
+        return AnonymousCredentials()
+
+class Simulated:
+    """Sync and async stand-ins for the reads these pages make; every RPC sleeps"""
+    def __init__(self, collections, latency, jitter, asynchronous):
+        self.names = [f"collection_{n:02d}" for n in range(collections)]
+        self.latency = latency
+        self.jitter = jitter
+        self.asynchronous = asynchronous
+        self.rng = random.Random(1)
+        self.slowest = 0.0
+
+    def _delay(self):
+        delay = self.latency * (1 + self.rng.uniform(-self.jitter, self.jitter))
+        self.slowest = max(self.slowest, delay)
+        return delay
+
+    def _result(self, value):
+        if self.asynchronous:
+            async def rpc():
+                await asyncio.sleep(self._delay())
+                return value
+            return rpc()
+        time.sleep(self._delay())
+        return value
+
+    def _stream(self, values):
+        if self.asynchronous:
+            async def stream():
+                await asyncio.sleep(self._delay())
+                for value in values:
+                    yield value
+            return stream()
+        time.sleep(self._delay())
+        return iter(values)
+
+    def collections(self):
+        return self._stream([SimulatedRef(self, name) for name in self.names])
+
+    def collection(self, name):
+        return SimulatedRef(self, name)
+
+    def collection_group(self, name):
+        return SimulatedRef(self, name)
+
+    def get_all(self, refs):
+        return self._stream([SimulatedSnapshot() for _ in refs])
+
+class SimulatedRef:
+    def __init__(self, db, name):
+        self.db = db
+        self.id = name
+
+    def document(self, name=None):
+        return self
+
+    def collection(self, name):
+        return self
+
+    def order_by(self, *args, **kwargs):
+        return self
+
+    def limit(self, count):
+        return self
+
+    def where(self, *args, **kwargs):
+        return self
+
+    def count(self, alias=None):
+        return self
+
+    def sum(self, field, alias=None):
+        return self
+
+    def get(self):
+        return self.db._result([[types.SimpleNamespace(alias='users', value=100),
+                                 types.SimpleNamespace(alias='plans', value=250)]])
+
+    def stream(self):
+        return self.db._stream([])
+
+class SimulatedSnapshot:
+    exists = True
+
+    def to_dict(self):
+        return {'total_users': 1}
+
+def sequential_dashboard(db):
+    # The previous dashboard: counters, recent activity and plan totals one after another
+    stats = stats_service.get_dashboard_stats(db)
+    aggregation_service.plan_summary(db)
+    activities = [doc.to_dict() for doc in (
+        db.collection_group('interactions')
+        .order_by('timestamp', direction=firestore.Query.DESCENDING)
+        .limit(async_repository.RECENT_ACTIVITY_LIMIT)
+        .stream()
+    )]
+    return stats, activities
+
+def seed(db, collections):
+    for n in range(collections):
+        batch = db.batch()
+        for i in range(20):
+            batch.set(db.collection(f"collection_{n:02d}").document(f"doc_{i}"), {'n': i})
+        batch.commit()
+
+def timed(label, fn, runs):
+    fn()  # Warm up connections
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    print(f"{label:<34} median {samples[len(samples) // 2] * 1000:8.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--collections', type=int, default=12)
+    parser.add_argument('--latency-ms', type=float, default=40.0)
+    parser.add_argument('--jitter', type=float, default=0.5, help="relative spread of simulated RPC latency")
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    app = firebase_admin.initialize_app(AnonymousCredential(), {
+        'projectId': f"fuelqpro-bench-{uuid.uuid4().hex[:8]}"
+    })
+    if os.getenv("FIRESTORE_EMULATOR_HOST"):
+        db = firestore.client(app)
+        seed(db, args.collections)
+        backend = "emulator"
+    else:
+        db = Simulated(args.collections, args.latency_ms / 1000.0, args.jitter, asynchronous=False)
+        simulated_async = Simulated(args.collections, args.latency_ms / 1000.0, args.jitter, asynchronous=True)
+        async_repository.firestore_async = types.SimpleNamespace(client=lambda app: simulated_async)
+        backend = f"simulated {args.latency_ms} ms/RPC"
+
+    # Share the client without going through credential-based initialization
+    firebase_service.db = db
+    firebase_service._last_health_check = time.monotonic()
+    print(f"Backend: {backend}, {args.collections} collections, "
+          f"ASYNC_MAX_CONCURRENCY={async_repository.ASYNC_MAX_CONCURRENCY}")
+
+    timed("dashboard, sequential", lambda: sequential_dashboard(db), args.runs)
+    timed("dashboard, async_repository", async_repository.dashboard_data, args.runs)
+    timed("collection list, sequential", lambda: explorer_service.collection_summaries(db), args.runs)
+    timed("collection list, async_repository", async_repository.collection_summaries, args.runs)
+    if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        print(f"slowest single simulated RPC: {max(db.slowest, simulated_async.slowest) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Measure cold start: time from launching `python app.py` to the first byte of a
+response, for each STARTUP_WARMUP mode.
+
+    python benchmarks/bench_cold_start.py --runs 5
+    python benchmarks/bench_cold_start.py --modes blocking background --path /ready
+
+"blocking" connects Firebase and Storage before serving, as app.py used to at
+import time; "background" and "off" serve immediately and connect later.
+Without credentials the connection attempts fail instead of succeeding, which
+still shows how long they hold up the first request.
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import subprocess
+import http.client
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def time_to_first_byte(mode, path, timeout):
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), STARTUP_WARMUP=mode)
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, 'app.py'], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+                connection.request('GET', path)
+                response = connection.getresponse()
+                response.read(1)
+                elapsed = time.perf_counter() - started
+                connection.close()
+                return elapsed, response.status
+            except (ConnectionRefusedError, ConnectionResetError):
+                time.sleep(0.01)
+        return None, None
+    finally:
+        process.terminate()
+        process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--modes', nargs='+', default=['blocking', 'background', 'off'])
+    parser.add_argument('--path', default='/login')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    args = parser.parse_args()
+
+    for mode in args.modes:
+        samples = []
+        status = None
+        for _ in range(args.runs):
+            elapsed, status = time_to_first_byte(mode, args.path, args.timeout)
+            if elapsed is None:
+                print(f"{mode}: no response within {args.timeout} s")
+                break
+            samples.append(elapsed)
+        if samples:
+            samples.sort()
+            print(f"{mode:<12} first byte of GET {args.path} ({status}): median {samples[len(samples) // 2] * 1000:7.0f} ms   "
+                  f"min {samples[0] * 1000:7.0f} ms   max {samples[-1] * 1000:7.0f} ms")
+
+if __name__ == "__main__":
+    main()
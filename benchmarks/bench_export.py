@@ -0,0 +1,136 @@
+"""
+Measure export_service on synthetic data in the in-memory Firestore backend:
+throughput and peak memory of streamed CSV/Parquet exports next to loading the
+whole collection first, then an interrupted bucket export resumed from its
+checkpoint.
+
+    python benchmarks/bench_export.py --users 20000
+    python benchmarks/bench_export.py --users 100000 --datasets users --formats parquet
+
+The bucket export runs against the in-process fake GCS server
+(benchmarks/fake_gcs.py) unless STORAGE_EMULATOR_HOST is set. Parquet needs
+the pyarrow package; it is skipped otherwise.
+"""
+import io
+import os
+import sys
+import csv
+import time
+import uuid
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["FIRESTORE_BACKEND"] = "memory"
+
+from fake_gcs import FakeGCS
+from services import export_service, memory_firestore, synthetic_data
+
+class Interrupted(Exception):
+    pass
+
+def load_everything(db, dataset, fmt):
+    # The /backend-data way: read every document, then build the whole file
+    query_fn, columns, _ = export_service.DATASETS[dataset]
+    rows = [export_service.typed_row(dataset, snapshot) for snapshot in query_fn(db).stream()]
+    if fmt == 'parquet':
+        sink = io.BytesIO()
+        writer = export_service.WRITERS[fmt](sink, columns)
+        writer.write(rows)
+        writer.close()
+        return [sink.getvalue()]
+    buffer = io.StringIO()
+    names = [name for name, _ in columns]
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    writer.writerows([[row[name] for name in names] for row in rows])
+    return [buffer.getvalue().encode('utf-8')]
+
+def measure(produce):
+    started = time.perf_counter()
+    size = sum(len(chunk) for chunk in produce())
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    for _ in produce():
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+def check_resume(db, dataset, fmt, part_rows):
+    import config
+    bucket = config.get_storage_bucket()
+    export_id = f"bench-{uuid.uuid4().hex[:8]}"
+    store = export_service.BucketStore(bucket, export_id)
+    write_part = store.write_part
+    written = []
+
+    def interrupt_after_two(name, fileobj, content_type):
+        if len(written) == 2:
+            raise Interrupted()
+        write_part(name, fileobj, content_type)
+        written.append(name)
+
+    store.write_part = interrupt_after_two
+    quiet = lambda message: None
+    try:
+        export_service.export_to_store(db, dataset, fmt, store, part_rows=part_rows, log_message=quiet)
+    except Interrupted:
+        pass
+    interrupted_rows = store.read_checkpoint()['rows']
+
+    checkpoint = export_service.export_to_store(db, dataset, fmt, export_service.BucketStore(bucket, export_id),
+                                                part_rows=part_rows, log_message=quiet)
+    ids = []
+    for part in checkpoint['parts']:
+        data = bucket.blob(f"{store.prefix}/{part['name']}").download_as_bytes()
+        if fmt == 'parquet':
+            import pyarrow.parquet as pq
+            ids += pq.read_table(io.BytesIO(data)).column('id').to_pylist()
+        else:
+            ids += [row['id'] for row in csv.DictReader(io.StringIO(data.decode('utf-8')))]
+    expected = sum(1 for _ in export_service.DATASETS[dataset][0](db).stream())
+    ok = checkpoint['done'] and len(ids) == expected and len(set(ids)) == expected
+    print(f"{'PASS' if ok else 'FAIL'}  resume {dataset}.{fmt}: interrupted at {interrupted_rows} rows, "
+          f"finished with {len(ids)} rows ({len(set(ids))} unique, {expected} expected) in {len(checkpoint['parts'])} parts")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--datasets', nargs='+', default=list(export_service.DATASETS))
+    parser.add_argument('--formats', nargs='+', default=list(export_service.FORMATS))
+    parser.add_argument('--part-rows', type=int, help="rows per part for the resume check (default: users / 4)")
+    args = parser.parse_args()
+
+    if export_service.pa is None and 'parquet' in args.formats:
+        print("parquet: skipped, the pyarrow package is not installed")
+        args.formats = [fmt for fmt in args.formats if fmt != 'parquet']
+
+    db = memory_firestore.MemoryFirestore()
+    synthetic_data.generate(db, args.users, log_message=lambda message: None)
+    print(f"Seeded {db.stats()['documents']} documents for {args.users} users")
+
+    for dataset in args.datasets:
+        for fmt in args.formats:
+            for label, produce in (("load everything", lambda: load_everything(db, dataset, fmt)),
+                                   ("stream_export", lambda: export_service.stream_export(db, dataset, fmt))):
+                size, elapsed, peak = measure(produce)
+                print(f"{dataset:<13} {fmt:<8} {label:<16} {size / 1e6:8.1f} MB in {elapsed:6.2f} s   "
+                      f"peak memory {peak / 1e6:7.1f} MB")
+
+    fake = None
+    if not os.getenv("STORAGE_EMULATOR_HOST"):
+        fake = FakeGCS().start()
+        os.environ["STORAGE_EMULATOR_HOST"] = fake.url
+    import config
+    config.GCS_BUCKET_NAME = f"export-{uuid.uuid4().hex[:8]}"
+    part_rows = args.part_rows or max(1, args.users // 4)
+    passed = all([check_resume(db, 'users', fmt, part_rows) for fmt in args.formats])
+    if fake is not None:
+        fake.stop()
+    sys.exit(0 if passed else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Compare one blocking set() per interaction with the batched write-behind recorder.
+
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python benchmarks/bench_interactions.py --messages 2000
+    python benchmarks/bench_interactions.py --messages 2000 --latency-ms 25
+
+With FIRESTORE_EMULATOR_HOST set the benchmark writes to the emulator;
+otherwise it uses an in-process stand-in that sleeps --latency-ms per RPC,
+which is what dominates the synchronous path against production.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("INTERACTION_JOURNAL", os.path.join(tempfile.mkdtemp(prefix="fuelqpro_bench_"), "interactions.journal"))
+
+from services import firebase_service, interaction_recorder
+
+class SimulatedRef:
+    def __init__(self, db):
+        self.db = db
+
+    def collection(self, name):
+        return self
+
+    def document(self, name=None):
+        return self
+
+    def set(self, data):
+        time.sleep(self.db.latency)
+        self.db.writes += 1
+
+class SimulatedBatch:
+    def __init__(self, db):
+        self.db = db
+        self.pending = 0
+
+    def set(self, ref, data):
+        self.pending += 1
+
+    def commit(self):
+        time.sleep(self.db.latency)
+        self.db.writes += self.pending
+
+class SimulatedFirestore:
+    """Stand-in for the client: every RPC costs `latency` seconds"""
+    def __init__(self, latency):
+        self.latency = latency
+        self.writes = 0
+
+    def collection(self, name):
+        return SimulatedRef(self)
+
+    def batch(self):
+        return SimulatedBatch(self)
+
+def connect(latency_ms):
+    if os.getenv("FIRESTORE_EMULATOR_HOST"):
+        from google.cloud import firestore as cloud_firestore
+        return cloud_firestore.Client(project=os.getenv("FIREBASE_PROJECT_ID", "fuelqpro-bench")), "emulator"
+    return SimulatedFirestore(latency_ms / 1000.0), f"simulated {latency_ms} ms/RPC"
+
+def run(messages, threads, record):
+    per_thread = messages // threads
+
+    def worker(thread_id):
+        for i in range(per_thread):
+            record(f"55119{thread_id:04d}{i % 50:04d}", 'text', f"mensagem {i}", f"resposta {i}")
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return per_thread * threads, time.perf_counter() - started
+
+def synchronous_set(user_id, message_type, message_content, response):
+    # The previous log_interaction: one blocking round trip per message
+    interaction = interaction_recorder.new_interaction(user_id, message_type, message_content, response)
+    (firebase_service.db.collection('users').document(user_id)
+     .collection('interactions').document(interaction['id']).set(interaction['data']))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=25.0)
+    args = parser.parse_args()
+
+    # Share one client without going through credential-based initialization
+    firebase_service.db, backend = connect(args.latency_ms)
+    firebase_service._last_health_check = time.monotonic()
+    print(f"Backend: {backend}, {args.messages} messages from {args.threads} threads")
+
+    count, elapsed = run(args.messages, args.threads, synchronous_set)
+    print(f"{'synchronous set()':<20} {count / elapsed:10.0f} messages/s")
+
+    interaction_recorder.INTERACTION_ASYNC = True
+    count, caller = run(args.messages, args.threads, interaction_recorder.record_interaction)
+    started = time.perf_counter()
+    interaction_recorder.flush_interactions()
+    committed = caller + time.perf_counter() - started
+    print(f"{'write-behind':<20} caller {count / caller:10.0f} messages/s   committed {count / committed:10.0f} messages/s")
+    print(interaction_recorder.interaction_stats())
+
+if __name__ == "__main__":
+    main()
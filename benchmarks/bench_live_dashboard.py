@@ -0,0 +1,160 @@
+"""
+Compare polling dashboards with live updates on the in-memory Firestore
+backend: documents read while --dashboards browsers watch the dashboard for
+--duration seconds as interactions arrive at --rate per second, and how long
+a new interaction takes to reach every open /events/dashboard stream.
+
+    python benchmarks/bench_live_dashboard.py --dashboards 20 --duration 10
+    python benchmarks/bench_live_dashboard.py --dashboards 50 --rate 20 --interval 5
+
+Polling re-runs the dashboard's counter and recent-activity queries every
+--interval seconds per browser; live updates cost one set of listeners per
+worker, which read only the documents that changed. The plan summary, read on
+every full page load either way, is left out.
+"""
+import os
+import sys
+import time
+import datetime
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["FIRESTORE_BACKEND"] = "memory"
+os.environ["STARTUP_WARMUP"] = "off"
+
+from services import async_repository, firebase_service, live_service, memory_firestore, stats_service, synthetic_data
+
+def seed(users):
+    db = memory_firestore.MemoryFirestore()
+    synthetic_data.generate(db, users, log_message=lambda message: None)
+    firebase_service.db = db
+    firebase_service.async_db = memory_firestore.MemoryAsyncFirestore(db)
+    firebase_service._last_health_check = time.monotonic()
+    print(f"Seeded {db.stats()['documents']} documents for {users} users")
+    return db
+
+def polling_reads(db):
+    # What one dashboard refresh reads for the counters and recent activity
+    db.reads = 0
+    stats_service.get_dashboard_stats(db)
+    list(db.collection_group('interactions').order_by('timestamp', direction='DESCENDING')
+         .limit(async_repository.RECENT_ACTIVITY_LIMIT).stream())
+    return db.reads
+
+def follow(client, latencies, ready, stop):
+    # One browser: read the stream and time each interaction from its write
+    response = client.get('/events/dashboard', buffered=False)
+    ready.release()
+    try:
+        for chunk in response.response:
+            received = time.perf_counter()
+            text = chunk.decode() if isinstance(chunk, bytes) else chunk
+            for line in text.splitlines():
+                if line.startswith('data: ') and '"bench ' in line:
+                    sent = float(line.split('"bench ', 1)[1].split('"', 1)[0])
+                    latencies.append(received - sent)
+            if stop.is_set():
+                break
+    finally:
+        response.close()
+
+def check_listener_recovery():
+    # A listener that fails to start must be retried by the next start(), not forgotten
+    listen = live_service._listen
+    failed = []
+
+    def flaky(db, kind, day):
+        if not failed:
+            failed.append(kind)
+            raise RuntimeError("transient error")
+        return listen(db, kind, day)
+
+    live_service._listen = flaky
+    try:
+        first = live_service.start(lambda message: None)
+    finally:
+        live_service._listen = listen
+    second = live_service.start(lambda message: None)
+    deadline = time.monotonic() + 5
+    while live_service.latest() is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    ok = not first and second and live_service.latest() is not None
+    print(f"{'PASS' if ok else 'FAIL'}  listener recovery: start() after a failed {failed[0]} listener "
+          f"returned {first}, then {second}; listeners {sorted(live_service._watches)}")
+    return ok
+
+def write_interactions(db, user_ids, rate, duration):
+    written = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        user_id = user_ids[written % len(user_ids)]
+        db.collection('users').document(user_id).collection('interactions').document().set({
+            'user_id': user_id, 'message_type': 'text', 'response': '',
+            'message': f"bench {time.perf_counter()}",
+            'timestamp': datetime.datetime.now(datetime.timezone.utc),
+        })
+        if written % 5 == 0:
+            batch = db.batch()
+            stats_service.record_plan_created(batch, db)
+            batch.commit()
+        written += 1
+        time.sleep(max(0.0, started + written / rate - time.perf_counter()))
+    return written
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000 if values else float('nan')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--dashboards', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--rate', type=float, default=5, help="interactions written per second")
+    parser.add_argument('--interval', type=float, default=10, help="seconds between refreshes of a polling dashboard")
+    args = parser.parse_args()
+
+    live_service.LIVE_MAX_STREAMS = args.dashboards
+    live_service.LIVE_KEEPALIVE = 1
+    db = seed(args.users)
+    user_ids = [snapshot.id for snapshot in db.collection('users').limit(100).stream()]
+
+    per_refresh = polling_reads(db)
+    refreshes = args.dashboards * args.duration / args.interval
+    print(f"{'polling':<8} {per_refresh} reads per refresh x {refreshes:.0f} refreshes = "
+          f"{per_refresh * refreshes:.0f} reads; new interactions show up {args.interval / 2:.1f} s late on average")
+
+    from app import app
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+
+    recovered = check_listener_recovery()
+
+    latencies = []
+    ready = threading.Semaphore(0)
+    stop = threading.Event()
+    followers = [threading.Thread(target=follow, args=(client, latencies, ready, stop), daemon=True)
+                 for _ in range(args.dashboards)]
+    for follower in followers:
+        follower.start()
+    for _ in followers:
+        ready.acquire()
+
+    db.reads = 0
+    written = write_interactions(db, user_ids, args.rate, args.duration)
+    time.sleep(0.5)
+    reads = db.reads
+    stop.set()
+    for follower in followers:
+        follower.join(timeout=5)
+
+    delivered = len(latencies)
+    print(f"{'live':<8} {reads} reads for {written} interactions; {delivered} of {written * args.dashboards} "
+          f"deliveries, latency p50 {percentile(latencies, 0.5):.1f} ms, p95 {percentile(latencies, 0.95):.1f} ms, "
+          f"max {percentile(latencies, 1):.1f} ms")
+    sys.exit(0 if recovered and delivered == written * args.dashboards else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Measure log parsing throughput for the text and JSONL formats.
+
+    python benchmarks/bench_log_parse.py --entries 200000
+
+"legacy find()" is the bracket slicing /logs used before log_format.parse_line.
+Text entries with data span several lines, so lines/s and entries/s differ.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import log_format
+
+CATEGORIES = ['whatsapp', 'openai', 'storage', 'system', 'error']
+
+def generate_records(count):
+    rng = random.Random(42)
+    records = []
+    for i in range(count):
+        data = None
+        if i % 2:
+            data = {'body': f"mensagem {rng.random():.6f}", 'step': i % 14, 'raw': bytes([i % 256]) * 8}
+        records.append((rng.choice(CATEGORIES), f"2024-01-01 12:{i // 60 % 60:02d}:{i % 60:02d}.000",
+                        "Mensagem recebida", f"5511{rng.randrange(10**8):08d}", data, None))
+    return records
+
+def legacy_parse(line):
+    timestamp_match = line.find(']')
+    if timestamp_match > 0:
+        timestamp = line[1:timestamp_match]
+        rest = line[timestamp_match+1:].strip()
+    else:
+        timestamp = ""
+        rest = line
+    category_match = rest.find(']')
+    if category_match > 0:
+        category = rest[1:category_match]
+        rest = rest[category_match+1:].strip()
+    else:
+        category = ""
+    user_match = rest.find(']')
+    if user_match > 0 and rest.startswith('[User:'):
+        user = rest[7:user_match]
+        rest = rest[user_match+1:].strip()
+    else:
+        user = ""
+    return timestamp, category, user, rest
+
+def measure(label, lines, entries, fn):
+    started = time.perf_counter()
+    for line in lines:
+        fn(line)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {len(lines) / elapsed:12.0f} lines/s {entries / elapsed:12.0f} entries/s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=200000)
+    args = parser.parse_args()
+
+    records = generate_records(args.entries)
+    text_lines = ''.join(log_format.format_text(r) for r in records).splitlines()
+    jsonl_lines = ''.join(log_format.format_jsonl(r) for r in records).splitlines()
+    print(f"{args.entries} entries: {len(text_lines)} text lines, {len(jsonl_lines)} JSONL lines")
+
+    measure("legacy find() on text", text_lines, args.entries, legacy_parse)
+    measure("parse_header on text", text_lines, args.entries, log_format.parse_header)
+    measure("parse_line on text", text_lines, args.entries, log_format.parse_line)
+    measure("parse_header on JSONL", jsonl_lines, args.entries, log_format.parse_header)
+    measure("parse_line on JSONL", jsonl_lines, args.entries, log_format.parse_line)
+
+    started = time.perf_counter()
+    count = sum(1 for _ in log_format.iter_text_entries(text_lines))
+    elapsed = time.perf_counter() - started
+    print(f"{'iter_text_entries (full)':<28} {len(text_lines) / elapsed:12.0f} lines/s {count / elapsed:12.0f} entries/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark the /logs tail reader against a large synthetic log file.
+
+    python benchmarks/bench_log_tail.py --size-mb 2048 --lines 100
+    python benchmarks/bench_log_tail.py --size-mb 2048 --baseline   # also time readlines()
+
+The synthetic file is cached in the temp directory and reused between runs.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.log_reader import tail_lines
+
+CATEGORIES = ['WHATSAPP', 'OPENAI', 'STORAGE', 'SYSTEM', 'ERROR']
+
+def generate_log(path, size_mb):
+    target = size_mb * 1024 * 1024
+    rng = random.Random(42)
+    written = 0
+    chunk = []
+    with open(path, 'w', encoding='utf-8') as f:
+        while written < target:
+            user = f"5511{rng.randrange(10**8):08d}"
+            line = (f"[2024-01-01 12:00:{rng.randrange(60):02d}.000] [{rng.choice(CATEGORIES)}] "
+                    f"[User: {user}] Mensagem recebida com conteúdo {rng.random():.6f}\n")
+            chunk.append(line)
+            written += len(line.encode('utf-8'))
+            if len(chunk) >= 10000:
+                f.write(''.join(chunk))
+                chunk = []
+        f.write(''.join(chunk))
+
+def measure(label, fn):
+    # Time without tracemalloc, which slows allocation-heavy code considerably
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<32} {elapsed * 1000:10.1f} ms  peak {peak / 1024 / 1024:8.1f} MiB  {len(result)} lines")
+
+def readlines_tail(path, count):
+    with open(path, 'r', encoding='utf-8') as f:
+        all_lines = f.readlines()
+    all_lines = all_lines[-count:]
+    all_lines.reverse()
+    return all_lines
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=2048)
+    parser.add_argument('--lines', type=int, default=100)
+    parser.add_argument('--baseline', action='store_true', help="also time the old readlines() approach")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.gettempdir(), f"fuelqpro_bench_{args.size_mb}mb.log")
+    if not os.path.exists(path):
+        print(f"Generating {args.size_mb} MiB synthetic log at {path}...")
+        generate_log(path, args.size_mb)
+
+    print(f"File size: {os.path.getsize(path) / 1024 / 1024:.0f} MiB")
+    measure(f"tail_lines last {args.lines}", lambda: tail_lines(path, args.lines))
+    measure("tail_lines search (rare)", lambda: tail_lines(path, args.lines, search='0.99999'))
+    measure("tail_lines user_id", lambda: tail_lines(path, 10, user_id='551100000042'))
+    if args.baseline:
+        measure(f"readlines() last {args.lines}", lambda: readlines_tail(path, args.lines))
+
+if __name__ == "__main__":
+    main()
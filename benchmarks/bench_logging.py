@@ -0,0 +1,62 @@
+"""
+Compare synchronous and queued log_event throughput.
+
+    python benchmarks/bench_logging.py --events 50000 --threads 8
+
+Logs are written to a temporary directory. "caller" is the rate seen by the
+threads calling log_event; "flushed" includes draining the queue to disk.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["LOGS_DIR"] = tempfile.mkdtemp(prefix="fuelqpro_bench_logs_")
+
+from services import logging_service
+
+def run(events, threads):
+    per_thread = events // threads
+
+    def worker(thread_id):
+        for i in range(per_thread):
+            logging_service.log_whatsapp(
+                "Mensagem recebida",
+                {'body': f"mensagem {i}", 'step': i % 14},
+                user_id=f"55119{thread_id:04d}{i % 100:04d}"
+            )
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    caller = time.perf_counter() - started
+    logging_service.flush_logs()
+    flushed = time.perf_counter() - started
+    return per_thread * threads, caller, flushed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=50000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--policy', default='block', choices=['block', 'drop_oldest', 'sample'],
+                        help="queue-full policy; 'block' writes every event so the rates compare like for like")
+    args = parser.parse_args()
+
+    logging_service.LOG_QUEUE_POLICY = args.policy
+
+    for label, queued in (("synchronous", False), ("queued", True)):
+        logging_service.ASYNC_LOGGING = queued
+        logging_service._stopping = False
+        count, caller, flushed = run(args.events, args.threads)
+        print(f"{label:<12} caller {count / caller:10.0f} events/s   flushed {count / flushed:10.0f} events/s")
+
+    print(logging_service.log_queue_stats())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Throughput of normalization_service on synthetic questionnaire answers
+written the ways athletes type them ("sim!", "masc", "75,5 kg", "1.80m",
+"6 a 8h"): profiles/sec normalized one at a time, in bulk into typed NumPy
+columns, and in bulk into the canonical maps stored on user documents.
+
+    python benchmarks/bench_normalization.py --profiles 1000000
+    python benchmarks/bench_normalization.py --profiles 100000 --check 100000
+
+Caches are cleared before each run, so every run parses each distinct answer
+once. Bulk normalization needs the numpy package.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import normalization_service
+
+VARIANTS = {
+    'experience': ['Iniciante', 'iniciante', 'INICIANTE', 'Intermediário', 'intermediario', 'Intermedio',
+                   'Avançado', 'avancado', 'avançada', 'Experiente', 'sei lá', ''],
+    'gender': ['Masculino', 'masculino', 'Masc', 'M', 'Feminino', 'feminino', 'F', 'Mulher', 'homem'],
+    'diet': ['Como de tudo', 'como de tudo!', 'tudo', 'Vegano', 'vegana', 'Vegetariano', 'vegetariana',
+             'Low carb', 'lowcarb', 'paleo', ''],
+    'carb_adapted': ['Sim', 'sim', 'sim!', 'S', 'Não', 'nao', 'não.', 'N', 'não sei'],
+    'cramps': ['Sim', 'sim', 'às vezes', 'raramente', 'Não', 'nao', 'NÃO'],
+    'plan_type': ['Diário', 'diario', 'Diária', 'Semanal', 'semanal', 'semana'],
+    'sports': ['Ciclismo', 'ciclismo, corrida', 'Corrida e Natação', 'bike', 'Triathlon', 'triatlo / natação',
+               'MTB', 'mountain bike', 'Musculação, crossfit', 'corrida; yoga', 'Natação'],
+}
+
+def numeric_answer(rng, field):
+    if field == 'age':
+        age = rng.randint(16, 70)
+        return rng.choice([str(age), f"{age} anos", age])
+    if field == 'weight':
+        weight = rng.randint(45, 110)
+        return rng.choice([str(weight), f"{weight} kg", f"{weight},{rng.randint(0, 9)}kg", f"{weight}kg"])
+    if field == 'height':
+        height = rng.randint(150, 200)
+        return rng.choice([str(height), f"{height} cm", f"1,{height - 100}", f"1.{height - 100}m"])
+    hours = rng.randint(2, 20)
+    return rng.choice([str(hours), f"{hours}h", f"{hours} horas", f"{hours} a {hours + 2}h", f"{hours}h30"])
+
+def profiles(count, seed):
+    rng = random.Random(seed)
+    # A pool of answers per field sampled with replacement: realistic repetition without a slow loop per cell
+    columns = {}
+    for field in normalization_service.NUMERIC_FIELDS:
+        pool = [numeric_answer(rng, field) for _ in range(5000)]
+        columns[field] = rng.choices(pool, k=count)
+    for field, variants in VARIANTS.items():
+        columns[field] = rng.choices(variants, k=count)
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+def clear_caches():
+    for function in (normalization_service.parse_number, normalization_service.category_code,
+                     normalization_service.sports_mask):
+        function.cache_clear()
+
+def run(label, function, count):
+    clear_caches()
+    started = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<36} {elapsed:8.2f} s {count / elapsed:>12,.0f} profiles/sec")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', type=int, default=1000000)
+    parser.add_argument('--check', type=int, default=10000, help="profiles compared between the row and bulk paths")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    rows = profiles(args.profiles, args.seed)
+    print(f"Generated {args.profiles:,} profiles in {time.perf_counter() - started:.1f} s")
+
+    by_row = run("normalize_profile, one at a time", lambda: [normalization_service.normalize_profile(profile)
+                                                             for profile in rows], args.profiles)
+    if normalization_service.np is None:
+        print("Bulk normalization skipped: the numpy package is not installed")
+        return
+
+    columns = run("normalize_columns (typed arrays)", lambda: normalization_service.normalize_columns(rows),
+                  args.profiles)
+    in_bulk = run("normalize_profiles (canonical maps)", lambda: normalization_service.normalize_profiles(rows),
+                  args.profiles)
+
+    checked = min(args.check, args.profiles)
+    mismatches = sum(1 for one, other in zip(by_row[:checked], in_bulk[:checked]) if one != other)
+    unparsed = {field: int(normalization_service.np.isnan(columns[field]).sum())
+                for field in normalization_service.NUMERIC_FIELDS}
+    print(f"Unparsed numeric answers: {unparsed}")
+    print(f"{'PASS' if not mismatches else 'FAIL'}  {mismatches} of {checked} profiles differ between the row "
+          f"and bulk paths")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
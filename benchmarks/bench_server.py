@@ -0,0 +1,123 @@
+"""
+Load-test the admin console under gunicorn (gunicorn.conf.py) for each worker
+model: requests/sec and latency for /, /users and /logs.
+
+    python benchmarks/bench_server.py --duration 10 --concurrency 32
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python benchmarks/bench_server.py --models gthread gevent
+
+Requests carry a signed admin session cookie, so no login round trip is
+needed. gevent is skipped when the package is not installed. Without
+credentials or an emulator, / and /users measure the Firebase error path.
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+import subprocess
+import collections
+import http.client
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def session_cookie():
+    os.environ["STARTUP_WARMUP"] = "off"
+    from app import app
+    serializer = app.session_interface.get_signing_serializer(app)
+    return serializer.dumps({'admin_logged_in': True, 'admin_id': 'bench', 'admin_name': 'Benchmark'})
+
+def start_server(model, workers, threads, port):
+    env = dict(os.environ, PORT=str(port), GUNICORN_WORKER_CLASS=model, WEB_CONCURRENCY=str(workers),
+               GUNICORN_THREADS=str(threads), GUNICORN_LOG_LEVEL="warning", STARTUP_WARMUP="background")
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+                                '--access-logfile', '/dev/null', 'app:app'],
+                               cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/login')
+            connection.getresponse().read()
+            connection.close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"gunicorn ({model}) did not start")
+
+def load(port, path, cookie, concurrency, duration):
+    latencies = []
+    statuses = collections.Counter()
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client():
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path, headers={'Cookie': f"session={cookie}"})
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+                if response.getheader('Connection', '').lower() == 'close':
+                    connection.close()
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                status = 'error'
+            with lock:
+                latencies.append(time.perf_counter() - started)
+                statuses[status] += 1
+        connection.close()
+
+    clients = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for c in clients:
+        c.start()
+    for c in clients:
+        c.join()
+    return latencies, statuses, time.perf_counter() - started
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models', nargs='+', default=['sync', 'gthread', 'gevent'])
+    parser.add_argument('--paths', nargs='+', default=['/', '/users', '/logs'])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--warmup', type=float, default=5.0, help="seconds to let workers connect before measuring")
+    args = parser.parse_args()
+
+    cookie = session_cookie()
+    for model in args.models:
+        if model == 'gevent' and importlib.util.find_spec('gevent') is None:
+            print("gevent: skipped, the gevent package is not installed")
+            continue
+        port = free_port()
+        process = start_server(model, args.workers, args.threads, port)
+        try:
+            time.sleep(args.warmup)
+            for path in args.paths:
+                latencies, statuses, elapsed = load(port, path, cookie, args.concurrency, args.duration)
+                print(f"{model:<8} {path:<7} {len(latencies) / elapsed:8.1f} req/s   "
+                      f"p50 {percentile(latencies, 0.50) * 1000:8.1f} ms   p99 {percentile(latencies, 0.99) * 1000:8.1f} ms   "
+                      f"{dict(statuses)}")
+        finally:
+            process.terminate()
+            process.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Compare one blocking upload_from_string() per PDF with the upload_service pool.
+"caller" is the time a request thread spends handing off a PDF; "stored" is
+until the object is stored and the success callback has run.
+
+    python benchmarks/bench_uploads.py --uploads 200 --size-kb 200 --duplicates 0.25 --latency-ms 20 --rate 50
+    STORAGE_EMULATOR_HOST=http://localhost:4443 python benchmarks/bench_uploads.py   # fake-gcs-server
+
+Without STORAGE_EMULATOR_HOST an in-process fake GCS server (benchmarks/fake_gcs.py)
+is started; --latency-ms adds a delay to each of its requests. --large-mb adds
+reports above the resumable threshold to exercise chunked uploads.
+"""
+import os
+import sys
+import time
+import uuid
+import random
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gcs import FakeGCS
+
+def make_payloads(count, size, duplicates, large, large_size):
+    rng = random.Random(42)
+    unique = []
+    payloads = []
+    for i in range(count):
+        if unique and rng.random() < duplicates:
+            payloads.append(rng.choice(unique))
+            continue
+        body_size = large_size if i < large else size
+        data = b"%PDF-1.4\n" + rng.randbytes(body_size)
+        unique.append(data)
+        payloads.append(data)
+    return payloads
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def report(label, latencies, elapsed):
+    print(f"{label:<24} {len(latencies) / elapsed:8.1f} uploads/s   "
+          f"p50 {percentile(latencies, 0.50) * 1000:8.1f} ms   p99 {percentile(latencies, 0.99) * 1000:8.1f} ms")
+
+def paced(payloads, rate):
+    """Yield payloads no faster than `rate` per second across all callers (0: unpaced)"""
+    lock = threading.Lock()
+    pending = list(payloads)
+    start = time.perf_counter()
+    issued = [0]
+
+    def take():
+        with lock:
+            if not pending:
+                return None
+            data = pending.pop()
+            due = start + issued[0] / rate if rate else 0
+            issued[0] += 1
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        return data
+
+    return take
+
+def run_blocking(bucket, payloads, threads, rate):
+    # The previous path: a fresh object per call, uploaded in the caller's thread
+    latencies = []
+    lock = threading.Lock()
+    take = paced(payloads, rate)
+
+    def worker():
+        while True:
+            data = take()
+            if data is None:
+                return
+            started = time.perf_counter()
+            bucket.blob(f"legacy/plan_{uuid.uuid4().hex}.pdf").upload_from_string(data, content_type='application/pdf')
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return latencies, time.perf_counter() - started
+
+def run_pool(bucket, payloads, threads, rate):
+    # Request threads hand the PDF to the pool and return; completion is timed in the callback
+    from services import upload_service
+
+    callers = []
+    completions = []
+    futures = []
+    lock = threading.Lock()
+    take = paced(payloads, rate)
+
+    def worker():
+        while True:
+            data = take()
+            if data is None:
+                return
+            submitted = time.perf_counter()
+
+            def done(result, submitted=submitted):
+                with lock:
+                    completions.append(time.perf_counter() - submitted)
+
+            future = upload_service.submit_upload(bucket, data, prefix='bench', on_success=done,
+                                                  log_message=lambda message: None)
+            with lock:
+                callers.append(time.perf_counter() - submitted)
+                futures.append(future)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    for future in futures:
+        future.result()
+    return callers, completions, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uploads', type=int, default=200)
+    parser.add_argument('--size-kb', type=int, default=200)
+    parser.add_argument('--duplicates', type=float, default=0.25, help="fraction of uploads repeating an earlier PDF")
+    parser.add_argument('--large', type=int, default=0, help="number of large reports among the uploads")
+    parser.add_argument('--large-mb', type=int, default=12)
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    parser.add_argument('--workers', type=int, default=8, help="upload pool size")
+    parser.add_argument('--callers', type=int, default=8, help="concurrent request threads")
+    parser.add_argument('--rate', type=float, default=50.0, help="arrivals per second; 0 saturates the callers")
+    args = parser.parse_args()
+
+    fake = None
+    if not os.getenv("STORAGE_EMULATOR_HOST"):
+        fake = FakeGCS(latency=args.latency_ms / 1000.0).start()
+        os.environ["STORAGE_EMULATOR_HOST"] = fake.url
+
+    os.environ["UPLOAD_WORKERS"] = str(args.workers)
+    from google.cloud import storage
+    client = storage.Client(project="fuelqpro-bench")
+    bucket = client.bucket(f"bench-{uuid.uuid4().hex[:8]}")
+    if fake is None:
+        bucket = client.create_bucket(bucket)
+
+    payloads = make_payloads(args.uploads, args.size_kb * 1024, args.duplicates, args.large, args.large_mb * 1024 * 1024)
+    print(f"{len(payloads)} uploads at {args.rate or 'max'}/s, {len(set(payloads))} distinct, "
+          f"{args.callers} callers, {args.workers} workers, "
+          f"{'fake GCS +' + str(args.latency_ms) + ' ms/request' if fake else os.environ['STORAGE_EMULATOR_HOST']}")
+
+    latencies, elapsed = run_blocking(bucket, payloads, args.callers, args.rate)
+    report("blocking (caller)", latencies, elapsed)
+
+    callers, completions, elapsed = run_pool(bucket, payloads, args.callers, args.rate)
+    report("pool (caller)", callers, elapsed)
+    report("pool (stored)", completions, elapsed)
+
+    from services import upload_service
+    print(upload_service.upload_stats())
+    if fake:
+        print(f"fake GCS stored {len(fake.objects)} objects")
+        fake.stop()
+
+if __name__ == "__main__":
+    main()
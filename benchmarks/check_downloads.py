@@ -0,0 +1,132 @@
+"""
+Check the /download/<filename> proxy against a local fake bucket: full and
+ranged downloads, conditional requests, the concurrent stream cap, and peak
+memory while streaming a large object.
+
+    python benchmarks/check_downloads.py --size-mb 32
+
+Starts the in-process fake GCS server (benchmarks/fake_gcs.py) unless
+STORAGE_EMULATOR_HOST is already set.
+"""
+import os
+import sys
+import uuid
+import random
+import argparse
+import tracemalloc
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gcs import FakeGCS
+
+failures = []
+
+def check(label, condition, detail=''):
+    print(f"{'ok  ' if condition else 'FAIL'} {label}{' - ' + str(detail) if detail and not condition else ''}")
+    if not condition:
+        failures.append(label)
+
+def fetch(client, url, method='GET', headers=None):
+    # The test client leaves responses open; a WSGI server closes them, which frees the stream slot
+    response = client.open(url, method=method, headers=headers)
+    response.close()
+    return response
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=32, help="size of the large object streamed for the memory check")
+    parser.add_argument('--streams', type=int, default=2, help="DOWNLOAD_MAX_STREAMS for the cap check")
+    args = parser.parse_args()
+
+    fake = None
+    if not os.getenv("STORAGE_EMULATOR_HOST"):
+        fake = FakeGCS().start()
+        os.environ["STORAGE_EMULATOR_HOST"] = fake.url
+    os.environ["GCS_BUCKET_NAME"] = f"check-{uuid.uuid4().hex[:8]}"
+    os.environ["DOWNLOAD_MAX_STREAMS"] = str(args.streams)
+    os.environ["DOWNLOAD_SLOT_TIMEOUT"] = "0.2"
+
+    import config
+    from app import app
+    from services import download_service, upload_service
+
+    rng = random.Random(7)
+    quiet = lambda message: None
+    small = b"%PDF-1.4\n" + rng.randbytes(300 * 1024)
+    large = b"%PDF-1.4\n" + rng.randbytes(args.size_mb * 1024 * 1024)
+    small_name = upload_service.upload_bytes(config.storage_bucket, small, prefix='', log_message=quiet)['filename']
+    large_name = upload_service.upload_bytes(config.storage_bucket, large, prefix='', log_message=quiet)['filename']
+    client = app.test_client()
+    url = f"/download/{small_name}"
+
+    response = fetch(client, url)
+    etag = response.headers.get('ETag')
+    check("full download", response.status_code == 200 and response.data == small, response.status_code)
+    check("content length", response.headers.get('Content-Length') == str(len(small)))
+    check("cache headers", etag and 'immutable' in response.headers.get('Cache-Control', ''), dict(response.headers))
+
+    response = fetch(client, url, headers={'Range': 'bytes=100-199'})
+    check("byte range", response.status_code == 206 and response.data == small[100:200], response.status_code)
+    check("content range", response.headers.get('Content-Range') == f"bytes 100-199/{len(small)}",
+          response.headers.get('Content-Range'))
+
+    response = fetch(client, url, headers={'Range': 'bytes=-50'})
+    check("suffix range", response.status_code == 206 and response.data == small[-50:], response.status_code)
+
+    response = fetch(client, url, headers={'Range': f'bytes={len(small)}-'})
+    check("unsatisfiable range", response.status_code == 416, response.status_code)
+
+    response = fetch(client, url, headers={'If-None-Match': etag})
+    check("If-None-Match", response.status_code == 304 and not response.data, response.status_code)
+
+    response = fetch(client, url, headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+    check("stale If-Range sends the whole object", response.status_code == 200 and response.data == small,
+          response.status_code)
+
+    response = fetch(client, url, method='HEAD')
+    check("HEAD", response.status_code == 200 and not response.data, response.status_code)
+
+    check("unknown object", fetch(client, f"/download/{'0' * 64}.pdf").status_code == 404)
+    check("non content-addressed name", fetch(client, "/download/test_file.txt").status_code == 404)
+
+    # Links sent before plans were content-addressed keep working, without the immutable caching
+    for legacy_name in ("plan_joão_silva_1704067200_1a2b3c4d.pdf", "plans/plan_maria_d'ávila_1704067200_5e6f7a8b.pdf"):
+        config.storage_bucket.blob(legacy_name).upload_from_string(small, content_type='application/pdf')
+        response = fetch(client, f"/download/{urllib.parse.quote(legacy_name)}")
+        check(f"legacy plan name {legacy_name}", response.status_code == 200 and response.data == small
+              and 'immutable' not in response.headers.get('Cache-Control', ''), dict(response.headers))
+    check("no traversal out of plans/", fetch(client, "/download/plans/../secret/plan_x.pdf").status_code == 404)
+
+    # Hold every stream open; the next request is turned away until one closes
+    held = [client.get(url, buffered=False) for _ in range(args.streams)]
+    response = fetch(client, url)
+    check("stream cap", response.status_code == 503, response.status_code)
+    held.pop().close()
+    response = fetch(client, url)
+    check("stream freed on close", response.status_code == 200, response.status_code)
+    for response in held:
+        response.close()
+
+    tracemalloc.start()
+    response = client.get(f"/download/{large_name}", buffered=False)
+    received = 0
+    for chunk in response.iter_encoded():
+        received += len(chunk)
+    response.close()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    check(f"streamed {args.size_mb} MB", received == len(large), received)
+    check("peak memory bounded by chunks", peak < 4 * download_service.DOWNLOAD_CHUNK_SIZE + 1024 * 1024,
+          f"{peak / 1048576:.1f} MB peak")
+    print(f"peak traced memory while streaming {args.size_mb} MB: {peak / 1048576:.1f} MB "
+          f"({download_service.DOWNLOAD_CHUNK_SIZE // 1024} KiB chunks)")
+
+    if fake:
+        fake.stop()
+    if failures:
+        print(f"{len(failures)} check(s) failed")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
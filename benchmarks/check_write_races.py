@@ -0,0 +1,140 @@
+"""
+Check the user and plan write paths for lost updates under parallel writers.
+
+    firebase emulators:start --only firestore
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python benchmarks/check_write_races.py --writers 32
+    python benchmarks/check_write_races.py --memory
+
+Each run uses a fresh project id, so the emulator does not need clearing.
+--memory runs against the in-memory backend (services/memory_firestore.py)
+instead, which aborts and retries transactions the same way; it sleeps
+--read-delay seconds after each document read so writers interleave between
+a read and the write that depends on it, as they do over the network.
+--legacy also runs the old read, append, update() plan path for comparison;
+it must lose plans, or the run could not have caught a lost update.
+"""
+import os
+import sys
+import time
+import uuid
+import argparse
+import datetime
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import firebase_service, memory_firestore, plan_service, stats_service
+
+def parallel(writers, target):
+    barrier = threading.Barrier(writers)
+    errors = []
+
+    def worker(n):
+        barrier.wait()
+        try:
+            # save_user_data reports failures by returning False instead of raising
+            if target(n) is False:
+                errors.append(RuntimeError(f"writer {n} failed"))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(writers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - started, errors
+
+# Every writer uploads the same PDF: content-addressed storage gives them one
+# filename, and each upload must still be its own plan
+RACE_SHA256 = uuid.uuid4().hex * 2
+
+def make_plan(n):
+    return {
+        'filename': f"plans/{RACE_SHA256}.pdf",
+        'created_at': datetime.datetime.now(datetime.timezone.utc),
+        'url': f"https://example.invalid/{n}",
+        'sha256': RACE_SHA256
+    }
+
+def legacy_append(db, user_id, plan):
+    # The old path: read the whole document, append in Python, write the array back
+    user_ref = db.collection('users').document(user_id)
+    user_data = user_ref.get().to_dict() or {}
+    pdf_list = user_data.get('pdf_plans', [])
+    pdf_list.append(plan)
+    user_ref.update({'pdf_plans': pdf_list})
+
+def report(label, ok, detail):
+    print(f"{'PASS' if ok else 'FAIL':<5} {label}: {detail}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=32)
+    parser.add_argument('--legacy', action='store_true', help="also run the old read-modify-write plan append")
+    parser.add_argument('--memory', action='store_true', help="use the in-memory backend instead of the emulator")
+    parser.add_argument('--read-delay', type=float, default=0.005,
+                        help="seconds the in-memory backend sleeps after each document read")
+    args = parser.parse_args()
+
+    if args.memory:
+        db = memory_firestore.MemoryFirestore()
+        db.read_delay = args.read_delay
+    elif os.getenv("FIRESTORE_EMULATOR_HOST"):
+        from google.cloud import firestore as cloud_firestore
+        db = cloud_firestore.Client(project=f"fuelqpro-race-{uuid.uuid4().hex[:8]}")
+    else:
+        print("Set FIRESTORE_EMULATOR_HOST to a running Firestore emulator, or pass --memory")
+        sys.exit(2)
+
+    # Share the client without going through credential-based initialization
+    firebase_service.db = db
+    firebase_service._last_health_check = time.monotonic()
+    quiet = lambda message: None
+    passed = True
+
+    # Concurrent first saves of the same new user, each adding its own field
+    user_id = 'race_user'
+    elapsed, errors = parallel(args.writers, lambda n: firebase_service.save_user_data(
+        user_id, {'profile': {f"field_{n}": n}, 'step': n}, log_message=quiet))
+    data = db.collection('users').document(user_id).get().to_dict() or {}
+    fields = len(data.get('profile', {}))
+    stats = stats_service.get_dashboard_stats(db)
+    passed &= report("save_user_data fields", fields == args.writers and not errors,
+                     f"{fields}/{args.writers} profile fields in {elapsed * 1000:.0f} ms, {len(errors)} errors")
+    passed &= report("save_user_data counters", stats['total_users'] == 1 and stats['active_today'] == 1,
+                     f"total_users={stats['total_users']} active_today={stats['active_today']}")
+
+    # Second round takes the blind update path
+    elapsed, errors = parallel(args.writers, lambda n: firebase_service.save_user_data(
+        user_id, {'profile': {f"again_{n}": n}}, log_message=quiet))
+    data = db.collection('users').document(user_id).get().to_dict() or {}
+    fields = len(data.get('profile', {}))
+    passed &= report("save_user_data blind updates", fields == 2 * args.writers and not errors,
+                     f"{fields}/{2 * args.writers} profile fields in {elapsed * 1000:.0f} ms, {len(errors)} errors")
+
+    # Concurrent plan uploads for one user
+    elapsed, errors = parallel(args.writers, lambda n: firebase_service.append_plan(user_id, make_plan(n), 'Race'))
+    data = db.collection('users').document(user_id).get().to_dict() or {}
+    plans = len(data.get('pdf_plans', []))
+    indexed = len(list(db.collection(plan_service.PLANS_COLLECTION).where('user_id', '==', user_id).stream()))
+    stats = stats_service.get_dashboard_stats(db)
+    passed &= report("append_plan", plans == indexed == data.get('plan_count') == args.writers and not errors,
+                     f"{plans} plans, {indexed} index documents, plan_count={data.get('plan_count')}, "
+                     f"total_plans={stats['total_plans']} in {elapsed * 1000:.0f} ms, {len(errors)} errors")
+
+    if args.legacy:
+        legacy_user = 'race_user_legacy'
+        db.collection('users').document(legacy_user).set({'pdf_plans': []})
+        elapsed, errors = parallel(args.writers, lambda n: legacy_append(db, legacy_user, make_plan(n)))
+        data = db.collection('users').document(legacy_user).get().to_dict() or {}
+        kept = len(data.get('pdf_plans', []))
+        passed &= report("legacy read-modify-write loses plans", kept < args.writers,
+                         f"kept {kept}/{args.writers} plans in {elapsed * 1000:.0f} ms")
+
+    sys.exit(0 if passed else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Minimal in-process stand-in for the GCS JSON API, for the storage benchmarks.
+
+Implements what the google-cloud-storage client uses for the upload and
+download paths: bucket and object metadata GETs, multipart uploads, resumable
+sessions with chunked PUTs, media downloads with Range, and ifGenerationMatch
+preconditions. Point a client at it with STORAGE_EMULATOR_HOST=http://127.0.0.1:<port>.
+"""
+import json
+import time
+import uuid
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FakeGCS:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.objects = {}   # (bucket, name) -> (metadata, bytes)
+        self.sessions = {}  # upload id -> [bucket, metadata, bytearray]
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+    def _store(self, bucket, metadata, data):
+        name = metadata['name']
+        with self.lock:
+            generation = str(int(time.time() * 1000000))
+            resource = {
+                'kind': 'storage#object', 'bucket': bucket, 'name': name,
+                'id': f"{bucket}/{name}/{generation}", 'generation': generation,
+                'size': str(len(data)), 'contentType': metadata.get('contentType', 'application/octet-stream'),
+                'md5Hash': '', 'etag': uuid.uuid4().hex, 'updated': time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime())
+            }
+            self.objects[(bucket, name)] = (resource, bytes(data))
+            return resource
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=b'', headers=None):
+                if isinstance(body, (dict, list)):
+                    body = json.dumps(body).encode()
+                    headers = dict(headers or {}, **{'Content-Type': 'application/json'})
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _body(self):
+                return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+            def _route(self):
+                with fake.lock:
+                    fake.requests += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+                parsed = urllib.parse.urlsplit(self.path)
+                return [urllib.parse.unquote(part) for part in parsed.path.split('/')], dict(urllib.parse.parse_qsl(parsed.query))
+
+            def _precondition_failed(self, bucket, name, query):
+                return query.get('ifGenerationMatch') == '0' and (bucket, name) in fake.objects
+
+            def do_GET(self):
+                parts, query = self._route()
+                # /storage/v1/b/<bucket>/o/<name> and /download/storage/v1/b/<bucket>/o/<name>
+                if 'o' not in parts:
+                    if 'b' in parts and len(parts) > parts.index('b') + 1:
+                        # Every bucket exists
+                        bucket = parts[parts.index('b') + 1]
+                        return self._send(200, {'kind': 'storage#bucket', 'name': bucket, 'id': bucket})
+                    return self._send(404, {'error': {'code': 404}})
+                bucket = parts[parts.index('b') + 1]
+                name = '/'.join(parts[parts.index('o') + 1:])
+                entry = fake.objects.get((bucket, name))
+                if entry is None:
+                    return self._send(404, {'error': {'code': 404, 'message': 'Not Found'}})
+                resource, data = entry
+                if query.get('ifGenerationMatch') not in (None, resource['generation']):
+                    return self._send(412, {'error': {'code': 412, 'message': 'Precondition Failed'}})
+                if query.get('alt') != 'media':
+                    return self._send(200, resource)
+                ranged = self.headers.get('Range')
+                if ranged and ranged.startswith('bytes='):
+                    start, _, end = ranged[6:].partition('-')
+                    start = int(start)
+                    end = min(int(end), len(data) - 1) if end else len(data) - 1
+                    return self._send(206, data[start:end + 1], {
+                        'Content-Range': f"bytes {start}-{end}/{len(data)}",
+                        'x-goog-generation': resource['generation']})
+                return self._send(200, data, {'x-goog-generation': resource['generation']})
+
+            def do_POST(self):
+                parts, query = self._route()
+                bucket = parts[parts.index('b') + 1]
+                body = self._body()
+
+                if query.get('uploadType') == 'multipart':
+                    boundary = self.headers['Content-Type'].split('boundary=')[1].strip('"').encode()
+                    sections = body.split(b'--' + boundary)
+                    metadata = json.loads(sections[1].split(b'\r\n\r\n', 1)[1].rstrip(b'\r\n'))
+                    data = sections[2].split(b'\r\n\r\n', 1)[1][:-2]
+                    if self._precondition_failed(bucket, metadata['name'], query):
+                        return self._send(412, {'error': {'code': 412, 'message': 'Precondition Failed'}})
+                    return self._send(200, fake._store(bucket, metadata, data))
+
+                if query.get('uploadType') == 'resumable':
+                    metadata = json.loads(body or b'{}')
+                    metadata.setdefault('name', query.get('name'))
+                    if self._precondition_failed(bucket, metadata['name'], query):
+                        return self._send(412, {'error': {'code': 412, 'message': 'Precondition Failed'}})
+                    upload_id = uuid.uuid4().hex
+                    with fake.lock:
+                        fake.sessions[upload_id] = [bucket, metadata, bytearray()]
+                    location = f"{fake.url}/upload/storage/v1/b/{bucket}/o?uploadType=resumable&upload_id={upload_id}"
+                    return self._send(200, b'', {'Location': location})
+
+                return self._send(400, {'error': {'code': 400}})
+
+            def do_PUT(self):
+                parts, query = self._route()
+                body = self._body()
+                session = fake.sessions.get(query.get('upload_id'))
+                if session is None:
+                    return self._send(404, {'error': {'code': 404}})
+                bucket, metadata, received = session
+
+                # Content-Range: bytes <start>-<end>/<total or *>, or bytes */<total>
+                content_range = self.headers.get('Content-Range', '')
+                span, _, total = content_range[6:].partition('/')
+                if span != '*':
+                    start = int(span.split('-')[0])
+                    del received[start:]
+                    received.extend(body)
+                if total != '*' and len(received) >= int(total):
+                    del fake.sessions[query['upload_id']]
+                    return self._send(200, fake._store(bucket, metadata, received))
+                headers = {'Range': f"bytes=0-{len(received) - 1}"} if received else {}
+                return self._send(308, b'', headers)
+
+        return Handler
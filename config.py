@@ -1,4 +1,6 @@
 import os
+import time
+import threading
 from google.cloud import storage
 
 # Debug mode
@@ -7,19 +9,78 @@ DEBUG = os.getenv("DEBUG", "False").lower() in ("true", "1", "t")
 # API keys
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-# Google Cloud Storage setup
+# Google Cloud Storage setup. The client and bucket are created on first use
+# (config.storage_bucket / get_storage_bucket()), so importing this module does
+# no network I/O and a storage outage cannot block startup.
 GCS_BUCKET_NAME = os.getenv("GCS_BUCKET_NAME", "fuelqpro.firebasestorage.app")
-storage_client = storage.Client()
-
-# Initialize storage bucket
-try:
-    storage_bucket = storage_client.get_bucket(GCS_BUCKET_NAME)
-except Exception:
-    try:
-        storage_bucket = storage_client.create_bucket(GCS_BUCKET_NAME)
-    except Exception as e:
-        print(f"Could not create or access bucket: {e}")
-        storage_bucket = None
+# Seconds to wait before retrying after the bucket could not be reached
+STORAGE_RETRY_INTERVAL = int(os.getenv("STORAGE_RETRY_INTERVAL", "30"))
+
+_storage_lock = threading.Lock()
+_storage_client = None
+_storage_bucket = None
+_storage_error = None
+_storage_failed_at = None
+_storage_connect_ms = None
+
+def get_storage_client():
+    """Shared storage client, created on first use"""
+    global _storage_client
+    if _storage_client is None:
+        with _storage_lock:
+            if _storage_client is None:
+                _storage_client = storage.Client()
+    return _storage_client
+
+def get_storage_bucket():
+    """Shared bucket for GCS_BUCKET_NAME, or None while it cannot be reached"""
+    global _storage_client, _storage_bucket, _storage_error, _storage_failed_at, _storage_connect_ms
+
+    if _storage_bucket is not None:
+        return _storage_bucket
+
+    with _storage_lock:
+        if _storage_bucket is not None:
+            return _storage_bucket
+        if _storage_failed_at is not None and time.monotonic() - _storage_failed_at < STORAGE_RETRY_INTERVAL:
+            return None
+
+        started = time.perf_counter()
+        try:
+            client = _storage_client or storage.Client()
+            try:
+                bucket = client.get_bucket(GCS_BUCKET_NAME)
+            except Exception:
+                bucket = client.create_bucket(GCS_BUCKET_NAME)
+        except Exception as e:
+            print(f"Could not create or access bucket: {e}")
+            _storage_error = str(e)
+            _storage_failed_at = time.monotonic()
+            return None
+
+        _storage_client = client
+        _storage_bucket = bucket
+        _storage_error = None
+        _storage_failed_at = None
+        _storage_connect_ms = round((time.perf_counter() - started) * 1000, 1)
+        return bucket
+
+def storage_status():
+    """State of the storage bucket, for the readiness endpoint"""
+    return {
+        'connected': _storage_bucket is not None,
+        'bucket': GCS_BUCKET_NAME,
+        'connect_ms': _storage_connect_ms,
+        'error': _storage_error,
+    }
+
+def __getattr__(name):
+    # Keeps config.storage_client / config.storage_bucket working for existing callers
+    if name == 'storage_client':
+        return get_storage_client()
+    if name == 'storage_bucket':
+        return get_storage_bucket()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Questionnaire steps
 STEPS = [
@@ -0,0 +1,82 @@
+# Production server settings: gunicorn --config gunicorn.conf.py app:app
+#
+# GUNICORN_WORKER_CLASS picks the worker model:
+#   gthread  (default) each worker process serves GUNICORN_THREADS requests at
+#            once on threads; the shared Firestore client is thread-safe
+#   gevent   each worker serves up to GUNICORN_WORKER_CONNECTIONS requests on
+#            greenlets
+import os
+import multiprocessing
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+# gunicorn turns sync workers into gthread ones when threads > 1
+threads = int(os.getenv("GUNICORN_THREADS", "8")) if worker_class == "gthread" else 1
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "100"))
+
+# Requests may wait on Firestore and PDF uploads; graceful_timeout gives a
+# stopping worker time to finish them and flush its queues
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+# Seconds an idle keep-alive connection stays open for the browser's next request
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+# Import the app and compile its templates once in the master; workers share
+# them copy-on-write. Backends are connected and the interaction writer is
+# started per worker in post_fork, so the master must not start them while the
+# app is imported.
+#
+# gevent workers must monkey-patch before grpc, firebase_admin and threading
+# are imported, which a preloading master would already have done; under
+# gevent each worker patches in post_fork and then imports the app itself.
+preload_app = worker_class != "gevent"
+_warmup_mode = os.getenv("STARTUP_WARMUP", "background")
+if preload_app:
+    os.environ["STARTUP_WARMUP"] = "off"
+    os.environ["APP_PRELOAD"] = "1"
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from app import app
+
+    loaded = 0
+    for name in app.jinja_env.list_templates():
+        try:
+            app.jinja_env.get_template(name)
+            loaded += 1
+        except Exception as e:
+            server.log.warning(f"Could not preload template {name}: {str(e)}")
+    server.log.info(f"Preloaded {loaded} templates")
+
+def post_fork(server, worker):
+    if worker_class == "gevent":
+        # Patch before anything else is imported (the worker patches again,
+        # which does nothing); gRPC (Firestore) must cooperate with the hub
+        from gevent import monkey
+        monkey.patch_all()
+        from grpc.experimental import gevent as grpc_gevent
+        grpc_gevent.init_gevent()
+
+    if not preload_app:
+        return  # The worker imports the app next, which connects and starts the writer
+
+    from services import firebase_service, interaction_recorder, startup_service
+
+    # Never reuse clients created before the fork; each worker gets its own
+    firebase_service.reset_after_fork()
+    interaction_recorder.start_recorder()
+    startup_service.STARTUP_WARMUP = _warmup_mode
+    startup_service.start_warmup(server.log.info)
+
+def worker_exit(server, worker):
+    from services.interaction_recorder import flush_interactions
+    from services.logging_service import flush_logs
+
+    flush_interactions()
+    flush_logs()
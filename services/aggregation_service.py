@@ -0,0 +1,119 @@
+import os
+import math
+import time
+import asyncio
+import threading
+
+# Plan statistics from server-side aggregation queries. Each query returns one
+# number and is billed one read per 1000 index entries it matches, instead of
+# one read per user document:
+#
+#   users                        count() and sum(plan_count)
+#   users where plan_count > 0   count()
+#
+# plan_count is maintained on user documents by append_plan; users created
+# before it existed need the backfill (python -m services.user_service
+# backfill-plan-counts) to be counted.
+#
+# Where aggregations fail (older emulators have no sum()), the same summary is
+# computed by scanning users, and aggregations are retried after
+# AGGREGATION_RETRY_INTERVAL seconds. FIRESTORE_AGGREGATIONS=off always scans.
+FIRESTORE_AGGREGATIONS = os.getenv("FIRESTORE_AGGREGATIONS", "auto")
+AGGREGATION_RETRY_INTERVAL = int(os.getenv("AGGREGATION_RETRY_INTERVAL", "300"))
+
+# Index entries covered by one billed read of an aggregation query
+ENTRIES_PER_READ = 1000
+
+_unavailable_until = 0.0
+_state_lock = threading.Lock()
+
+def aggregations_available():
+    return FIRESTORE_AGGREGATIONS != "off" and time.monotonic() >= _unavailable_until
+
+def _mark_unavailable(error, log_message):
+    global _unavailable_until
+    with _state_lock:
+        _unavailable_until = time.monotonic() + AGGREGATION_RETRY_INTERVAL
+    log_message(f">>> Aggregation queries unavailable, scanning instead: {str(error)}")
+
+def _aggregation_reads(*matched):
+    return sum(max(1, math.ceil(count / ENTRIES_PER_READ)) for count in matched)
+
+def _queries(db):
+    users = db.collection('users')
+    totals = users.count(alias='users').sum('plan_count', alias='plans')
+    with_plans = users.where('plan_count', '>', 0).count(alias='users')
+    return totals, with_plans
+
+def _values(result):
+    return {aggregation.alias: aggregation.value for aggregation in result[0]}
+
+def _summary(total_users, users_with_plans, total_plans, method, reads, started):
+    return {
+        'total_users': total_users,
+        'users_with_plans': users_with_plans,
+        'total_plans': total_plans,
+        'percentage_with_plans': round(users_with_plans / total_users * 100, 2) if total_users > 0 else 0,
+        'cost': {
+            'method': method,
+            'reads': reads,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+    }
+
+def _from_aggregations(totals, with_plans, started):
+    total_users = int(totals['users'])
+    users_with_plans = int(with_plans['users'])
+    return _summary(total_users, users_with_plans, int(totals['plans'] or 0), 'aggregation',
+                    _aggregation_reads(total_users, users_with_plans), started)
+
+def _plan_count(user_data):
+    plan_count = user_data.get('plan_count')
+    if isinstance(plan_count, (int, float)):
+        return int(plan_count)
+    pdf_plans = user_data.get('pdf_plans')
+    return len(pdf_plans) if isinstance(pdf_plans, list) else 0
+
+def scan_plan_summary(db, started=None):
+    """plan_summary computed from every user document"""
+    started = started or time.perf_counter()
+    total_users = 0
+    users_with_plans = 0
+    total_plans = 0
+    for user in db.collection('users').select(['plan_count', 'pdf_plans']).stream():
+        plan_count = _plan_count(user.to_dict() or {})
+        total_users += 1
+        total_plans += plan_count
+        if plan_count > 0:
+            users_with_plans += 1
+    return _summary(total_users, users_with_plans, total_plans, 'scan', total_users, started)
+
+def plan_summary(db, log_message=print):
+    """
+    Return total_users, users_with_plans, total_plans and
+    percentage_with_plans, with 'cost': the method used, its (estimated)
+    billed document reads and its latency.
+    """
+    started = time.perf_counter()
+    if aggregations_available():
+        totals, with_plans = _queries(db)
+        try:
+            return _from_aggregations(_values(totals.get()), _values(with_plans.get()), started)
+        except Exception as e:
+            _mark_unavailable(e, log_message)
+    return scan_plan_summary(db, started)
+
+async def plan_summary_async(client, sync_db, log_message=print):
+    """
+    plan_summary for an AsyncClient; both aggregations run concurrently. The
+    scan fallback runs on sync_db in a thread, off the event loop.
+    """
+    started = time.perf_counter()
+    if aggregations_available():
+        totals, with_plans = _queries(client)
+        try:
+            totals, with_plans = await asyncio.gather(totals.get(), with_plans.get())
+            return _from_aggregations(_values(totals), _values(with_plans), started)
+        except Exception as e:
+            _mark_unavailable(e, log_message)
+    return await asyncio.get_running_loop().run_in_executor(None, scan_plan_summary, sync_db, started)
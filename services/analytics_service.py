@@ -0,0 +1,347 @@
+import os
+import sys
+import json
+import time
+import fcntl
+import shutil
+import datetime
+import threading
+import contextlib
+from services.normalization_service import CATEGORIES, NO_ANSWER, NUMERIC_FIELDS, OTHER, SPORTS, normalize_columns
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Columnar snapshot of athlete profiles for the /analytics page. The
+# questionnaire answers are normalized once (normalization_service) into typed
+# NumPy columns:
+#
+#   age, weight, height, training_hours    float32, NaN when unparseable
+#   experience, gender, diet, carb_adapted,
+#   cramps, plan_type                      uint8 category codes (0 = no answer)
+#   sports                                 uint16 bitmask over SPORTS
+#
+# Each column is a .npy file in a generation directory under ANALYTICS_DIR,
+# memory-mapped read-only by every worker process, so cohort queries are
+# vectorized NumPy operations over the mapped columns and cost milliseconds.
+#
+# A refresh writes a new generation and then switches current.json to it, so
+# readers never see a partial snapshot. Views trigger a background refresh
+# once the snapshot is ANALYTICS_REFRESH_INTERVAL seconds old; it reads only
+# users whose last_updated moved since the previous refresh, and re-reads
+# every user (dropping deleted ones) every ANALYTICS_FULL_REFRESH_INTERVAL.
+ANALYTICS_DIR = os.getenv("ANALYTICS_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'analytics')
+ANALYTICS_REFRESH_INTERVAL = int(os.getenv("ANALYTICS_REFRESH_INTERVAL", "300"))
+ANALYTICS_FULL_REFRESH_INTERVAL = int(os.getenv("ANALYTICS_FULL_REFRESH_INTERVAL", "86400"))
+ANALYTICS_PAGE_SIZE = int(os.getenv("ANALYTICS_PAGE_SIZE", "1000"))
+# Seconds before the previous high-water mark that an incremental refresh
+# re-reads, for writes whose server timestamp landed just before it
+ANALYTICS_OVERLAP = 60
+
+# Bumped when the columns or their normalization change, to rebuild old snapshots
+SCHEMA_VERSION = 3
+
+# Histogram bin edges for each numeric field; values beyond the ends fall in the end bins
+HISTOGRAM_EDGES = {
+    'age': list(range(10, 85, 5)),
+    'weight': list(range(40, 140, 10)),
+    'height': list(range(145, 215, 5)),
+    'training_hours': list(range(0, 32, 2)),
+}
+
+def _column_dtypes():
+    dtypes = {field: np.float32 for field in NUMERIC_FIELDS}
+    dtypes.update({field: np.uint8 for field in CATEGORIES})
+    dtypes['sports'] = np.uint16
+    dtypes['last_updated'] = np.float64
+    return dtypes
+
+def _timestamp(value):
+    return value.timestamp() if isinstance(value, datetime.datetime) else float('nan')
+
+def profile_columns(documents):
+    """Snapshot columns for a sequence of user documents"""
+    columns = normalize_columns([data.get('profile') for data in documents])
+    columns['last_updated'] = np.fromiter((_timestamp(data.get('last_updated')) for data in documents),
+                                          dtype=np.float64, count=len(documents))
+    return columns
+
+# Snapshot files
+
+def _current_path():
+    return os.path.join(ANALYTICS_DIR, 'current.json')
+
+def read_current():
+    """The published snapshot's metadata, or None"""
+    try:
+        with open(_current_path()) as f:
+            current = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return current if current.get('schema') == SCHEMA_VERSION else None
+
+@contextlib.contextmanager
+def _refresh_lock(blocking=True):
+    """Exclusive across worker processes; yields False when not blocking and already held"""
+    os.makedirs(ANALYTICS_DIR, exist_ok=True)
+    with open(os.path.join(ANALYTICS_DIR, 'refresh.lock'), 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _write_generation(ids, columns, meta):
+    generation = f"gen-{time.time_ns()}"
+    directory = os.path.join(ANALYTICS_DIR, generation)
+    os.makedirs(directory)
+    np.save(os.path.join(directory, 'ids.npy'), ids)
+    for name, values in columns.items():
+        np.save(os.path.join(directory, f"{name}.npy"), values)
+
+    meta = dict(meta, schema=SCHEMA_VERSION, generation=generation, rows=len(ids))
+    temporary = _current_path() + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(temporary, _current_path())
+
+    # Keep the previous generation for readers that still have it mapped
+    generations = sorted(name for name in os.listdir(ANALYTICS_DIR) if name.startswith('gen-'))
+    for old in generations[:-2]:
+        shutil.rmtree(os.path.join(ANALYTICS_DIR, old), ignore_errors=True)
+    return meta
+
+def _load_columns(generation):
+    directory = os.path.join(ANALYTICS_DIR, generation)
+    ids = np.load(os.path.join(directory, 'ids.npy'), mmap_mode='r')
+    columns = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+               for name in _column_dtypes()}
+    return ids, columns
+
+# Refresh
+
+def _pages(query, page_size):
+    last = None
+    while True:
+        page = list((query.start_after(last) if last is not None else query).limit(page_size).stream())
+        if page:
+            yield page
+            last = page[-1]
+        if len(page) < page_size:
+            return
+
+def _read_users(db, since=None):
+    """(ids, columns) for every user, or those with last_updated >= since"""
+    users = db.collection('users')
+    if since is None:
+        query = users.order_by('__name__')
+    else:
+        since = datetime.datetime.fromtimestamp(since, datetime.timezone.utc)
+        query = users.where('last_updated', '>=', since).order_by('last_updated')
+
+    dtypes = _column_dtypes()
+    ids = []
+    chunks = {name: [] for name in dtypes}
+    for page in _pages(query, ANALYTICS_PAGE_SIZE):
+        ids.extend(snapshot.id for snapshot in page)
+        for name, values in profile_columns([snapshot.to_dict() or {} for snapshot in page]).items():
+            chunks[name].append(values)
+
+    columns = {name: np.concatenate(parts) if parts else np.zeros(0, dtype=dtypes[name])
+               for name, parts in chunks.items()}
+    return np.array(ids, dtype=str), columns
+
+def _merge(base_ids, base_columns, ids, columns):
+    """base with the rows for ids replaced or appended"""
+    index = {user_id: position for position, user_id in enumerate(base_ids.tolist())}
+    positions = np.fromiter((index.get(user_id, -1) for user_id in ids.tolist()), dtype=np.int64, count=len(ids))
+    existing = positions >= 0
+
+    merged_ids = np.concatenate([np.asarray(base_ids), ids[~existing]])
+    merged = {}
+    for name, values in base_columns.items():
+        column = np.concatenate([np.asarray(values), columns[name][~existing]])
+        column[positions[existing]] = columns[name][existing]
+        merged[name] = column
+    return merged_ids, merged
+
+def refresh(db, full=False, wait=True, log_message=print):
+    """
+    Build or update the snapshot and publish it. Incremental unless full, or
+    there is no snapshot yet, or the last full refresh is too old.
+    Returns the published metadata, or None when not waiting for a refresh
+    already running in another process.
+    """
+    if np is None:
+        raise RuntimeError("The analytics snapshot needs the numpy package")
+
+    with _refresh_lock(blocking=wait) as acquired:
+        if not acquired:
+            return None
+        started = time.perf_counter()
+        current = read_current()
+        now = time.time()
+        full = full or current is None or now - current['full_refreshed_at'] > ANALYTICS_FULL_REFRESH_INTERVAL
+
+        if full:
+            ids, columns = _read_users(db)
+            read = len(ids)
+        else:
+            since = current['high_water'] - ANALYTICS_OVERLAP
+            changed_ids, changed = _read_users(db, since)
+            read = len(changed_ids)
+            ids, columns = _merge(*_load_columns(current['generation']), changed_ids, changed)
+
+        stamps = columns['last_updated']
+        stamps = stamps[~np.isnan(stamps)]
+        meta = _write_generation(ids, columns, {
+            'refreshed_at': now,
+            'full_refreshed_at': now if full else current['full_refreshed_at'],
+            'high_water': float(stamps.max()) if len(stamps) else (current or {}).get('high_water', 0.0),
+            'documents_read': read,
+            'full': full,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+        })
+        log_message(f">>> Analytics snapshot {'rebuilt' if full else 'updated'}: {meta['rows']} users, "
+                    f"{read} read in {meta['duration_ms']} ms")
+        return meta
+
+_refresh_thread = None
+_refresh_thread_lock = threading.Lock()
+
+def refresh_in_background(db, log_message=print):
+    """Start a refresh unless one is running in this process; another process may hold the file lock"""
+    global _refresh_thread
+
+    def run():
+        try:
+            refresh(db, wait=False, log_message=log_message)
+        except Exception as e:
+            log_message(f">>> ERROR refreshing analytics snapshot: {str(e)}")
+
+    with _refresh_thread_lock:
+        if _refresh_thread is not None and _refresh_thread.is_alive():
+            return False
+        _refresh_thread = threading.Thread(target=run, name="analytics-refresh", daemon=True)
+        _refresh_thread.start()
+        return True
+
+def ensure_fresh(db, log_message=print):
+    """Return the current metadata, starting a background refresh if it is missing or stale"""
+    current = read_current()
+    if np is not None and (current is None or time.time() - current['refreshed_at'] > ANALYTICS_REFRESH_INTERVAL):
+        refresh_in_background(db, log_message)
+    return current
+
+# Queries
+
+_loaded = None
+_loaded_lock = threading.Lock()
+
+def load_snapshot():
+    """(meta, ids, columns) of the published snapshot, memory-mapped once per generation, or None"""
+    global _loaded
+
+    current = read_current()
+    if current is None or np is None:
+        return None
+    with _loaded_lock:
+        if _loaded is None or _loaded[0]['generation'] != current['generation']:
+            _loaded = (current,) + _load_columns(current['generation'])
+        return _loaded
+
+def _labels(field):
+    return [NO_ANSWER] + CATEGORIES[field] + [OTHER]
+
+def _shares(labels, counts, total):
+    return [{'label': label, 'count': int(count), 'percent': round(float(count) / total * 100, 1) if total else 0}
+            for label, count in zip(labels, counts)]
+
+def _cohort_mask(columns, filters):
+    mask = np.ones(len(columns['age']), dtype=bool)
+    for field in CATEGORIES:
+        value = filters.get(field)
+        if value in CATEGORIES[field]:
+            mask &= columns[field] == CATEGORIES[field].index(value) + 1
+    if filters.get('sport') in SPORTS:
+        mask &= (columns['sports'] & (1 << SPORTS.index(filters['sport']))) != 0
+    return mask
+
+def _numeric_summary(field, values):
+    values = values[~np.isnan(values)]
+    edges = HISTOGRAM_EDGES[field]
+    counts, _ = np.histogram(np.clip(values, edges[0], edges[-1]), bins=edges)
+    labels = [f"{low}–{high}" for low, high in zip(edges[:-1], edges[1:])]
+    summary = {'count': int(len(values)), 'histogram': _shares(labels, counts, len(values))}
+    if len(values):
+        p10, median, p90 = np.percentile(values, [10, 50, 90])
+        summary.update(mean=round(float(values.mean()), 1), median=round(float(median), 1),
+                       p10=round(float(p10), 1), p90=round(float(p90), 1))
+    return summary
+
+def cohort_report(filters=None, group_by='experience'):
+    """
+    Distributions of the athletes matching filters ({field: canonical answer,
+    'sport': sport}), and the numeric means per group_by answer. None while
+    there is no snapshot.
+    """
+    snapshot = load_snapshot()
+    if snapshot is None:
+        return None
+    started = time.perf_counter()
+    meta, _, columns = snapshot
+    filters = filters or {}
+    group_by = group_by if group_by in CATEGORIES else 'experience'
+
+    mask = _cohort_mask(columns, filters)
+    matched = int(mask.sum())
+    selected = {name: np.asarray(values)[mask] for name, values in columns.items()}
+
+    sports = selected['sports']
+    sport_counts = [int(np.count_nonzero(sports & (1 << bit))) for bit in range(len(SPORTS) + 1)]
+
+    codes = selected[group_by]
+    groups = []
+    group_counts = np.bincount(codes, minlength=len(_labels(group_by)))
+    for code, label in enumerate(_labels(group_by)):
+        if not group_counts[code]:
+            continue
+        in_group = codes == code
+        groups.append({'label': label, 'count': int(group_counts[code]), **{
+            field: (round(float(np.nanmean(selected[field][in_group])), 1)
+                    if np.any(~np.isnan(selected[field][in_group])) else None)
+            for field in NUMERIC_FIELDS}})
+
+    return {
+        'rows': meta['rows'],
+        'matched': matched,
+        'refreshed_at': datetime.datetime.fromtimestamp(meta['refreshed_at']),
+        'numeric': {field: _numeric_summary(field, selected[field]) for field in NUMERIC_FIELDS},
+        'categorical': {field: _shares(_labels(field), np.bincount(selected[field], minlength=len(_labels(field))),
+                                       matched) for field in CATEGORIES},
+        'sports': _shares(SPORTS + [OTHER], sport_counts, matched),
+        'group_by': group_by,
+        'groups': groups,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
+
+# Rebuild the snapshot: python -m services.analytics_service refresh [--full]
+if __name__ == "__main__":
+    from services.firebase_service import get_db
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'refresh':
+        print("Usage: python -m services.analytics_service refresh [--full]")
+        sys.exit(1)
+
+    database = get_db()
+    if database is None:
+        print("Firebase initialization failed")
+        sys.exit(1)
+
+    refresh(database, full='--full' in sys.argv)
@@ -0,0 +1,137 @@
+import os
+import asyncio
+import threading
+import firebase_admin
+from firebase_admin import firestore_async
+from services import aggregation_service, explorer_service, firebase_service, stats_service
+from services.repositories import InteractionRepository
+
+# Concurrent Firestore reads for the admin pages. Queries that do not depend on
+# each other (the dashboard counters and recent activity, the document count of
+# every collection) run at the same time on an AsyncClient, so a page costs
+# about as much as its slowest query instead of the sum of all of them.
+#
+# Flask views stay synchronous: the AsyncClient lives on one event loop thread
+# per worker process, and views submit coroutines to it and wait for them.
+# At most ASYNC_MAX_CONCURRENCY queries of one page are in flight at once.
+ASYNC_MAX_CONCURRENCY = int(os.getenv("ASYNC_MAX_CONCURRENCY", "8"))
+# Seconds a view waits for its queries
+ASYNC_TIMEOUT = float(os.getenv("ASYNC_TIMEOUT", "30"))
+
+RECENT_ACTIVITY_LIMIT = 20
+
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+def _get_loop():
+    """The event loop thread for this worker process; a forked child starts its own"""
+    global _loop, _loop_pid
+
+    if _loop_pid == os.getpid():
+        return _loop
+    with _loop_lock:
+        if _loop_pid != os.getpid():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="firestore-async", daemon=True).start()
+            _loop = loop
+            _loop_pid = os.getpid()
+    return _loop
+
+def _run(coroutine_fn, *args):
+    """Run coroutine_fn(client, *args) on the loop thread and return its result"""
+    if not firebase_service.ensure_firebase():
+        raise RuntimeError("Firebase is not available")
+    memory_client = firebase_service.async_db
+    app = firebase_admin.get_app() if memory_client is None else None
+
+    async def call():
+        # Created on the loop thread so its gRPC channel belongs to this loop;
+        # firebase_admin keeps one client per app
+        client = memory_client or firestore_async.client(app)
+        return await coroutine_fn(client, *args)
+
+    future = asyncio.run_coroutine_threadsafe(call(), _get_loop())
+    try:
+        return future.result(ASYNC_TIMEOUT)
+    except Exception:
+        future.cancel()
+        raise
+
+async def gather_bounded(awaitables, limit=None):
+    """asyncio.gather with at most `limit` awaitables running at once"""
+    semaphore = asyncio.Semaphore(limit or ASYNC_MAX_CONCURRENCY)
+
+    async def bounded(awaitable):
+        async with semaphore:
+            return await awaitable
+
+    return await asyncio.gather(*(bounded(awaitable) for awaitable in awaitables))
+
+async def _recent_activity(client, limit):
+    query = InteractionRepository(client).recent_query(limit)
+    try:
+        return [interaction.to_dict() async for interaction in query.stream()]
+    except Exception as e:
+        print(f"Error fetching recent activities: {str(e)}")
+        return []
+
+async def _dashboard(client, limit, live):
+    if live is not None:
+        (stats, activities), plan_summary = live, await aggregation_service.plan_summary_async(
+            client, firebase_service.db)
+    else:
+        stats, activities, plan_summary = await gather_bounded([
+            stats_service.get_dashboard_stats_async(client),
+            _recent_activity(client, limit),
+            aggregation_service.plan_summary_async(client, firebase_service.db)
+        ])
+    stats['users_with_plans'] = plan_summary['users_with_plans']
+    stats['percentage_with_plans'] = plan_summary['percentage_with_plans']
+    stats['plan_summary_cost'] = plan_summary['cost']
+    return stats, activities
+
+def dashboard_data(limit=RECENT_ACTIVITY_LIMIT, live=None):
+    """
+    Return (stats, recent interactions) for the dashboard, read concurrently.
+    stats holds the counters plus users_with_plans and percentage_with_plans
+    from aggregation_service, with its cost in plan_summary_cost. Given live
+    (counters, interactions) from live_service, only the plan summary is read.
+    """
+    return _run(_dashboard, limit, live)
+
+async def _count(collection_ref):
+    try:
+        result = await collection_ref.count().get()
+        return result[0][0].value
+    except Exception as e:
+        print(f"Error counting {collection_ref.id}: {str(e)}")
+        return None
+
+async def _collection_summaries(client, with_counts):
+    collection_refs = [collection_ref async for collection_ref in client.collections()]
+    if with_counts:
+        counts = await gather_bounded([_count(collection_ref) for collection_ref in collection_refs])
+    else:
+        counts = [None] * len(collection_refs)
+
+    summaries = [{'name': collection_ref.id, 'count': count}
+                 for collection_ref, count in zip(collection_refs, counts)]
+    summaries.sort(key=lambda summary: summary['name'])
+    return summaries
+
+def collection_summaries(with_counts=True):
+    """explorer_service.collection_summaries with the collections counted concurrently"""
+    return _run(_collection_summaries, with_counts)
+
+async def _subcollection_ids(doc_ref):
+    return [sub.id async for sub in doc_ref.collections()]
+
+async def _document(client, document_path):
+    doc_ref = client.document(document_path)
+    snapshot, subcollections = await gather_bounded([doc_ref.get(), _subcollection_ids(doc_ref)])
+    return explorer_service.document_entry(doc_ref, document_path, snapshot, subcollections)
+
+def get_document(document_path):
+    """explorer_service.get_document with the fields and subcollections read concurrently"""
+    return _run(_document, document_path)
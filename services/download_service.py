@@ -0,0 +1,97 @@
+import os
+import re
+import threading
+
+# Streams stored PDFs from the bucket for the /download/<filename> links built
+# by storage_service. Objects are read in DOWNLOAD_CHUNK_SIZE ranged requests
+# pinned to one generation, so a proxied download holds at most one chunk in
+# memory, and at most DOWNLOAD_MAX_STREAMS downloads run at once per worker
+# (DOWNLOAD_MAX_STREAMS x DOWNLOAD_CHUNK_SIZE bytes in flight).
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(1024 * 1024)))
+DOWNLOAD_MAX_STREAMS = int(os.getenv("DOWNLOAD_MAX_STREAMS", "16"))
+# Seconds a request waits for a free stream before getting a 503
+DOWNLOAD_SLOT_TIMEOUT = float(os.getenv("DOWNLOAD_SLOT_TIMEOUT", "2"))
+
+# Content-addressed PDFs (see upload_service.content_name) change name whenever
+# their content does, so responses can be cached forever. Links sent before
+# plans were content-addressed name plan_<athlete name>_<time>_<id>.pdf objects,
+# at the top of the bucket or under plans/. The name was only lowercased with
+# spaces turned into underscores, so it may hold accents and punctuation; it
+# may not hold a slash, which keeps requests inside those two places. They are
+# still served, revalidated against their ETag on every use.
+DOWNLOADABLE_NAME = re.compile(r'(?:plans/)?[0-9a-f]{64}\.pdf')
+LEGACY_NAME = re.compile(r'(?:plans/)?plan_[^/]+\.pdf')
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+LEGACY_CACHE_CONTROL = "public, no-cache"
+
+_slots = threading.BoundedSemaphore(DOWNLOAD_MAX_STREAMS)
+
+def is_downloadable(filename):
+    return DOWNLOADABLE_NAME.fullmatch(filename) is not None or LEGACY_NAME.fullmatch(filename) is not None
+
+def cache_control(filename):
+    return CACHE_CONTROL if DOWNLOADABLE_NAME.fullmatch(filename) else LEGACY_CACHE_CONTROL
+
+def blob_etag(blob):
+    """Strong ETag for a stored object, from its generation"""
+    return f'"{blob.generation}"'
+
+def etag_matches(header, etag):
+    """True if an If-None-Match / If-Range header lists `etag` (or is *)"""
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+def parse_range(header, size, if_range=None, etag=None):
+    """
+    Return (start, end) inclusive for a single "bytes=" range, or None to send
+    the whole object. Raises ValueError when the range cannot be satisfied.
+    Multiple ranges are answered with the whole object, as RFC 9110 allows.
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    if if_range is not None and if_range.strip() != etag:
+        return None  # The client's copy is stale; send the current object
+
+    start, separator, end = header[6:].strip().partition('-')
+    if not separator:
+        return None
+    try:
+        if not start:
+            # Suffix range: the last N bytes
+            length = int(end)
+            if length <= 0:
+                raise ValueError("empty suffix range")
+            return max(size - length, 0), size - 1
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    except ValueError:
+        raise ValueError(f"invalid range {header}")
+    if start >= size or start > end:
+        raise ValueError(f"range {header} not satisfiable for {size} bytes")
+    return start, end
+
+def acquire_slot():
+    """Reserve one of the DOWNLOAD_MAX_STREAMS streams; False if none frees up in time"""
+    return _slots.acquire(timeout=DOWNLOAD_SLOT_TIMEOUT)
+
+def release_slot():
+    _slots.release()
+
+def iter_blob(blob, start, end, log_message=print):
+    """Yield bytes start..end (inclusive) of `blob` one chunk at a time"""
+    offset = start
+    try:
+        while offset <= end:
+            chunk_end = min(offset + DOWNLOAD_CHUNK_SIZE, end + 1) - 1
+            # Pinned to the generation the headers were built from
+            chunk = blob.download_as_bytes(start=offset, end=chunk_end, checksum=None,
+                                           raw_download=True, if_generation_match=blob.generation)
+            if not chunk:
+                break
+            offset += len(chunk)
+            yield chunk
+    except Exception as e:
+        log_message(f">>> ERROR streaming {blob.name} at byte {offset}: {str(e)}")
+        raise
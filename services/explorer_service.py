@@ -0,0 +1,147 @@
+import json
+import datetime
+
+# Backing queries for the /backend-data explorer. Each view reads only what it
+# shows: collection names and counts, one page of documents, or one document
+# and the names of its subcollections.
+PAGE_SIZES = [10, 25, 50, 100]
+DEFAULT_PAGE_SIZE = 25
+EXPORT_BATCH_SIZE = 500
+
+# Field path that orders a query by document id
+DOCUMENT_ID = '__name__'
+
+def split_path(path):
+    """Return the non-empty segments of a Firestore path, or None if it is malformed"""
+    segments = (path or '').strip('/').split('/')
+    if not segments or any(not segment for segment in segments):
+        return None
+    return segments
+
+def is_collection_path(path):
+    segments = split_path(path)
+    return segments is not None and len(segments) % 2 == 1
+
+def is_document_path(path):
+    segments = split_path(path)
+    return segments is not None and len(segments) % 2 == 0
+
+def _count(collection_ref):
+    """Server-side document count, or None when the aggregation is unavailable"""
+    try:
+        result = collection_ref.count().get()
+        return result[0][0].value
+    except Exception as e:
+        print(f"Error counting {collection_ref.id}: {str(e)}")
+        return None
+
+def collection_summaries(db, with_counts=True):
+    """Name and document count of every root collection"""
+    summaries = []
+    for collection_ref in db.collections():
+        summaries.append({
+            'name': collection_ref.id,
+            'count': _count(collection_ref) if with_counts else None
+        })
+    summaries.sort(key=lambda summary: summary['name'])
+    return summaries
+
+def format_value(value):
+    """Render a field value for display, converting timestamps to datetimes"""
+    if isinstance(value, datetime.datetime):
+        return value
+    if hasattr(value, 'seconds'):  # Protobuf timestamp
+        try:
+            return datetime.datetime.fromtimestamp(value.seconds)
+        except:
+            return f"Timestamp({value.seconds})"
+    return value
+
+def format_document(data, expand_lists=False):
+    """Display copy of a document's fields; lists are summarized unless expand_lists"""
+    processed_data = {}
+    for key, value in (data or {}).items():
+        if isinstance(value, list) and not expand_lists:
+            # For lists (like pdf_plans), count them and show sample
+            processed_data[key] = f"List with {len(value)} items"
+            if value and isinstance(value[0], dict):
+                # Show keys of the first item
+                processed_data[f"{key}_sample"] = f"Keys: {', '.join(value[0].keys())}"
+        else:
+            processed_data[key] = format_value(value)
+    return processed_data
+
+def list_documents_page(db, collection_path, page_size=DEFAULT_PAGE_SIZE, cursor=None):
+    """
+    Return (documents, next_cursor) for one page of a collection ordered by
+    document id. `cursor` is the id of the last document on the previous page.
+    """
+    page_size = page_size if page_size in PAGE_SIZES else DEFAULT_PAGE_SIZE
+    collection_ref = db.collection(collection_path)
+    query = collection_ref.order_by(DOCUMENT_ID)
+
+    if cursor:
+        cursor_doc = collection_ref.document(cursor).get()
+        if cursor_doc.exists:
+            query = query.start_after(cursor_doc)
+
+    documents = []
+    for doc in query.limit(page_size).stream():
+        documents.append({
+            'id': doc.id,
+            'data': format_document(doc.to_dict())
+        })
+
+    next_cursor = documents[-1]['id'] if len(documents) == page_size else None
+    return documents, next_cursor
+
+def document_entry(doc_ref, document_path, snapshot, subcollections):
+    """Display entry for a document, or None if it does not exist and has no subcollections"""
+    if not snapshot.exists and not subcollections:
+        return None
+
+    return {
+        'id': doc_ref.id,
+        'path': document_path,
+        'exists': snapshot.exists,
+        'data': format_document(snapshot.to_dict(), expand_lists=True) if snapshot.exists else {},
+        'subcollections': sorted(subcollections)
+    }
+
+def get_document(db, document_path):
+    """
+    Return one document with its fields and the names of its subcollections,
+    or None if it does not exist and has no subcollections.
+    """
+    doc_ref = db.document(document_path)
+    snapshot = doc_ref.get()
+    subcollections = [sub.id for sub in doc_ref.collections()]
+    return document_entry(doc_ref, document_path, snapshot, subcollections)
+
+def _json_default(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.hex()
+    if hasattr(value, 'path'):  # DocumentReference
+        return value.path
+    return str(value)
+
+def export_collection(db, collection_path, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield a collection as JSON lines ({"id": ..., "data": ...}), reading it in
+    batches so memory stays bounded by batch_size.
+    """
+    collection_ref = db.collection(collection_path)
+    query = collection_ref.order_by(DOCUMENT_ID).limit(batch_size)
+    last_doc = None
+
+    while True:
+        page = query.start_after(last_doc) if last_doc is not None else query
+        count = 0
+        for doc in page.stream():
+            count += 1
+            last_doc = doc
+            yield json.dumps({'id': doc.id, 'data': doc.to_dict()}, default=_json_default, ensure_ascii=False) + "\n"
+        if count < batch_size:
+            return
@@ -0,0 +1,394 @@
+import io
+import os
+import re
+import csv
+import sys
+import json
+import uuid
+import datetime
+import tempfile
+import threading
+from google.api_core.exceptions import NotFound
+from config import STEPS
+from services import normalization_service, plan_service
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Bulk exports of athlete profiles, plans and interactions as CSV or Parquet.
+#
+# Datasets are read EXPORT_PAGE_SIZE documents at a time in document-path
+# order, each page starting after the last document of the previous one, and
+# written out as they arrive, so memory is bounded by one page (one Parquet
+# row group of EXPORT_ROW_GROUP_SIZE rows) whatever the size of the dataset.
+# Profile answers are typed: age is an integer, weight, height and
+# training_hours are floats, parsed by normalization_service the way analytics
+# reads them ("1,80" is 180 cm, "6 a 8h" is 7 hours); answers without a
+# plausible number are left empty.
+#
+# Exports either stream straight to the browser, or are written as numbered
+# part files of EXPORT_PART_ROWS rows to a directory or to the bucket, under
+# exports/<export_id>/. After each part, checkpoint.json records the parts and
+# the last document exported; running the same export_id again resumes after
+# it instead of starting over. Parquet needs the pyarrow package.
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "500"))
+EXPORT_ROW_GROUP_SIZE = int(os.getenv("EXPORT_ROW_GROUP_SIZE", "10000"))
+EXPORT_PART_ROWS = int(os.getenv("EXPORT_PART_ROWS", "100000"))
+EXPORT_PREFIX = 'exports'
+
+FORMATS = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# Field path that orders a query by document id
+DOCUMENT_ID = '__name__'
+
+NUMBER = re.compile(r'-?\d+(?:[.,]\d+)?')
+
+# Profile answers stored as free text that are exported as numbers (all of
+# them normalization_service.NUMERIC_FIELDS)
+PROFILE_TYPES = {
+    'age': 'int',
+    'weight': 'float',
+    'height': 'float',
+    'training_hours': 'float',
+}
+
+USER_COLUMNS = (
+    [('id', 'string')]
+    + [(key, PROFILE_TYPES.get(key, 'string')) for key, _ in STEPS]
+    + [('plan_count', 'int'), ('step', 'int'), ('created_at', 'timestamp'), ('last_updated', 'timestamp')]
+)
+PLAN_COLUMNS = [
+    ('id', 'string'), ('user_id', 'string'), ('user_name', 'string'), ('filename', 'string'),
+    ('url', 'string'), ('created_at', 'timestamp'), ('size', 'int'),
+]
+INTERACTION_COLUMNS = [
+    ('id', 'string'), ('user_id', 'string'), ('timestamp', 'timestamp'), ('message_type', 'string'),
+    ('message', 'string'), ('response', 'string'),
+]
+
+def _user_row(snapshot, data):
+    profile = data.get('profile')
+    row = dict(profile) if isinstance(profile, dict) else {}
+    for key in PROFILE_TYPES:
+        row[key] = normalization_service.normalize_value(key, row.get(key))
+    row.update({key: data.get(key) for key in ('plan_count', 'step', 'created_at', 'last_updated')})
+    return row
+
+def _plan_row(snapshot, data):
+    return data
+
+def _interaction_row(snapshot, data):
+    # Older interactions may lack user_id; the parent user document has it
+    row = dict(data)
+    row.setdefault('user_id', snapshot.reference.path.split('/')[1])
+    return row
+
+DATASETS = {
+    'users': (lambda db: db.collection('users'), USER_COLUMNS, _user_row),
+    'plans': (lambda db: db.collection(plan_service.PLANS_COLLECTION), PLAN_COLUMNS, _plan_row),
+    'interactions': (lambda db: db.collection_group('interactions'), INTERACTION_COLUMNS, _interaction_row),
+}
+
+def _to_number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    match = NUMBER.search(str(value)) if value is not None else None
+    return float(match.group().replace(',', '.')) if match else None
+
+def _convert(kind, value):
+    if value is None:
+        return None
+    if kind in ('int', 'float'):
+        number = _to_number(value)
+        if number is None:
+            return None
+        return int(number) if kind == 'int' else float(number)
+    if kind == 'timestamp':
+        if not isinstance(value, datetime.datetime):
+            return None
+        return value if value.tzinfo else value.replace(tzinfo=datetime.timezone.utc)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str, ensure_ascii=False)
+    return str(value)
+
+def typed_row(dataset, snapshot):
+    """One export row for a document: every column of the dataset, converted to its type"""
+    _, columns, row_fn = DATASETS[dataset]
+    values = row_fn(snapshot, snapshot.to_dict() or {})
+    values['id'] = snapshot.id
+    return {name: _convert(kind, values.get(name)) for name, kind in columns}
+
+def iter_pages(db, dataset, after=None, page_size=None):
+    """
+    Yield (rows, last_path) for each page of a dataset, starting after the
+    document path `after`. last_path is the cursor to resume after that page.
+    """
+    page_size = page_size or EXPORT_PAGE_SIZE
+    query_fn, _, _ = DATASETS[dataset]
+    query = query_fn(db).order_by(DOCUMENT_ID).limit(page_size)
+
+    while True:
+        page = query.start_after([db.document(after)]) if after else query
+        rows = []
+        for snapshot in page.stream():
+            rows.append(typed_row(dataset, snapshot))
+            after = snapshot.reference.path
+        if rows:
+            yield rows, after
+        if len(rows) < page_size:
+            return
+
+class _CsvWriter:
+    def __init__(self, out, columns, header=True):
+        self._out = out
+        self._names = [name for name, _ in columns]
+        if header:
+            self._write([self._names])
+
+    def _write(self, records):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(records)
+        self._out.write(buffer.getvalue().encode('utf-8'))
+
+    def write(self, rows):
+        self._write([['' if row[name] is None else
+                      row[name].isoformat() if isinstance(row[name], datetime.datetime) else row[name]
+                      for name in self._names] for row in rows])
+
+    def close(self):
+        pass
+
+class _ParquetWriter:
+    def __init__(self, out, columns):
+        if pa is None:
+            raise RuntimeError("Parquet exports need the pyarrow package")
+        types = {'string': pa.string(), 'int': pa.int64(), 'float': pa.float64(),
+                 'timestamp': pa.timestamp('us', tz='UTC')}
+        self._schema = pa.schema([(name, types[kind]) for name, kind in columns])
+        self._writer = pq.ParquetWriter(out, self._schema, compression='snappy')
+        self._pending = []
+
+    def _flush(self):
+        if self._pending:
+            self._writer.write_table(pa.Table.from_pylist(self._pending, schema=self._schema))
+            self._pending = []
+
+    def write(self, rows):
+        self._pending.extend(rows)
+        if len(self._pending) >= EXPORT_ROW_GROUP_SIZE:
+            self._flush()
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+WRITERS = {'csv': _CsvWriter, 'parquet': _ParquetWriter}
+
+def _check(dataset, fmt):
+    if dataset not in DATASETS:
+        raise ValueError(f"Unknown dataset: {dataset}")
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown format: {fmt}")
+    if fmt == 'parquet' and pa is None:
+        raise ValueError("Parquet exports need the pyarrow package")
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands what was written back out in chunks"""
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def stream_export(db, dataset, fmt):
+    """Yield a whole dataset as CSV or Parquet bytes, page by page"""
+    _check(dataset, fmt)
+    _, columns, _ = DATASETS[dataset]
+    sink = _ChunkSink()
+    writer = WRITERS[fmt](sink, columns)
+    for rows, _ in iter_pages(db, dataset):
+        writer.write(rows)
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+    writer.close()
+    yield sink.drain()
+
+class LocalStore:
+    """Export parts and checkpoint in a local directory"""
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _replace(self, name, write):
+        temporary = os.path.join(self.directory, f".{name}.tmp")
+        with open(temporary, 'wb') as f:
+            write(f)
+        os.replace(temporary, os.path.join(self.directory, name))
+
+    def write_part(self, name, fileobj, content_type):
+        fileobj.seek(0)
+        self._replace(name, lambda f: f.write(fileobj.read()))
+
+    def read_checkpoint(self):
+        try:
+            with open(os.path.join(self.directory, 'checkpoint.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def write_checkpoint(self, checkpoint):
+        self._replace('checkpoint.json', lambda f: f.write(json.dumps(checkpoint, indent=2).encode('utf-8')))
+
+class BucketStore:
+    """Export parts and checkpoint under exports/<export_id>/ in a bucket"""
+    def __init__(self, bucket, export_id):
+        self.bucket = bucket
+        self.prefix = f"{EXPORT_PREFIX}/{export_id}"
+
+    def write_part(self, name, fileobj, content_type):
+        self.bucket.blob(f"{self.prefix}/{name}").upload_from_file(fileobj, rewind=True, content_type=content_type)
+
+    def read_checkpoint(self):
+        try:
+            return json.loads(self.bucket.blob(f"{self.prefix}/checkpoint.json").download_as_text())
+        except NotFound:
+            return None
+
+    def write_checkpoint(self, checkpoint):
+        self.bucket.blob(f"{self.prefix}/checkpoint.json").upload_from_string(
+            json.dumps(checkpoint, indent=2), content_type='application/json')
+
+def export_to_store(db, dataset, fmt, store, part_rows=None, log_message=print):
+    """
+    Write a dataset to `store` as part files, resuming from the store's
+    checkpoint if it has one for the same dataset and format. Returns the
+    final checkpoint.
+    """
+    _check(dataset, fmt)
+    part_rows = part_rows or EXPORT_PART_ROWS
+    _, columns, _ = DATASETS[dataset]
+
+    checkpoint = store.read_checkpoint()
+    if checkpoint and (checkpoint.get('dataset'), checkpoint.get('format')) != (dataset, fmt):
+        raise ValueError(f"Checkpoint is for {checkpoint.get('dataset')}.{checkpoint.get('format')}")
+    if checkpoint and checkpoint.get('done'):
+        return checkpoint
+    if checkpoint:
+        log_message(f">>> Resuming {dataset} export after {checkpoint['after']} "
+                    f"({checkpoint['rows']} rows in {len(checkpoint['parts'])} parts)")
+    else:
+        checkpoint = {
+            'dataset': dataset,
+            'format': fmt,
+            'parts': [],
+            'rows': 0,
+            'after': None,
+            'done': False,
+            'started_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        }
+
+    part = None
+
+    def finish_part(after):
+        part['writer'].close()
+        name = f"part-{len(checkpoint['parts']):05d}.{fmt}"
+        store.write_part(name, part['file'], FORMATS[fmt])
+        part['file'].close()
+        checkpoint['parts'].append({'name': name, 'rows': part['rows']})
+        checkpoint['rows'] += part['rows']
+        checkpoint['after'] = after
+        checkpoint['updated_at'] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        store.write_checkpoint(checkpoint)
+        log_message(f">>> Exported {name}: {checkpoint['rows']} {dataset} rows so far")
+
+    last_path = checkpoint['after']
+    for rows, last_path in iter_pages(db, dataset, checkpoint['after']):
+        if part is None:
+            spool = tempfile.TemporaryFile()
+            part = {'file': spool, 'writer': WRITERS[fmt](spool, columns), 'rows': 0}
+        part['writer'].write(rows)
+        part['rows'] += len(rows)
+        if part['rows'] >= part_rows:
+            finish_part(last_path)
+            part = None
+
+    if part is not None:
+        finish_part(last_path)
+    checkpoint['done'] = True
+    store.write_checkpoint(checkpoint)
+    log_message(f">>> Export of {dataset} finished: {checkpoint['rows']} rows in {len(checkpoint['parts'])} parts")
+    return checkpoint
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+def start_bucket_export(db, bucket, dataset, fmt, export_id=None, log_message=print):
+    """
+    Export a dataset to the bucket on a background thread and return its
+    export_id; passing the id of an interrupted export resumes it.
+    """
+    _check(dataset, fmt)
+    export_id = export_id or f"{dataset}-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    with _jobs_lock:
+        job = _jobs.get(export_id)
+        if job is not None and job.is_alive():
+            return export_id
+
+        def run():
+            try:
+                export_to_store(db, dataset, fmt, BucketStore(bucket, export_id), log_message=log_message)
+            except Exception as e:
+                log_message(f">>> ERROR exporting {dataset} ({export_id}): {str(e)}")
+
+        job = threading.Thread(target=run, name=f"export-{export_id}", daemon=True)
+        _jobs[export_id] = job
+        job.start()
+    return export_id
+
+def export_status(bucket, export_id):
+    """Checkpoint of a bucket export, with whether it runs in this process"""
+    checkpoint = BucketStore(bucket, export_id).read_checkpoint()
+    if checkpoint is None:
+        return None
+    job = _jobs.get(export_id)
+    checkpoint['running_here'] = job is not None and job.is_alive()
+    return checkpoint
+
+# Export to a directory, resuming an interrupted run into the same directory:
+#   python -m services.export_service users parquet exports/users
+if __name__ == "__main__":
+    from services.firebase_service import get_db
+
+    if len(sys.argv) != 4 or sys.argv[1] not in DATASETS or sys.argv[2] not in FORMATS:
+        print(f"Usage: python -m services.export_service <{'|'.join(DATASETS)}> <{'|'.join(FORMATS)}> <directory>")
+        sys.exit(1)
+
+    database = get_db()
+    if database is None:
+        print("Firebase initialization failed")
+        sys.exit(1)
+
+    export_to_store(database, sys.argv[1], sys.argv[2], LocalStore(sys.argv[3]))
@@ -1,238 +1,374 @@
 import os
 import time
-import uuid
+import threading
 import datetime
 import traceback
 import firebase_admin
 from firebase_admin import credentials, firestore, storage
 from firebase_admin.exceptions import FirebaseError
+from google.api_core.exceptions import NotFound
+from google.cloud.firestore_v1.field_path import FieldPath
+from services import interaction_recorder, normalization_service, plan_service, signed_url_service, stats_service, upload_service, user_cache
 
 # Global variables to store database and storage references
 db = None
 firebase_bucket = None
+async_db = None  # Set for the memory backend; async_repository otherwise uses firestore_async
+
+# Client lifecycle state. The Firestore client is thread-safe, so one client is
+# created per worker process and shared by every request thread.
+_init_lock = threading.Lock()
+_needs_health_check = False
+_last_health_check = 0.0
+init_duration = None  # Seconds spent in the last successful initialization
+initialized_at = None
+
+# How often (in seconds) the shared client is re-validated with a health probe
+HEALTH_CHECK_INTERVAL = int(os.getenv("FIREBASE_HEALTH_CHECK_INTERVAL", "300"))
+
+# "firestore" (default) or "memory": an in-process client (memory_firestore)
+# seeded with MEMORY_SEED_USERS synthetic athletes, for local runs and
+# benchmarks without a project. Data lives in the worker process and is lost
+# on restart; there is no Storage bucket in memory mode.
+FIRESTORE_BACKEND = os.getenv("FIRESTORE_BACKEND", "firestore")
+MEMORY_SEED_USERS = int(os.getenv("MEMORY_SEED_USERS", "1000"))
+
+def _initialize_memory(log_message=print):
+    global db, async_db, init_duration, initialized_at, _last_health_check, _needs_health_check
+    from services import memory_firestore, synthetic_data
+
+    started = time.perf_counter()
+    memory_db = memory_firestore.MemoryFirestore()
+    synthetic_data.generate(memory_db, MEMORY_SEED_USERS, log_message=log_message)
+    db = memory_db
+    async_db = memory_firestore.MemoryAsyncFirestore(memory_db)
+    init_duration = time.perf_counter() - started
+    initialized_at = datetime.datetime.now()
+    _last_health_check = time.monotonic()
+    _needs_health_check = False
+    log_message(f"In-memory Firestore seeded with {MEMORY_SEED_USERS} users in {init_duration * 1000:.1f} ms")
+    return True
+
+def _initialize(log_message=print):
+    """Create the Firebase app and the shared Firestore/Storage clients"""
+    global db, firebase_bucket, init_duration, initialized_at, _last_health_check, _needs_health_check
+
+    if FIRESTORE_BACKEND == "memory":
+        return _initialize_memory(log_message)
 
-def simple_initialize_firebase():
-    """
-    A simplified version of the Firebase initialization function
-    that avoids common pitfalls and focuses on reliable initialization.
-    """
-    global db, firebase_bucket
-    
     # Force set environment variables if not present
     if not os.getenv("FIREBASE_PROJECT_ID"):
         os.environ["FIREBASE_PROJECT_ID"] = "fuelqpro"
-    
+
     if not os.getenv("FIREBASE_STORAGE_BUCKET"):
         os.environ["FIREBASE_STORAGE_BUCKET"] = "fuelqpro.firebasestorage.app"
-    
+
+    started = time.perf_counter()
     try:
-        print("Starting Firebase initialization...")
-        
-        # Check for existing Firebase apps and clean up safely
-        if firebase_admin._apps:
-            print("Found existing Firebase apps, cleaning up...")
-            try:
-                # Convert keys to a list first to avoid the dictionary changed size error
-                app_names = list(firebase_admin._apps.keys())
-                for app_name in app_names:
-                    if app_name in firebase_admin._apps:  # Check again in case it was deleted
-                        print(f"Deleting app: {app_name}")
-                        firebase_admin.delete_app(firebase_admin._apps[app_name])
-            except Exception as e:
-                print(f"Error cleaning up Firebase apps: {str(e)}")
-                print("Continuing with initialization anyway...")
-        
-        # Initialize Firebase with only the project ID first
-        print(f"Initializing Firebase with project ID: {os.environ.get('FIREBASE_PROJECT_ID')}")
-        app = firebase_admin.initialize_app(options={
-            'projectId': os.environ.get("FIREBASE_PROJECT_ID")
-        })
-        print(f"Firebase app initialized with name: {app.name}")
-        
-        # Initialize Firestore
-        print("Initializing Firestore client...")
-        db = firestore.client()
-        print("Firestore client initialized.")
-        
-        # Test Firestore with a simple operation
-        print("Testing Firestore connection...")
-        test_doc = db.collection('test').document('test_doc')
-        test_doc.set({'test': 'test_value'})
-        test_result = test_doc.get()
-        if test_result.exists and test_result.to_dict().get('test') == 'test_value':
-            print("Firestore connection test successful!")
-            test_doc.delete()  # Clean up
+        # Only tear down the default app when re-initializing after a failed probe
+        if firebase_admin._DEFAULT_APP_NAME in firebase_admin._apps:
+            if db is None:
+                app = firebase_admin.get_app()
+            else:
+                log_message("Re-initializing Firebase app after failed health check")
+                firebase_admin.delete_app(firebase_admin.get_app())
+                app = None
         else:
-            print("Firestore connection test failed!")
-        
-        # Try initializing storage separately
+            app = None
+
+        if app is None:
+            app = firebase_admin.initialize_app(options={
+                'projectId': os.environ.get("FIREBASE_PROJECT_ID")
+            })
+
+        new_db = firestore.client(app)
+
+        new_bucket = None
         try:
-            print(f"Initializing Storage with bucket: {os.environ.get('FIREBASE_STORAGE_BUCKET')}")
-            firebase_bucket = storage.bucket(os.environ.get("FIREBASE_STORAGE_BUCKET"))
-            print("Storage bucket initialized.")
+            new_bucket = storage.bucket(os.environ.get("FIREBASE_STORAGE_BUCKET"), app=app)
         except Exception as storage_error:
-            print(f"Error initializing Storage (this is not critical for authentication): {str(storage_error)}")
-        
-        print("Firebase initialization completed successfully!")
+            log_message(f"Error initializing Storage (this is not critical for authentication): {str(storage_error)}")
+
+        db = new_db
+        firebase_bucket = new_bucket
+        init_duration = time.perf_counter() - started
+        initialized_at = datetime.datetime.now()
+        _last_health_check = time.monotonic()
+        _needs_health_check = False
+        log_message(f"Firebase initialized in {init_duration * 1000:.1f} ms")
         return True
-    
+
     except Exception as e:
-        print(f"ERROR initializing Firebase: {str(e)}")
-        print("Full traceback:")
-        print(traceback.format_exc())
+        log_message(f"ERROR initializing Firebase: {str(e)}")
+        log_message(traceback.format_exc())
         return False
 
-def initialize_firebase(log_message=print):
-    """Initialize Firebase if not already initialized"""
-    global db, firebase_bucket
+def _health_check(log_message=print):
+    """Cheap liveness probe: a single point read of a document that need not exist"""
+    global _last_health_check, _needs_health_check
 
     try:
-        project_id = os.getenv("FIREBASE_PROJECT_ID")
-        storage_bucket = os.getenv("FIREBASE_STORAGE_BUCKET")
-        
-        if not project_id or not storage_bucket:
-            log_message(f"Missing required environment variables. Project ID: {project_id}, Storage Bucket: {storage_bucket}")
-            return False
-
-        log_message(f"Initializing Firebase with project ID: {project_id} and bucket: {storage_bucket}")
-        
-        # If Firebase is already initialized, delete the default app and reinitialize
-        if firebase_admin._apps:
-            log_message("Cleaning up existing Firebase app")
-            # Fix: Create a list of apps to avoid modifying dict during iteration
-            app_list = list(firebase_admin._apps.values())
-            for app in app_list:
-                firebase_admin.delete_app(app)
-
-        # Initialize Firebase with both project ID and storage bucket
-        firebase_admin.initialize_app(options={
-            'projectId': project_id,
-            'storageBucket': storage_bucket
-        })
-        log_message("Firebase initialized successfully with application default credentials")
-
-        # Initialize Firestore
-        db = firestore.client()
-        log_message("Firestore client initialized")
-
-        # Initialize Storage bucket
-        firebase_bucket = storage.bucket()
-        log_message("Storage bucket initialized")
-        
-        # Test Firestore connection
-        test_ref = db.collection('test').document('test')
-        test_ref.set({'test': 'test'})
-        test_ref.delete()
-        log_message("Firestore connection test successful")
-
-        # Test Storage bucket connection
-        test_blob = firebase_bucket.blob('test.txt')
-        test_blob.upload_from_string('test')
-        test_blob.delete()
-        log_message("Storage bucket connection test successful")
-        
+        db.collection('test').document('health').get()
+        _last_health_check = time.monotonic()
+        _needs_health_check = False
         return True
-
     except Exception as e:
-        log_message(f"ERROR initializing Firebase: {str(e)}")
+        log_message(f"Firebase health check failed: {str(e)}")
         return False
 
+def ensure_firebase(log_message=print):
+    """
+    Make sure the shared Firebase clients are ready.
+
+    The first call in a worker initializes Firebase; later calls return
+    immediately unless the health-check interval elapsed or an error was
+    reported, in which case a probe runs and Firebase is re-initialized
+    only if the probe fails.
+    """
+    if (db is not None and not _needs_health_check
+            and time.monotonic() - _last_health_check < HEALTH_CHECK_INTERVAL):
+        return True
+
+    with _init_lock:
+        if db is None:
+            return _initialize(log_message)
+
+        if (not _needs_health_check
+                and time.monotonic() - _last_health_check < HEALTH_CHECK_INTERVAL):
+            return True  # Another thread already probed
+
+        if _health_check(log_message):
+            return True
+
+        return _initialize(log_message)
+
+def reset_after_fork():
+    """
+    Drop Firebase clients inherited from a parent process (gunicorn preload):
+    their gRPC channels must not be shared across a fork, so the next call
+    in this process creates its own.
+    """
+    global db, firebase_bucket, _init_lock, _needs_health_check
+
+    _init_lock = threading.Lock()
+    if FIRESTORE_BACKEND == "memory":
+        return  # Each worker keeps the copy of the data it forked with
+    db = None
+    firebase_bucket = None
+    _needs_health_check = False
+    if firebase_admin._DEFAULT_APP_NAME in firebase_admin._apps:
+        firebase_admin.delete_app(firebase_admin.get_app())
+
+def report_firebase_error(error=None):
+    """Flag the shared client as suspect so the next request runs a health probe"""
+    global _needs_health_check
+    _needs_health_check = True
+
+def get_db(log_message=print):
+    """Return the shared Firestore client, or None if Firebase is unavailable"""
+    if not ensure_firebase(log_message):
+        return None
+    return db
+
+def get_bucket(log_message=print):
+    """Return the shared Firebase Storage bucket, or None if unavailable"""
+    if not ensure_firebase(log_message):
+        return None
+    return firebase_bucket
+
+def firebase_status():
+    """Summary of the client lifecycle, used by the debug endpoint"""
+    return {
+        'initialized': db is not None,
+        'initialized_at': initialized_at.isoformat() if initialized_at else None,
+        'init_duration_ms': round(init_duration * 1000, 1) if init_duration is not None else None,
+        'seconds_since_health_check': round(time.monotonic() - _last_health_check, 1) if db is not None else None,
+        'health_check_pending': _needs_health_check,
+        'storage_available': firebase_bucket is not None,
+    }
+
+def simple_initialize_firebase():
+    """
+    Kept for existing callers: returns True once the shared Firebase clients
+    are ready, without re-initializing them on every call.
+    """
+    return ensure_firebase()
+
+def initialize_firebase(log_message=print):
+    """Initialize Firebase if not already initialized"""
+    return ensure_firebase(log_message)
+
 def get_user_data(user_id, log_message=print):
-    if not simple_initialize_firebase():  # Use the simplified version
+    """Return the user's document, served from user_cache when possible"""
+    if not ensure_firebase(log_message):
         return None
 
-    try:
-        user_ref = db.collection('users').document(user_id)
-        user_doc = user_ref.get()
+    def load():
+        user_doc = db.collection('users').document(user_id).get()
         if user_doc.exists:
             log_message(f">>> Retrieved user data for {user_id}")
             return user_doc.to_dict()
         log_message(f">>> No data found for user {user_id}")
         return None
+
+    try:
+        return user_cache.get_user(user_id, load)
     except Exception as e:
+        report_firebase_error(e)
         log_message(f">>> ERROR retrieving user data: {str(e)}")
         return None
 
+@firestore.transactional
+def _save_user_transaction(transaction, user_ref, user_data, day):
+    # All reads must happen before the transaction's writes
+    user_doc = user_ref.get(transaction=transaction)
+    marker_doc = stats_service.active_marker_ref(db, user_ref.id, day).get(transaction=transaction)
+
+    # A fresh copy per attempt: a retry after an abort must not see a previous attempt's fields
+    data = dict(user_data)
+    if not user_doc.exists:
+        data['created_at'] = firestore.SERVER_TIMESTAMP
+        data.setdefault('plan_count', 0)
+
+    transaction.set(user_ref, data, merge=True)
+    stats_service.record_user_saved(
+        transaction, db, user_ref.id,
+        is_new=not user_doc.exists,
+        first_today=not marker_doc.exists,
+        day=day
+    )
+
+def _merge_fields(data, prefix=()):
+    """
+    Flatten nested maps into field paths, so update() merges them the way
+    set(merge=True) does instead of replacing whole maps.
+    """
+    fields = {}
+    for key, value in data.items():
+        path = prefix + (key,)
+        if isinstance(value, dict) and value:
+            fields.update(_merge_fields(value, path))
+        else:
+            fields[FieldPath(*path).to_api_repr()] = value
+    return fields
+
 def save_user_data(user_id, user_data, log_message=print):
-    if not simple_initialize_firebase():  # Use the simplified version
+    """
+    Merge user_data into the user document, with the normalized values of
+    any profile answers it carries.
+
+    A user already counted active today (by this process) is updated with a
+    single blind write; update() fails with NotFound for a new user, who then
+    goes through the transaction that sets created_at and the counters.
+    """
+    if not ensure_firebase(log_message):
         return False
 
     try:
+        user_data.update(normalization_service.normalized_update(user_data))
         user_data['last_updated'] = firestore.SERVER_TIMESTAMP
         user_ref = db.collection('users').document(user_id)
-        user_doc = user_ref.get()
+        day = stats_service.day_key()
+
+        saved = False
+        if stats_service.known_active(user_ref.id, day):
+            try:
+                user_ref.update(_merge_fields(user_data))
+                saved = True
+            except NotFound:
+                pass  # Deleted since; recreate it below
 
-        if not user_doc.exists:
-            user_data['created_at'] = firestore.SERVER_TIMESTAMP
+        if not saved:
+            _save_user_transaction(db.transaction(), user_ref, user_data, day)
+            stats_service.remember_active(user_ref.id, day)
 
-        user_ref.set(user_data, merge=True)
+        # Keep the cached copy current so the next turn needs no read
+        user_cache.record_write(user_id, user_data)
         log_message(f">>> Saved user data for {user_id}")
         return True
 
     except Exception as e:
+        report_firebase_error(e)
+        user_cache.invalidate(user_id)
         log_message(f">>> ERROR saving user data: {str(e)}")
         return False
 
-def upload_pdf_to_firebase(pdf_bytes, user_profile, log_message=print):
-    if not simple_initialize_firebase():  # Use the simplified version
-        return None
+def append_plan(user_id, plan, user_name=None, size=None):
+    """
+    Add a plan to a user, the plans index and the counters in one atomic
+    batch without reading the user: ArrayUnion appends to pdf_plans on the
+    server, so concurrent uploads cannot overwrite each other.
 
+    Every upload counts as a new plan, even when the PDF matches one already
+    stored: its upload id keeps the pdf_plans element and the index document
+    distinct, so plan_count and total_plans match both.
+    """
+    plan = dict(plan)
+    plan.setdefault('id', plan_service.new_upload_id())
+    user_ref = db.collection('users').document(user_id)
+    batch = db.batch()
+    batch.set(user_ref, {
+        'pdf_plans': firestore.ArrayUnion([plan]),
+        'plan_count': firestore.Increment(1)
+    }, merge=True)
+    plan_service.record_plan(batch, db, user_id, user_name, plan, size)
+    stats_service.record_plan_created(batch, db)
     try:
-        filename = f"plans/plan_{user_profile.get('name', 'user')}_{int(time.time())}_{str(uuid.uuid4())[:8]}.pdf"
-        filename = filename.replace(' ', '_').lower()
+        batch.commit()
+    finally:
+        user_cache.invalidate(user_id)
 
-        blob = firebase_bucket.blob(filename)
-        blob.upload_from_string(pdf_bytes, content_type='application/pdf')
+def upload_pdf_to_firebase(pdf_bytes, user_profile, log_message=print, wait=True):
+    """
+    Upload a plan PDF on the upload pool (see upload_service); once it is
+    stored, sign its URL and record the plan. Returns the signed URL, or with
+    wait=False a Future that resolves to it.
+    """
+    if not ensure_firebase(log_message):
+        return None
+    if firebase_bucket is None:
+        log_message(">>> ERROR: Firebase Storage bucket not available")
+        return None
 
-        url = blob.generate_signed_url(
-            version="v4",
-            expiration=datetime.timedelta(days=7),
-            method="GET"
-        )
+    user_id = user_profile.get('whatsapp_id', '')
 
-        user_id = user_profile.get('whatsapp_id', '')
-        if user_id:
-            user_ref = db.collection('users').document(user_id)
-            user_doc = user_ref.get()
-            user_data = user_doc.to_dict() if user_doc.exists else {}
-
-            pdf_list = user_data.get('pdf_plans', [])
-            pdf_list.append({
-                'filename': filename,
-                'created_at': firestore.SERVER_TIMESTAMP,
-                'url': url
-            })
+    def on_stored(result):
+        # The stored URL is what the bot sends; /plans links are signed on demand
+        url = signed_url_service.get_signed_url(firebase_bucket, result['filename'])
 
-            user_ref.update({ 'pdf_plans': pdf_list })
+        if user_id:
+            # Server timestamps are not allowed inside arrays, so stamp the plan here
+            plan = {
+                'filename': result['filename'],
+                'created_at': datetime.datetime.now(datetime.timezone.utc),
+                'url': url,
+                'sha256': result['sha256']
+            }
+            append_plan(user_id, plan, user_name=user_profile.get('name'), size=result['size'])
 
         log_message(f">>> PDF uploaded to Firebase: {url}")
         return url
 
+    try:
+        future = upload_service.submit_upload(
+            firebase_bucket, pdf_bytes, prefix='plans',
+            on_success=on_stored, on_error=report_firebase_error, log_message=log_message
+        )
+        if not wait:
+            return future
+        return future.result()
+
     except Exception as e:
+        report_firebase_error(e)
         log_message(f">>> ERROR uploading PDF to Firebase: {str(e)}")
         return None
 
 def log_interaction(user_id, message_type, message_content, response, log_message=print):
-    if not simple_initialize_firebase():  # Use the simplified version
-        return False
-
-    try:
-        interaction_ref = db.collection('users').document(user_id).collection('interactions').document()
-        interaction_data = {
-            'timestamp': firestore.SERVER_TIMESTAMP,
-            'message_type': message_type,
-            'message': message_content,
-            'response': response
-        }
-        interaction_ref.set(interaction_data)
-        log_message(f">>> Logged interaction for {user_id}")
-        return True
-
-    except Exception as e:
-        log_message(f">>> ERROR logging interaction: {str(e)}")
-        return False
+    """Record a bot interaction; it is committed in the background with others (see interaction_recorder)"""
+    return interaction_recorder.record_interaction(user_id, message_type, message_content, response, log_message)
 
 # Test the initialization if this file is run directly
 if __name__ == "__main__":
-    success = simple_initialize_firebase()
-    print(f"Firebase initialization {'successful' if success else 'failed'}")
\ No newline at end of file
+    success = ensure_firebase()
+    print(f"Firebase initialization {'successful' if success else 'failed'}")
+    print(firebase_status())
\ No newline at end of file
@@ -0,0 +1,286 @@
+import os
+import json
+import time
+import uuid
+import fcntl
+import atexit
+import datetime
+import threading
+import traceback
+import collections
+import contextlib
+
+# Write-behind recorder for users/{id}/interactions. record_interaction only
+# queues the document; a background thread commits queued interactions in
+# WriteBatches of up to INTERACTION_BATCH_SIZE writes, or whatever arrived
+# within INTERACTION_FLUSH_INTERVAL seconds. Failed commits are retried with
+# exponential backoff and then spilled to an on-disk journal, which is replayed
+# once Firestore is reachable again (including after a restart).
+INTERACTION_ASYNC = os.getenv("INTERACTION_ASYNC", "true").lower() in ("true", "1", "t")
+INTERACTION_QUEUE_SIZE = int(os.getenv("INTERACTION_QUEUE_SIZE", "10000"))
+INTERACTION_BATCH_SIZE = min(int(os.getenv("INTERACTION_BATCH_SIZE", "500")), 500)  # Firestore limit
+INTERACTION_FLUSH_INTERVAL = float(os.getenv("INTERACTION_FLUSH_INTERVAL", "0.5"))
+INTERACTION_MAX_RETRIES = int(os.getenv("INTERACTION_MAX_RETRIES", "4"))
+INTERACTION_RETRY_BASE = 0.5  # Seconds; doubled after each failed attempt
+INTERACTION_RETRY_MAX = 30.0
+INTERACTION_REPLAY_INTERVAL = 30.0
+INTERACTION_JOURNAL = os.getenv("INTERACTION_JOURNAL", "")
+
+_queue = collections.deque()
+_queue_cond = threading.Condition()
+_start_lock = threading.Lock()
+_writer_thread = None
+_stopping = False
+_stats = collections.Counter()
+
+def journal_path():
+    """Journal of interactions that could not be committed, one JSON object per line"""
+    if INTERACTION_JOURNAL:
+        return INTERACTION_JOURNAL
+    from services.logging_service import ensure_logs_directory
+    return os.path.join(ensure_logs_directory(), 'interactions.journal')
+
+def new_interaction(user_id, message_type, message_content, response):
+    """
+    Build a queued interaction. The document id is chosen up front so a batch
+    that is retried or replayed overwrites its own documents instead of
+    duplicating them.
+    """
+    return {
+        'id': uuid.uuid4().hex,
+        'user_id': str(user_id),
+        'data': {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc),
+            'user_id': str(user_id),
+            'message_type': message_type,
+            'message': message_content,
+            'response': response
+        }
+    }
+
+def commit_interactions(db, interactions):
+    """Write interactions in WriteBatches of at most INTERACTION_BATCH_SIZE"""
+    from services.repositories import InteractionRepository
+
+    repository = InteractionRepository(db)
+    for start in range(0, len(interactions), INTERACTION_BATCH_SIZE):
+        batch = db.batch()
+        for interaction in interactions[start:start + INTERACTION_BATCH_SIZE]:
+            batch.set(repository.document(interaction['user_id'], interaction['id']), interaction['data'])
+        batch.commit()
+
+def _commit_with_retry(interactions, log_message=print):
+    """Commit with exponential backoff; returns False once the retries are used up"""
+    from services.firebase_service import get_db, report_firebase_error
+
+    delay = INTERACTION_RETRY_BASE
+    for attempt in range(INTERACTION_MAX_RETRIES + 1):
+        try:
+            db = get_db(log_message)
+            if db is None:
+                raise RuntimeError("Firebase is not initialized")
+            commit_interactions(db, interactions)
+            _stats['committed'] += len(interactions)
+            _stats['batches'] += 1
+            return True
+        except Exception as e:
+            report_firebase_error(e)
+            _stats['retries'] += 1
+            log_message(f">>> ERROR committing {len(interactions)} interactions (attempt {attempt + 1}): {str(e)}")
+            if attempt == INTERACTION_MAX_RETRIES or _stopping:
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2, INTERACTION_RETRY_MAX)
+    return False
+
+@contextlib.contextmanager
+def _journal_lock(path):
+    """Exclusive lock shared by every worker process that spills to the journal"""
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _encode(interaction):
+    data = dict(interaction['data'])
+    data['timestamp'] = data['timestamp'].isoformat()
+    return json.dumps({'id': interaction['id'], 'user_id': interaction['user_id'], 'data': data},
+                      ensure_ascii=False, default=str) + "\n"
+
+def _decode(line):
+    interaction = json.loads(line)
+    interaction['data']['timestamp'] = datetime.datetime.fromisoformat(interaction['data']['timestamp'])
+    return interaction
+
+def spill(interactions, log_message=print):
+    """Append interactions to the journal so they survive until Firestore is back"""
+    path = journal_path()
+    with _journal_lock(path):
+        with open(path, 'a', encoding='utf-8') as journal:
+            journal.write(''.join(_encode(interaction) for interaction in interactions))
+            journal.flush()
+            os.fsync(journal.fileno())
+    _stats['spilled'] += len(interactions)
+    log_message(f">>> Spilled {len(interactions)} interactions to {path}")
+
+def replay_journal(log_message=print):
+    """
+    Commit journaled interactions and clear the journal. Returns the number
+    replayed, or None if Firestore is still unreachable.
+    """
+    path = journal_path()
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return 0
+
+    from services.firebase_service import get_db, report_firebase_error
+
+    with _journal_lock(path):
+        interactions = []
+        with open(path, 'r', encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    interactions.append(_decode(line))
+                except (ValueError, KeyError, TypeError):
+                    log_message(f">>> Skipping malformed journal line: {line[:200]}")
+
+        try:
+            db = get_db(log_message)
+            if db is None:
+                return None
+            commit_interactions(db, interactions)
+        except Exception as e:
+            report_firebase_error(e)
+            log_message(f">>> ERROR replaying interaction journal: {str(e)}")
+            return None
+
+        os.remove(path)
+
+    _stats['replayed'] += len(interactions)
+    log_message(f">>> Replayed {len(interactions)} journaled interactions")
+    return len(interactions)
+
+def _writer_loop():
+    last_replay = None  # Replay any journal left by a previous run right away
+
+    while True:
+        with _queue_cond:
+            # Wait for a full batch or the end of the flush window
+            deadline = time.monotonic() + INTERACTION_FLUSH_INTERVAL
+            while len(_queue) < INTERACTION_BATCH_SIZE and not _stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                _queue_cond.wait(remaining)
+            batch = [_queue.popleft() for _ in range(min(len(_queue), INTERACTION_BATCH_SIZE))]
+            finished = _stopping and not _queue
+            _queue_cond.notify_all()
+
+        try:
+            if batch and not _commit_with_retry(batch):
+                spill(batch)
+
+            if not finished and (last_replay is None
+                                 or time.monotonic() - last_replay >= INTERACTION_REPLAY_INTERVAL):
+                last_replay = time.monotonic()
+                replay_journal()
+        except Exception as e:
+            print(f">>> ERROR in interaction writer: {str(e)}")
+            print(traceback.format_exc())
+
+        if finished:
+            return
+
+def _ensure_writer():
+    """Start the writer thread, again in each forked worker process (see _after_fork)"""
+    global _writer_thread, _stopping
+
+    if _writer_thread is not None:
+        return
+
+    with _start_lock:
+        if _writer_thread is not None:
+            return
+        _stopping = False
+        _writer_thread = threading.Thread(target=_writer_loop, name="interaction-writer", daemon=True)
+        _writer_thread.start()
+
+def _after_fork():
+    """
+    In a forked child only the forking thread survives: the writer is gone and
+    a lock it or another thread held stays held. Start over with new locks and
+    an empty queue; the child starts its own writer when it first needs one.
+    """
+    global _queue, _queue_cond, _start_lock, _writer_thread, _stopping
+
+    _queue = collections.deque()
+    _queue_cond = threading.Condition()
+    _start_lock = threading.Lock()
+    _writer_thread = None
+    _stopping = False
+    _stats.clear()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+def start_recorder():
+    """Start the writer early so a journal left by a previous run is replayed"""
+    if INTERACTION_ASYNC:
+        _ensure_writer()
+
+def record_interaction(user_id, message_type, message_content, response, log_message=print):
+    """Queue an interaction for a batched write and return immediately"""
+    try:
+        interaction = new_interaction(user_id, message_type, message_content, response)
+
+        if not INTERACTION_ASYNC or _stopping:
+            if not _commit_with_retry([interaction], log_message):
+                spill([interaction], log_message)
+            return True
+
+        _ensure_writer()
+        with _queue_cond:
+            if len(_queue) >= INTERACTION_QUEUE_SIZE:
+                # Never drop interactions; make the caller wait for room
+                _stats['blocked'] += 1
+                while len(_queue) >= INTERACTION_QUEUE_SIZE and not _stopping:
+                    _queue_cond.wait(1.0)
+            _queue.append(interaction)
+            _stats['queued'] += 1
+            if len(_queue) >= INTERACTION_BATCH_SIZE:
+                _queue_cond.notify_all()
+        return True
+
+    except Exception as e:
+        log_message(f">>> ERROR queueing interaction: {str(e)}")
+        return False
+
+def flush_interactions(timeout=30.0):
+    """Commit (or journal) everything queued; later interactions are written synchronously"""
+    global _stopping
+
+    if _writer_thread is None:
+        return
+    with _queue_cond:
+        _stopping = True
+        _queue_cond.notify_all()
+    _writer_thread.join(timeout)
+
+atexit.register(flush_interactions)
+
+def interaction_stats():
+    """Counters for the interaction writer, for diagnostics"""
+    with _queue_cond:
+        path = journal_path()
+        return {
+            'async': INTERACTION_ASYNC,
+            'pending': len(_queue),
+            'queued': _stats['queued'],
+            'committed': _stats['committed'],
+            'batches': _stats['batches'],
+            'retries': _stats['retries'],
+            'spilled': _stats['spilled'],
+            'replayed': _stats['replayed'],
+            'journal_bytes': os.path.getsize(path) if os.path.exists(path) else 0,
+        }
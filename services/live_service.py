@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import threading
+import collections
+from services import firebase_service, stats_service
+from services.async_repository import RECENT_ACTIVITY_LIMIT
+from services.repositories import InteractionRepository
+
+# Live dashboard updates. Each worker process keeps one set of Firestore
+# listeners (on_snapshot) instead of every open dashboard polling:
+#
+#   the RECENT_ACTIVITY_LIMIT most recent interactions (collection group)
+#   stats/global/shards and stats_daily/<today>/shards (the counters)
+#
+# Listener callbacks keep the current counters and recent activity in memory
+# and append each change as an event to a ring buffer of LIVE_BUFFER_SIZE
+# events. Browsers follow it over Server-Sent Events (/events/dashboard): a
+# stream sends the current state, then every new event, and a reconnecting
+# browser resumes after the Last-Event-ID it saw while that is still buffered.
+#
+# Under gthread workers every open stream holds a request thread, so a worker
+# serves at most LIVE_MAX_STREAMS of them (further ones get 503 and retry) and
+# ends each after LIVE_STREAM_SECONDS; the browser reconnects and resumes.
+# LIVE_UPDATES=off turns the listeners and the endpoint off.
+LIVE_UPDATES = os.getenv("LIVE_UPDATES", "on")
+LIVE_BUFFER_SIZE = int(os.getenv("LIVE_BUFFER_SIZE", "200"))
+LIVE_MAX_STREAMS = int(os.getenv("LIVE_MAX_STREAMS", "4"))
+LIVE_STREAM_SECONDS = int(os.getenv("LIVE_STREAM_SECONDS", "300"))
+# Seconds between keep-alive comments on an idle stream, so proxies keep it open
+LIVE_KEEPALIVE = int(os.getenv("LIVE_KEEPALIVE", "15"))
+# Milliseconds the browser waits before reconnecting
+LIVE_RETRY_MS = 3000
+
+LISTENERS = ('interactions', 'global', 'daily')
+
+_lock = threading.Condition()
+_pid = None
+_day = None
+_watches = {}  # 'interactions' / 'global' / 'daily' -> listener
+_shards = {'global': None, 'daily': None}  # snapshots of the counter shards
+_activities = None
+_stats = None
+_events = collections.deque(maxlen=LIVE_BUFFER_SIZE)  # (id, event, data)
+_last_id = 0
+_streams = 0
+
+def enabled():
+    return LIVE_UPDATES != 'off'
+
+def _activity(data):
+    timestamp = data.get('timestamp')
+    return {
+        'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S') if hasattr(timestamp, 'strftime') else str(timestamp or ''),
+        'user_id': data.get('user_id', ''),
+        'message_type': data.get('message_type', ''),
+        'message': data.get('message', ''),
+    }
+
+def _publish(event, data):
+    """Append an event and wake the streams; call with _lock held"""
+    global _last_id
+    _last_id += 1
+    _events.append((_last_id, event, data))
+    _lock.notify_all()
+
+def _on_interactions(docs, changes, read_time):
+    global _activities
+    with _lock:
+        first = _activities is None
+        _activities = [snapshot.to_dict() or {} for snapshot in docs]
+        if first:
+            return
+        positions = {snapshot.reference.path: position for position, snapshot in enumerate(docs)}
+        added = [change.document for change in changes if change.type.name == 'ADDED']
+        # Oldest first, so a browser prepending each one ends up newest on top
+        for snapshot in sorted(added, key=lambda snapshot: positions.get(snapshot.reference.path, 0), reverse=True):
+            _publish('interaction', _activity(snapshot.to_dict() or {}))
+
+def _on_shards(kind):
+    def callback(docs, changes, read_time):
+        global _stats
+        with _lock:
+            _shards[kind] = list(docs)
+            if _shards['global'] is None or _shards['daily'] is None:
+                return
+            stats = stats_service.sum_dashboard_shards(_shards['global'] + _shards['daily'])
+            if stats != _stats:
+                first = _stats is None
+                _stats = stats
+                if not first:
+                    _publish('stats', stats)
+    return callback
+
+def _listen(db, kind, day):
+    global_shards, daily_shards = stats_service.shard_collections(db, day)
+    if kind == 'interactions':
+        return InteractionRepository(db).recent_query(RECENT_ACTIVITY_LIMIT).on_snapshot(_on_interactions)
+    return (global_shards if kind == 'global' else daily_shards).on_snapshot(_on_shards(kind))
+
+def _close(watch):
+    try:
+        watch.unsubscribe()
+    except Exception:
+        pass
+
+def start(log_message=print):
+    """
+    Start this process's listeners, or restart those that stopped and the
+    daily counters' at midnight. Returns whether they are running.
+    """
+    global _pid, _day, _activities, _stats
+
+    if not enabled():
+        return False
+    day = stats_service.day_key()
+    if (_pid == os.getpid() and _day == day and set(_watches) == set(LISTENERS)
+            and all(watch.is_active for watch in _watches.values())):
+        return True
+    if not firebase_service.ensure_firebase(log_message):
+        return False
+
+    with _lock:
+        if _pid != os.getpid():
+            # Listeners do not survive a fork; the worker starts its own
+            _watches.clear()
+            _shards.update({'global': None, 'daily': None})
+            _activities = None
+            _stats = None
+            _pid = os.getpid()
+        if _day != day and 'daily' in _watches:
+            _close(_watches.pop('daily'))
+            _shards['daily'] = None
+        _day = day
+
+        try:
+            # Listeners that failed to start last time are missing; start them now
+            for kind in LISTENERS:
+                watch = _watches.get(kind)
+                if watch is None or not watch.is_active:
+                    if watch is not None:
+                        _close(watch)
+                        log_message(f">>> Restarting the {kind} listener")
+                    _watches[kind] = _listen(firebase_service.db, kind, day)
+        except Exception as e:
+            firebase_service.report_firebase_error(e)
+            log_message(f">>> ERROR starting live listeners: {str(e)}")
+            return False
+    return True
+
+def latest(log_message=print):
+    """(stats counters, recent interactions) from the listeners, or None until they have reported"""
+    if not start(log_message):
+        return None
+    with _lock:
+        if _stats is None or _activities is None:
+            return None
+        return dict(_stats), list(_activities)
+
+def _message(event_id, event, data):
+    # Ids carry the process id: after reconnecting to another worker, the
+    # browser's Last-Event-ID means nothing there
+    return f"id: {os.getpid()}-{event_id}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _parse_event_id(last_event_id):
+    pid, _, event_id = (last_event_id or '').partition('-')
+    return int(event_id) if pid == str(os.getpid()) and event_id.isdigit() else None
+
+def _state_message():
+    """The current state as a 'snapshot' event; call with _lock held"""
+    activities = None if _activities is None else [_activity(data) for data in _activities]
+    return _message(_last_id, 'snapshot', {'stats': _stats, 'activities': activities})
+
+def acquire_stream():
+    """Reserve one of this worker's LIVE_MAX_STREAMS streams; release_stream() frees it"""
+    global _streams
+    with _lock:
+        if _streams >= LIVE_MAX_STREAMS:
+            return False
+        _streams += 1
+        return True
+
+def release_stream():
+    global _streams
+    with _lock:
+        _streams -= 1
+
+def stream_events(last_event_id=None):
+    """SSE messages for one browser, resuming after the Last-Event-ID header while it is buffered"""
+    deadline = time.monotonic() + LIVE_STREAM_SECONDS
+    last_event_id = _parse_event_id(last_event_id)
+    yield f"retry: {LIVE_RETRY_MS}\n\n"
+
+    with _lock:
+        oldest = _events[0][0] if _events else _last_id + 1
+        if last_event_id is not None and oldest - 1 <= last_event_id <= _last_id:
+            position = last_event_id  # Everything missed is still buffered
+            messages = [_message(*event) for event in _events if event[0] > position]
+        else:
+            messages = [_state_message()]
+        position = _last_id
+    if messages:
+        yield ''.join(messages)
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        start()
+        with _lock:
+            _lock.wait_for(lambda: _last_id > position, timeout=min(LIVE_KEEPALIVE, remaining))
+            if _events and _events[0][0] > position + 1:
+                # Fell behind the ring buffer; start over from the current state
+                messages = [_state_message()]
+            else:
+                messages = [_message(*event) for event in _events if event[0] > position]
+            position = _last_id
+        yield ''.join(messages) if messages else ": keepalive\n\n"
+
+def live_stats():
+    with _lock:
+        return {
+            'enabled': enabled(),
+            'listeners': sum(1 for watch in _watches.values() if watch.is_active) if _pid == os.getpid() else 0,
+            'streams': _streams,
+            'last_event_id': _last_id,
+            'buffered': len(_events),
+        }
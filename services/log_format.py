@@ -0,0 +1,231 @@
+import sys
+import json
+import base64
+import collections
+
+# Log entries are written in one of two formats, chosen with LOG_FORMAT:
+#
+#   text   [ts] [CATEGORY] [User: id] message {indented json data}
+#          traceback lines for errors
+#   jsonl  {"ts":"...","cat":"CATEGORY","user":"id","msg":"...","data":{...},"tb":"..."}
+#          exactly one line per entry; "user", "data" and "tb" are omitted when empty
+#
+# Both formats can appear in the same file (after switching LOG_FORMAT), so the
+# readers below detect the format per line. JSONL keys are always written in the
+# order above, which lets the header be read without decoding the whole record.
+TEXT = 'text'
+JSONL = 'jsonl'
+
+# Bytes in `data` are stored as {"$b64": "<base64>"} and decoded back by parse_line
+BINARY_KEY = '$b64'
+
+LogRecord = collections.namedtuple('LogRecord', 'timestamp category user_id message data traceback')
+
+_TIMESTAMP_LENGTH = 23
+_JSON_PREFIX = '{"ts":"'
+_JSON_CATEGORY = ',"cat":"'
+_JSON_USER = ',"user":'
+
+def _default(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {BINARY_KEY: base64.b64encode(bytes(value)).decode('ascii')}
+    return str(value)
+
+def _decode_binary(obj):
+    if len(obj) == 1 and BINARY_KEY in obj:
+        try:
+            return base64.b64decode(obj[BINARY_KEY])
+        except (ValueError, TypeError):
+            return obj
+    return obj
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=_default)
+_decoder = json.JSONDecoder()
+_record_decoder = json.JSONDecoder(object_hook=_decode_binary)
+
+def format_text(record):
+    """Render a (category, timestamp, message, user_id, data, error_details) record as text"""
+    category, timestamp, message, user_id, data, error_details = record
+
+    log_parts = [
+        f"[{timestamp}]",
+        f"[{category.upper()}]",
+    ]
+
+    if user_id:
+        log_parts.append(f"[User: {user_id}]")
+
+    log_parts.append(message)
+
+    if data:
+        try:
+            log_parts.append(json.dumps(data, indent=2, default=_default))
+        except:
+            log_parts.append(str(data))
+
+    entry_text = " ".join(log_parts) + "\n"
+
+    # For errors, also include the traceback
+    if error_details:
+        entry_text += error_details + "\n"
+
+    return entry_text
+
+def format_jsonl(record):
+    """Render a record as a single compact JSON line"""
+    category, timestamp, message, user_id, data, error_details = record
+
+    entry = {'ts': timestamp, 'cat': category.upper()}
+    if user_id:
+        entry['user'] = str(user_id)
+    entry['msg'] = message
+    if data:
+        entry['data'] = data
+    if error_details:
+        entry['tb'] = error_details
+
+    return _encoder.encode(entry) + "\n"
+
+def format_record(record, log_format=TEXT):
+    if log_format == JSONL:
+        return format_jsonl(record)
+    return format_text(record)
+
+def _parse_json_header(line):
+    timestamp_end = len(_JSON_PREFIX) + _TIMESTAMP_LENGTH
+    if not line.startswith(_JSON_CATEGORY, timestamp_end + 1) or line[timestamp_end:timestamp_end + 1] != '"':
+        return None
+    timestamp = line[len(_JSON_PREFIX):timestamp_end]
+
+    user_id = None
+    category_end = line.find('"', timestamp_end + 1 + len(_JSON_CATEGORY))
+    if category_end > 0 and line.startswith(_JSON_USER, category_end + 1):
+        try:
+            user_id, _ = _decoder.raw_decode(line, category_end + 1 + len(_JSON_USER))
+        except ValueError:
+            user_id = None  # Cut off mid-string by the caller
+    return timestamp, user_id
+
+def parse_header(line):
+    """
+    Return (timestamp, user_id) for the first line of a log entry in either
+    format, or None for text continuation lines (JSON payload, tracebacks).
+    Accepts str or bytes, and lines truncated after the user id.
+    """
+    if isinstance(line, bytes):
+        line = line.decode('utf-8', errors='replace')
+
+    if line.startswith(_JSON_PREFIX):
+        return _parse_json_header(line)
+
+    if len(line) < _TIMESTAMP_LENGTH + 4 or line[0] != '[' or line[_TIMESTAMP_LENGTH + 1:_TIMESTAMP_LENGTH + 4] != '] [':
+        return None
+
+    timestamp = line[1:_TIMESTAMP_LENGTH + 1]
+    user_id = None
+    category_end = line.find(']', _TIMESTAMP_LENGTH + 3)
+    if category_end > 0 and line.startswith('[User: ', category_end + 2):
+        user_end = line.find(']', category_end + 9)
+        if user_end > 0:
+            user_id = line[category_end + 9:user_end]
+    return timestamp, user_id
+
+def parse_line(line):
+    """
+    Parse one log line into a LogRecord, or None for a text continuation line.
+    Text entries only carry the header fields and the rest of the first line as
+    the message; use parse_text_entry to recover their data and traceback.
+    """
+    if isinstance(line, bytes):
+        line = line.decode('utf-8', errors='replace')
+
+    if line.startswith(_JSON_PREFIX):
+        # The object hook costs a Python call per object; only pay it for binary data
+        decoder = _record_decoder if BINARY_KEY in line else _decoder
+        try:
+            entry = decoder.decode(line)
+        except ValueError:
+            return None
+        return LogRecord(entry.get('ts', ''), entry.get('cat', ''), entry.get('user'),
+                         entry.get('msg', ''), entry.get('data'), entry.get('tb'))
+
+    header = parse_header(line)
+    if header is None:
+        return None
+    timestamp, user_id = header
+
+    category_end = line.find(']', _TIMESTAMP_LENGTH + 3)
+    category = line[_TIMESTAMP_LENGTH + 4:category_end]
+    rest = line[category_end + 2:]
+    if user_id is not None:
+        rest = rest[len(user_id) + 9:]
+    return LogRecord(timestamp, category, user_id, rest.rstrip('\n'), None, None)
+
+def parse_text_entry(lines):
+    """
+    Parse a text entry given its header line and continuation lines: the
+    indented JSON data that starts at the end of the header line and the
+    traceback that follows it.
+    """
+    record = parse_line(lines[0])
+    if record is None or lines[0].startswith(_JSON_PREFIX):
+        return record
+
+    message = record.message
+    data = None
+    remainder = '\n'.join(lines[1:])
+
+    if message.endswith(' {') and len(lines) > 1:
+        text = '{\n' + remainder
+        try:
+            data, end = _decoder.raw_decode(text)
+            message = message[:-2]
+            remainder = text[end:].lstrip('\n')
+        except ValueError:
+            data = None
+
+    return record._replace(message=message, data=data, traceback=remainder.rstrip('\n') or None)
+
+def iter_text_entries(f):
+    """Group the lines of a text log into entries, yielding LogRecords"""
+    lines = []
+    for raw in f:
+        line = raw.decode('utf-8', errors='replace').rstrip('\n') if isinstance(raw, bytes) else raw.rstrip('\n')
+        is_header = parse_header(line) is not None
+        if is_header and lines:
+            entry = parse_text_entry(lines)
+            if entry is not None:
+                yield entry
+            lines = []
+        if lines or is_header:
+            lines.append(line)
+    if lines:
+        entry = parse_text_entry(lines)
+        if entry is not None:
+            yield entry
+
+def convert_to_jsonl(source_path, target_path, log_message=print):
+    """Rewrite a text log (or a rotated archive) as JSONL, returning the number of entries"""
+    from services import log_index, log_rotation
+
+    count = 0
+    with log_rotation.open_archive(source_path) as source, open(target_path, 'w', encoding='utf-8') as target:
+        for entry in iter_text_entries(source):
+            target.write(format_jsonl((entry.category, entry.timestamp, entry.message,
+                                       entry.user_id, entry.data, entry.traceback)))
+            count += 1
+
+    # Offsets in an old sidecar would point into the text file
+    if target_path.endswith('.log'):
+        log_index.rebuild_index(target_path)
+    log_message(f"Converted {count} entries from {source_path} to {target_path}")
+    return count
+
+if __name__ == "__main__":
+    # python -m services.log_format convert logs/whatsapp.log logs/whatsapp.jsonl
+    if len(sys.argv) >= 3 and sys.argv[1] == "convert":
+        source = sys.argv[2]
+        target = sys.argv[3] if len(sys.argv) > 3 else source + '.jsonl'
+        convert_to_jsonl(source, target)
+    else:
+        print("Usage: python -m services.log_format convert <log file> [<output file>]")
@@ -0,0 +1,285 @@
+import os
+import bisect
+import threading
+import collections
+from services.log_format import parse_header
+
+# Sidecar index written next to each log file as <file>.idx, one record per line:
+#
+#   C\t<offset>\t<timestamp>   sparse checkpoint, at most one per CHECKPOINT_BYTES of log
+#   U\t<offset>\t<user_id>     posting for every entry that carries a user id
+#
+# Offsets are byte positions of the first line of a log entry. Timestamps use the
+# log's own '%Y-%m-%d %H:%M:%S.%f' (milliseconds) format, which sorts as text.
+# Text and JSONL entries are indexed alike (see log_format.parse_header).
+CHECKPOINT_BYTES = 64 * 1024
+INDEX_SUFFIX = '.idx'
+
+# If this much log has been written past the last checkpoint (for example by a
+# process that crashed between the two appends), queries re-index the tail.
+CATCH_UP_BYTES = 4 * CHECKPOINT_BYTES
+
+_lock = threading.Lock()
+_query_lock = threading.Lock()
+_last_checkpoint = {}  # log path -> offset of the last checkpoint this process wrote
+_indexes = {}          # log path -> in-memory index loaded from the sidecar
+
+def _after_fork():
+    """A forked child gets new locks, in case another thread held one at the fork"""
+    global _lock, _query_lock
+    _lock = threading.Lock()
+    _query_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+def index_path(log_path):
+    return log_path + INDEX_SUFFIX
+
+def _index_records(offset, timestamp, user_id, checkpoint):
+    records = []
+    if checkpoint:
+        records.append(f"C\t{offset}\t{timestamp}\n")
+    if user_id:
+        records.append(f"U\t{offset}\t{user_id}\n")
+    return ''.join(records)
+
+def record_entry(log_path, offset, timestamp, user_id=None):
+    """Append index records for an entry just written at `offset` in `log_path`"""
+    record_entries(log_path, [(offset, timestamp, user_id)])
+
+def record_entries(log_path, entries):
+    """Append index records for (offset, timestamp, user_id) entries written in one batch"""
+    records = []
+    with _lock:
+        for offset, timestamp, user_id in entries:
+            last = _last_checkpoint.get(log_path)
+            checkpoint = last is None or offset >= last + CHECKPOINT_BYTES or offset < last
+            if checkpoint:
+                _last_checkpoint[log_path] = offset
+            records.append(_index_records(offset, timestamp, user_id, checkpoint))
+
+    records = ''.join(records)
+    if records:
+        with open(index_path(log_path), 'ab', buffering=0) as f:
+            f.write(records.encode('utf-8'))
+
+def forget(log_path):
+    """Drop per-file state after the log file was rotated away"""
+    with _lock:
+        _last_checkpoint.pop(log_path, None)
+        _indexes.pop(log_path, None)
+
+def _new_index():
+    return {
+        'checkpoint_offsets': [],
+        'checkpoint_times': [],
+        'postings': collections.defaultdict(list),
+        'max_offset': -1,
+        'position': 0,  # How far into the sidecar file has been loaded
+    }
+
+def _add_checkpoint(index, offset, timestamp):
+    offsets = index['checkpoint_offsets']
+    if not offsets or offset > offsets[-1]:
+        offsets.append(offset)
+        index['checkpoint_times'].append(timestamp)
+    else:
+        # Out-of-order appends from concurrent writers
+        position = bisect.bisect_left(offsets, offset)
+        if position == len(offsets) or offsets[position] != offset:
+            offsets.insert(position, offset)
+            index['checkpoint_times'].insert(position, timestamp)
+
+def _add_posting(index, offset, user_id):
+    offsets = index['postings'][user_id]
+    if not offsets or offset > offsets[-1]:
+        offsets.append(offset)
+    else:
+        position = bisect.bisect_left(offsets, offset)
+        if position == len(offsets) or offsets[position] != offset:
+            offsets.insert(position, offset)
+
+def _load_new_records(index, log_path):
+    """Read sidecar records appended since the last load"""
+    with open(index_path(log_path), 'rb') as f:
+        f.seek(index['position'])
+        data = f.read()
+
+    # Ignore a trailing record that is still being written
+    complete = data.rfind(b'\n') + 1
+    index['position'] += complete
+
+    for raw in data[:complete].decode('utf-8', errors='replace').splitlines():
+        parts = raw.split('\t', 2)
+        if len(parts) != 3 or not parts[1].isdigit():
+            continue
+        offset = int(parts[1])
+        if parts[0] == 'C':
+            _add_checkpoint(index, offset, parts[2])
+        elif parts[0] == 'U':
+            _add_posting(index, offset, parts[2])
+        else:
+            continue
+        index['max_offset'] = max(index['max_offset'], offset)
+
+def _scan_entries(f, start, stop=None):
+    """Yield (offset, line_bytes) for entry header lines between two byte offsets"""
+    f.seek(start)
+    offset = start
+    for line in f:
+        if stop is not None and offset >= stop:
+            break
+        if parse_header(line[:200]):
+            yield offset, line
+        offset += len(line)
+
+def rebuild_index(log_path):
+    """Rebuild the sidecar index from a full scan of the log file"""
+    temp_path = index_path(log_path) + '.tmp'
+    last_checkpoint = None
+
+    with open(log_path, 'rb') as log_file, open(temp_path, 'w', encoding='utf-8') as out:
+        for offset, line in _scan_entries(log_file, 0):
+            timestamp, user_id = parse_header(line)
+            checkpoint = last_checkpoint is None or offset >= last_checkpoint + CHECKPOINT_BYTES
+            if checkpoint:
+                last_checkpoint = offset
+            out.write(_index_records(offset, timestamp, user_id, checkpoint))
+
+    os.replace(temp_path, index_path(log_path))
+    with _lock:
+        _last_checkpoint.pop(log_path, None)
+        _indexes.pop(log_path, None)
+
+def _catch_up(index, log_path, log_size):
+    """Index entries written after the last indexed entry and persist them"""
+    start = max(index['max_offset'], 0)
+    last_checkpoint = index['checkpoint_offsets'][-1] if index['checkpoint_offsets'] else None
+    records = []
+
+    with open(log_path, 'rb') as f:
+        for offset, line in _scan_entries(f, start, log_size):
+            if offset <= index['max_offset']:
+                continue
+            timestamp, user_id = parse_header(line)
+            checkpoint = last_checkpoint is None or offset >= last_checkpoint + CHECKPOINT_BYTES
+            if checkpoint:
+                last_checkpoint = offset
+            records.append(_index_records(offset, timestamp, user_id, checkpoint))
+
+    if records:
+        with open(index_path(log_path), 'ab', buffering=0) as f:
+            f.write(''.join(records).encode('utf-8'))
+
+def get_index(log_path):
+    """
+    Return the up-to-date in-memory index for a log file, loading only records
+    appended since the previous call. Rebuilds the sidecar when it is missing or
+    refers to offsets past the end of the log (the file was truncated or replaced).
+    """
+    with _query_lock:
+        return _refresh_index(log_path)
+
+def _refresh_index(log_path):
+    log_size = os.path.getsize(log_path)
+
+    with _lock:
+        index = _indexes.get(log_path)
+
+    if not os.path.exists(index_path(log_path)):
+        rebuild_index(log_path)
+        index = None
+    elif index is not None and os.path.getsize(index_path(log_path)) < index['position']:
+        index = None  # Sidecar was replaced by a rebuild in another process
+
+    if index is None:
+        index = _new_index()
+    _load_new_records(index, log_path)
+
+    if index['max_offset'] >= log_size:
+        rebuild_index(log_path)
+        index = _new_index()
+        _load_new_records(index, log_path)
+
+    last_checkpoint = index['checkpoint_offsets'][-1] if index['checkpoint_offsets'] else 0
+    if log_size - last_checkpoint > CATCH_UP_BYTES:
+        _catch_up(index, log_path, log_size)
+        _load_new_records(index, log_path)
+
+    with _lock:
+        _indexes[log_path] = index
+    return index
+
+def _region(index, start_time, end_time, log_size):
+    """Byte range [start, stop) that holds every entry between the two timestamps"""
+    times = index['checkpoint_times']
+    offsets = index['checkpoint_offsets']
+
+    start = 0
+    if start_time and times:
+        # Step back one extra checkpoint to tolerate slightly out-of-order timestamps
+        position = bisect.bisect_left(times, start_time) - 2
+        start = offsets[position] if position >= 0 else 0
+
+    stop = log_size
+    if end_time and times:
+        position = bisect.bisect_right(times, end_time) + 1
+        if position < len(offsets):
+            stop = offsets[position]
+
+    return start, stop
+
+def entry_matches(line, start_time=None, end_time=None, user_id=None, search=''):
+    """Whether an entry header line falls in the time range and matches the user and search filters"""
+    header = parse_header(line)
+    if header is None:
+        return False
+    timestamp, entry_user = header
+    if start_time and timestamp < start_time:
+        return False
+    if end_time and timestamp > end_time:
+        return False
+    if user_id and entry_user != user_id:
+        return False
+    if search and search.lower() not in line.lower():
+        return False
+    return True
+
+def query_entries(log_path, start_time=None, end_time=None, user_id=None, search='', limit=100):
+    """
+    Return up to `limit` entry header lines, newest first, between two timestamps
+    (inclusive, in the log's timestamp format) and optionally for one user.
+
+    Time bounds are resolved with a binary search over the checkpoints; user
+    queries read only the lines their postings point at.
+    """
+    index = get_index(log_path)
+    log_size = os.path.getsize(log_path)
+    start, stop = _region(index, start_time, end_time, log_size)
+    results = []
+
+    with open(log_path, 'rb') as f:
+        if user_id:
+            postings = index['postings'].get(user_id, [])
+            first = bisect.bisect_left(postings, start)
+            last = bisect.bisect_left(postings, stop)
+            for offset in reversed(postings[first:last]):
+                f.seek(offset)
+                line = f.readline().decode('utf-8', errors='replace').rstrip('\n')
+                if entry_matches(line, start_time, end_time, user_id, search):
+                    results.append(line)
+                    if len(results) >= limit:
+                        break
+            return results
+
+        # Keep only the newest `limit` matches of a forward scan over the region
+        newest = collections.deque(maxlen=limit)
+        for _, raw in _scan_entries(f, start, stop):
+            line = raw.decode('utf-8', errors='replace').rstrip('\n')
+            if entry_matches(line, start_time, end_time, None, search):
+                newest.append(line)
+
+    results = list(newest)
+    results.reverse()
+    return results
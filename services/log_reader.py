@@ -0,0 +1,176 @@
+import os
+import collections
+from services import log_format, log_index, log_rotation
+
+# Size of each backwards read. Large enough to amortize syscalls, small enough
+# that reading the last few hundred lines touches only a block or two.
+BLOCK_SIZE = 64 * 1024
+
+def iter_lines_reverse(path, block_size=BLOCK_SIZE, required=(), ignore_case=False):
+    """
+    Yield the lines of a file newest-first, reading fixed-size blocks backwards
+    from the end. Only one block plus one partial line is held in memory.
+    Empty lines are skipped.
+
+    `required` is a sequence of byte strings every wanted line contains; blocks
+    missing any of them are skipped without being split or decoded. This is a
+    prefilter only, callers still check each yielded line.
+    """
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        remainder = b''
+
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            block = f.read(read_size) + remainder
+
+            # The first piece may be the tail of a line that starts in an
+            # earlier block; carry it over. Splitting on bytes before decoding
+            # keeps multi-byte characters intact across block boundaries.
+            newline = block.find(b'\n')
+            if newline < 0:
+                remainder = block
+                continue
+            remainder = block[:newline]
+            body = block[newline + 1:]
+
+            if required:
+                haystack = body.lower() if ignore_case else body
+                if not all(needle in haystack for needle in required):
+                    continue
+
+            for line in reversed(body.split(b'\n')):
+                if line:
+                    yield line.decode('utf-8', errors='replace')
+
+        if remainder:
+            yield remainder.decode('utf-8', errors='replace')
+
+def line_matches(line, search='', user_id=''):
+    """Case-insensitive search term and exact user id filters; both must match when given"""
+    if search and search.lower() not in line.lower():
+        return False
+    if user_id:
+        header = log_format.parse_header(line)
+        if header is None or header[1] != user_id:
+            return False
+    return True
+
+def _archive_lines(archive, count, matches):
+    """
+    The newest `count` matching lines of a rotated segment, newest first.
+    Compressed segments cannot be read backwards, so they are streamed forward
+    keeping only a bounded window.
+    """
+    if not archive.endswith(('.gz', '.zst')):
+        lines = []
+        for line in iter_lines_reverse(archive):
+            if matches(line):
+                lines.append(line)
+                if len(lines) >= count:
+                    break
+        return lines
+
+    newest = collections.deque(maxlen=count)
+    with log_rotation.open_archive(archive) as f:
+        for raw in f:
+            line = raw.rstrip(b'\n').decode('utf-8', errors='replace')
+            if line and matches(line):
+                newest.append(line)
+    lines = list(newest)
+    lines.reverse()
+    return lines
+
+def tail_lines(path, count, search='', user_id='', include_archives=True):
+    """
+    Return up to `count` of the most recent lines matching the filters, newest
+    first, continuing into rotated archives when the live file runs out.
+    Memory is O(count); without filters the cost does not depend on the file size.
+    """
+    results = []
+    if count <= 0:
+        return results
+
+    if os.path.exists(path):
+        results = _tail_live(path, count, search, user_id)
+
+    if include_archives:
+        for archive in log_rotation.list_archives(path):
+            if len(results) >= count:
+                break
+            results.extend(_archive_lines(archive, count - len(results),
+                                          lambda line: line_matches(line, search, user_id)))
+
+    return results
+
+def query_logs(path, start_time=None, end_time=None, user_id=None, search='', limit=100):
+    """
+    Indexed time-range/user query over the live file, continuing into the
+    archives whose time span overlaps the range. Newest first.
+    """
+    results = []
+    if os.path.exists(path):
+        results = log_index.query_entries(path, start_time, end_time, user_id, search, limit)
+
+    archives = log_rotation.list_archives(path)
+    ranges = log_rotation.archive_time_range(path, archives)
+    for archive in archives:
+        if len(results) >= limit:
+            break
+        oldest, newest = ranges[archive]
+        if start_time and newest < start_time:
+            break  # Older archives only hold older entries
+        if end_time and oldest and oldest > end_time:
+            continue
+        results.extend(_archive_lines(
+            archive, limit - len(results),
+            lambda line: log_index.entry_matches(line, start_time, end_time, user_id, search)
+        ))
+
+    return results
+
+def stream_file(path, chunk_size=BLOCK_SIZE):
+    """Yield a file's raw bytes in chunks"""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+def stream_log_history(path, chunk_size=BLOCK_SIZE):
+    """Yield the decompressed archives, oldest first, followed by the live file"""
+    for archive in reversed(log_rotation.list_archives(path)):
+        with log_rotation.open_archive(archive) as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    if os.path.exists(path):
+        yield from stream_file(path, chunk_size)
+
+def _tail_live(path, count, search='', user_id=''):
+    results = []
+
+    # Byte-level prefilter; bytes.lower() only folds ASCII, so a non-ASCII
+    # search term falls back to checking every decoded line
+    ignore_case = bool(search) and search.isascii()
+    required = []
+    if user_id:
+        # The id appears verbatim in both the text and the JSONL header
+        user_tag = user_id.encode('utf-8')
+        required.append(user_tag.lower() if ignore_case else user_tag)
+    if ignore_case:
+        required.append(search.lower().encode('utf-8'))
+
+    for line in iter_lines_reverse(path, required=required, ignore_case=ignore_case):
+        if line_matches(line, search, user_id):
+            results.append(line)
+            if len(results) >= count:
+                break
+
+    return results
@@ -0,0 +1,169 @@
+import os
+import io
+import gzip
+import fcntl
+import shutil
+import datetime
+import threading
+import contextlib
+from services import log_index
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Rotation settings. A live log file is rotated when it reaches LOG_MAX_BYTES
+# or when the first entry of a new day is written to it. Rotated segments are
+# compressed in the background and the newest LOG_BACKUP_COUNT are kept.
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(100 * 1024 * 1024)))
+LOG_ROTATE_DAILY = os.getenv("LOG_ROTATE_DAILY", "true").lower() in ("true", "1", "t")
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "14"))
+# 'gzip', or 'zstd' when the zstandard package is installed
+LOG_COMPRESSION = os.getenv("LOG_COMPRESSION", "gzip")
+
+_STAMP_FORMAT = '%Y%m%d-%H%M%S'
+_STAMP_LENGTH = 15
+_COMPRESSED_SUFFIXES = ('.gz', '.zst')
+
+def _compression_suffix():
+    if LOG_COMPRESSION == 'zstd' and zstandard is not None:
+        return '.zst'
+    return '.gz'
+
+@contextlib.contextmanager
+def _rotation_lock(log_path):
+    """Exclusive lock shared by every worker process that writes this log"""
+    with open(log_path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _due(st):
+    if st.st_size == 0:
+        return False
+    if LOG_MAX_BYTES and st.st_size >= LOG_MAX_BYTES:
+        return True
+    if LOG_ROTATE_DAILY:
+        return datetime.date.fromtimestamp(st.st_mtime) != datetime.date.today()
+    return False
+
+def should_rotate(handle):
+    """Whether the file behind an open append handle is due for rotation"""
+    return _due(os.fstat(handle.fileno()))
+
+def needs_reopen(log_path, handle):
+    """True when another process rotated the file out from under this handle"""
+    try:
+        return os.stat(log_path).st_ino != os.fstat(handle.fileno()).st_ino
+    except FileNotFoundError:
+        return True
+
+def rotate(log_path):
+    """
+    Move the live file aside as a timestamped segment and compress it in the
+    background. Safe to call from several processes; only one rotates.
+    """
+    with _rotation_lock(log_path):
+        try:
+            st = os.stat(log_path)
+        except FileNotFoundError:
+            return None
+        if not _due(st):
+            return None  # Another process rotated it already
+
+        segment = f"{log_path}.{datetime.datetime.now().strftime(_STAMP_FORMAT)}"
+        suffix = 1
+        while any(os.path.exists(segment + ext) for ext in ('',) + _COMPRESSED_SUFFIXES):
+            segment = f"{log_path}.{datetime.datetime.now().strftime(_STAMP_FORMAT)}-{suffix}"
+            suffix += 1
+
+        os.rename(log_path, segment)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(log_index.index_path(log_path))
+
+    log_index.forget(log_path)
+    threading.Thread(target=_compress_and_prune, args=(log_path, segment),
+                     name="log-compress", daemon=True).start()
+    return segment
+
+def _compress_and_prune(log_path, segment):
+    try:
+        target = segment + _compression_suffix()
+        temp = target + '.tmp'
+        with open(segment, 'rb') as source:
+            if target.endswith('.zst'):
+                with open(temp, 'wb') as raw:
+                    zstandard.ZstdCompressor().copy_stream(source, raw)
+            else:
+                with gzip.open(temp, 'wb') as compressed:
+                    shutil.copyfileobj(source, compressed, 1024 * 1024)
+        os.replace(temp, target)
+        os.remove(segment)
+    except Exception as e:
+        print(f"Error compressing log segment {segment}: {str(e)}")
+
+    for stale in list_archives(log_path)[LOG_BACKUP_COUNT:]:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(stale)
+
+def _archive_stamp(log_path, archive_path):
+    name = os.path.basename(archive_path)
+    prefix = os.path.basename(log_path) + '.'
+    if not name.startswith(prefix):
+        return None
+    stamp = name[len(prefix):len(prefix) + _STAMP_LENGTH]
+    try:
+        return datetime.datetime.strptime(stamp, _STAMP_FORMAT)
+    except ValueError:
+        return None
+
+def _archive_order(log_path, archive_path):
+    """Sort key: rotation time, then the '-n' suffix added when two rotations share a second"""
+    name = os.path.basename(archive_path)
+    for ext in _COMPRESSED_SUFFIXES:
+        if name.endswith(ext):
+            name = name[:-len(ext)]
+    extra = name[len(os.path.basename(log_path)) + 1 + _STAMP_LENGTH:]
+    collision = int(extra[1:]) if extra[1:].isdigit() else 0
+    return _archive_stamp(log_path, archive_path), collision
+
+def list_archives(log_path):
+    """Rotated segments of a log file, newest first (compressed or not yet compressed)"""
+    directory = os.path.dirname(log_path) or '.'
+    archives = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.endswith('.tmp') or _archive_stamp(log_path, path) is None:
+            continue
+        archives.append(path)
+    archives.sort(key=lambda path: _archive_order(log_path, path), reverse=True)
+    return archives
+
+def archive_time_range(log_path, archives=None):
+    """
+    Map each archive to (oldest, newest) bounds on its entries' timestamps, in
+    the log timestamp format. The newest bound is the rotation time; the oldest
+    is the previous rotation (None for the oldest archive).
+    """
+    archives = archives if archives is not None else list_archives(log_path)
+    ranges = {}
+    for position, archive in enumerate(archives):
+        newest = _archive_stamp(log_path, archive)
+        older = _archive_stamp(log_path, archives[position + 1]) if position + 1 < len(archives) else None
+        ranges[archive] = (
+            older.strftime('%Y-%m-%d %H:%M:%S.000') if older else None,
+            newest.strftime('%Y-%m-%d %H:%M:%S.999')
+        )
+    return ranges
+
+def open_archive(archive_path):
+    """Open an archive for streamed, decompressed binary reading"""
+    if archive_path.endswith('.gz'):
+        return gzip.open(archive_path, 'rb')
+    if archive_path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed; cannot read " + archive_path)
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(archive_path, 'rb'), closefd=True))
+    return open(archive_path, 'rb')
@@ -1,17 +1,23 @@
 import os
+import time
+import atexit
 import datetime
+import threading
 import traceback
-import json
-try:
-    from flask import request
-except ImportError:
-    request = None
+import collections
+from services import log_format, log_index, log_rotation
+
+_logs_dir = None
 
 # Create a logs directory if it doesn't exist
 def ensure_logs_directory():
-    logs_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs')
+    global _logs_dir
+    if _logs_dir and os.path.isdir(_logs_dir):
+        return _logs_dir
+    logs_dir = os.getenv("LOGS_DIR") or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs')
     if not os.path.exists(logs_dir):
-        os.makedirs(logs_dir)
+        os.makedirs(logs_dir, exist_ok=True)
+    _logs_dir = logs_dir
     return logs_dir
 
 # Log categories
@@ -21,6 +27,221 @@ LOG_STORAGE = 'storage'
 LOG_SYSTEM = 'system'
 LOG_ERROR = 'error'
 
+# Asynchronous writer: log_event only formats a record and queues it; a
+# background thread drains the queue in batches into files it keeps open.
+ASYNC_LOGGING = os.getenv("LOG_ASYNC", "true").lower() in ("true", "1", "t")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# What to do when the queue is full:
+#   block       - the caller waits for the writer to make room
+#   drop_oldest - discard the oldest queued entry
+#   sample      - keep only one in LOG_SAMPLE_RATE new entries, dropping the oldest for it
+# Errors are never sampled out.
+LOG_QUEUE_POLICY = os.getenv("LOG_QUEUE_POLICY", "drop_oldest")
+LOG_SAMPLE_RATE = int(os.getenv("LOG_SAMPLE_RATE", "10"))
+LOG_FSYNC_INTERVAL = float(os.getenv("LOG_FSYNC_INTERVAL", "1.0"))
+LOG_BATCH_SIZE = 500
+
+# 'text' (bracketed header with indented JSON data) or 'jsonl' (one JSON object per line)
+LOG_FORMAT = os.getenv("LOG_FORMAT", log_format.TEXT)
+
+_queue = collections.deque()
+_queue_cond = threading.Condition()
+_start_lock = threading.Lock()
+_handles_lock = threading.Lock()
+_handles = {}  # log file path -> open append-mode file
+_dirty = set()  # paths written since the last fsync
+_writer_thread = None
+_stopping = False
+_stats = collections.Counter()
+_reported_drops = 0
+
+def _format_entry(record):
+    """Render a queued record in the configured log file format"""
+    return log_format.format_record(record, LOG_FORMAT)
+
+def _get_handle(log_file):
+    handle = _handles.get(log_file)
+    if handle is None:
+        ensure_logs_directory()
+        handle = open(log_file, 'ab', buffering=0)
+        _handles[log_file] = handle
+    return handle
+
+def _write_records(records):
+    """
+    Write records to their category file and all.log, one write per file per
+    batch, and index them. Callers hold _handles_lock.
+    """
+    logs_dir = ensure_logs_directory()
+    pending = collections.defaultdict(list)
+
+    for record in records:
+        entry = (_format_entry(record).encode('utf-8'), record[1], record[3])
+        pending[os.path.join(logs_dir, f"{record[0]}.log")].append(entry)
+        pending[os.path.join(logs_dir, "all.log")].append(entry)
+
+    for log_file, entries in pending.items():
+        data = b''.join(entry[0] for entry in entries)
+        handle = _get_handle(log_file)
+
+        # Rotate by size or day, and follow rotations done by other workers
+        if log_rotation.should_rotate(handle):
+            log_rotation.rotate(log_file)
+        if log_rotation.needs_reopen(log_file, handle):
+            handle.close()
+            del _handles[log_file]
+            _dirty.discard(log_file)
+            handle = _get_handle(log_file)
+
+        handle.write(data)
+        # With O_APPEND the batch lands at the current end of file, so the
+        # position after it locates every entry even with concurrent writers
+        offset = handle.tell() - len(data)
+
+        index_entries = []
+        for entry_bytes, timestamp, user_id in entries:
+            index_entries.append((offset, timestamp, user_id))
+            offset += len(entry_bytes)
+        log_index.record_entries(log_file, index_entries)
+        _dirty.add(log_file)
+
+    _stats['written'] += len(records)
+
+def _fsync_handles(close=False):
+    with _handles_lock:
+        for log_file in list(_dirty):
+            try:
+                os.fsync(_handles[log_file].fileno())
+            except (KeyError, OSError):
+                pass
+        _dirty.clear()
+        if close:
+            for handle in _handles.values():
+                handle.close()
+            _handles.clear()
+
+def _writer_loop():
+    global _reported_drops
+    last_fsync = time.monotonic()
+
+    while True:
+        with _queue_cond:
+            if not _queue and not _stopping:
+                _queue_cond.wait(LOG_FSYNC_INTERVAL)
+            batch = [_queue.popleft() for _ in range(min(len(_queue), LOG_BATCH_SIZE))]
+            finished = _stopping and not _queue
+            # Wake callers blocked on a full queue
+            _queue_cond.notify_all()
+
+        dropped = _stats['dropped']
+        if dropped > _reported_drops:
+            batch.append((LOG_SYSTEM, _timestamp(), f"Log queue full ({LOG_QUEUE_POLICY}): dropped {dropped - _reported_drops} entries", None, None, None))
+            _reported_drops = dropped
+
+        if batch:
+            try:
+                with _handles_lock:
+                    _write_records(batch)
+            except Exception as e:
+                print(f"Error writing log batch: {str(e)}")
+                print(traceback.format_exc())
+
+        if finished:
+            _fsync_handles(close=True)
+            return
+
+        if time.monotonic() - last_fsync >= LOG_FSYNC_INTERVAL:
+            _fsync_handles()
+            last_fsync = time.monotonic()
+
+def _ensure_writer():
+    """Start the writer thread, again in each forked worker process (see _after_fork)"""
+    global _writer_thread, _stopping
+
+    if _writer_thread is not None:
+        return
+
+    with _start_lock:
+        if _writer_thread is not None:
+            return
+        _stopping = False
+        _writer_thread = threading.Thread(target=_writer_loop, name="log-writer", daemon=True)
+        _writer_thread.start()
+
+def _after_fork():
+    """
+    In a forked child only the forking thread survives: the writer is gone and
+    a lock it or another thread held stays held. Start over with new locks and
+    an empty queue; the child starts its own writer on its first event.
+    """
+    global _queue, _queue_cond, _start_lock, _handles_lock, _handles, _dirty, _writer_thread, _stopping, _reported_drops
+
+    _queue = collections.deque()
+    _queue_cond = threading.Condition()
+    _start_lock = threading.Lock()
+    _handles_lock = threading.Lock()
+    _handles = {}
+    _dirty = set()
+    _writer_thread = None
+    _stopping = False
+    _stats.clear()
+    _reported_drops = 0
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+def _enqueue(record):
+    _ensure_writer()
+
+    with _queue_cond:
+        if len(_queue) >= LOG_QUEUE_SIZE:
+            _stats['overflow'] += 1
+            if LOG_QUEUE_POLICY == 'block':
+                _stats['blocked'] += 1
+                while len(_queue) >= LOG_QUEUE_SIZE and not _stopping:
+                    _queue_cond.wait(1.0)
+            elif (LOG_QUEUE_POLICY == 'sample' and record[0] != LOG_ERROR
+                    and _stats['overflow'] % LOG_SAMPLE_RATE):
+                _stats['dropped'] += 1
+                return
+            else:
+                _queue.popleft()
+                _stats['dropped'] += 1
+
+        _queue.append(record)
+        _stats['enqueued'] += 1
+        _queue_cond.notify_all()
+
+def flush_logs(timeout=10.0):
+    """Drain the queue, fsync and close the log files; later events are written synchronously"""
+    global _stopping
+
+    if _writer_thread is None:
+        return
+    with _queue_cond:
+        _stopping = True
+        _queue_cond.notify_all()
+    _writer_thread.join(timeout)
+
+atexit.register(flush_logs)
+
+def log_queue_stats():
+    """Counters for the asynchronous writer, for diagnostics"""
+    with _queue_cond:
+        return {
+            'async': ASYNC_LOGGING,
+            'policy': LOG_QUEUE_POLICY,
+            'queued': len(_queue),
+            'capacity': LOG_QUEUE_SIZE,
+            'enqueued': _stats['enqueued'],
+            'written': _stats['written'],
+            'dropped': _stats['dropped'],
+            'blocked': _stats['blocked'],
+        }
+
+def _timestamp():
+    return datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
 def log_event(category, message, data=None, user_id=None):
     """
     Log an event to the appropriate log file
@@ -32,82 +253,37 @@ def log_event(category, message, data=None, user_id=None):
         user_id (str, optional): User ID associated with the log
     """
     try:
-        logs_dir = ensure_logs_directory()
-        
         # Create a timestamp
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-        
-        # Format the log entry
-        log_entry = {
-            'timestamp': timestamp,
-            'category': category,
-            'message': message,
-            'user_id': user_id,
-        }
+        timestamp = _timestamp()
         
+        serializable_data = None
         if data:
             # Convert any non-serializable objects to strings
             serializable_data = {}
             for key, value in data.items():
-                if isinstance(value, (str, int, float, bool, list, dict, type(None))):
+                if isinstance(value, (str, int, float, bool, list, dict, bytes, type(None))):
                     serializable_data[key] = value
                 else:
                     try:
                         serializable_data[key] = str(value)
                     except:
                         serializable_data[key] = f"<Unserializable type: {type(value).__name__}>"
-            
-            log_entry['data'] = serializable_data
-        
-        # Get request info if available
-        try:
-            if request:
-                log_entry['request'] = {
-                    'ip': request.remote_addr,
-                    'user_agent': request.user_agent.string,
-                    'path': request.path,
-                    'method': request.method,
-                }
-        except:
-            # Not in a request context
-            pass
-        
-        # Format the log string
-        log_parts = [
-            f"[{timestamp}]",
-            f"[{category.upper()}]",
-        ]
-        
-        if user_id:
-            log_parts.append(f"[User: {user_id}]")
-            
-        log_parts.append(message)
-        
-        if data:
-            try:
-                log_parts.append(json.dumps(serializable_data, indent=2))
-            except:
-                log_parts.append(str(serializable_data))
-        
-        log_text = " ".join(log_parts)
         
-        # Write to category-specific log file
-        category_log_file = os.path.join(logs_dir, f"{category}.log")
-        with open(category_log_file, 'a', encoding='utf-8') as f:
-            f.write(log_text + "\n")
+        record = (
+            category,
+            timestamp,
+            message,
+            user_id,
+            serializable_data,
+            # The traceback must be captured while the exception is being handled
+            traceback.format_exc() if category == LOG_ERROR else None,
+        )
         
-        # Also write to all.log
-        all_log_file = os.path.join(logs_dir, "all.log")
-        with open(all_log_file, 'a', encoding='utf-8') as f:
-            f.write(log_text + "\n")
-            
-        # For errors, also include the traceback
-        if category == LOG_ERROR:
-            error_details = traceback.format_exc()
-            with open(category_log_file, 'a', encoding='utf-8') as f:
-                f.write(error_details + "\n")
-            with open(all_log_file, 'a', encoding='utf-8') as f:
-                f.write(error_details + "\n")
+        if ASYNC_LOGGING and not _stopping:
+            _enqueue(record)
+        else:
+            with _handles_lock:
+                _write_records([record])
         
         return True
         
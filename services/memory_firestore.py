@@ -0,0 +1,992 @@
+import copy
+import time
+import heapq
+import uuid
+import datetime
+import functools
+import threading
+import collections
+from google.api_core.exceptions import Aborted, AlreadyExists, NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.base_aggregation import AggregationResult
+from google.cloud.firestore_v1.field_path import FieldPath
+from google.cloud.firestore_v1.watch import ChangeType, DocumentChange
+
+# In-process stand-in for the google.cloud.firestore Client, for benchmarks and
+# local runs without a project (FIRESTORE_BACKEND=memory). It implements the
+# part of the client API this app uses with Firestore's semantics:
+#
+#   documents   get/set(merge)/update/create/delete, field paths, transforms
+#               (SERVER_TIMESTAMP, DELETE_FIELD, Increment, ArrayUnion, ...)
+#   queries     where (incl. FieldFilter/And/Or), order_by (incl. __name__),
+#               limit, limit_to_last, offset, select, start_at/start_after/
+#               end_at/end_before, collection groups, count/sum/avg
+#   writes      batches, and transactions that lock the documents they read
+#               until they end, as the server does, and abort and retry when
+#               a write outside any transaction changed one before commit
+#   listeners   query on_snapshot: callbacks on a thread with the results and
+#               their changes, after writes to the query's collections
+#
+# Values order across types the way Firestore does, documents missing an
+# ordered or filtered field are left out, and `reads` counts the documents
+# returned so benchmarks can track billed reads. Queries scan their collection
+# instead of using indexes, so timings are not Firestore's.
+#
+# Reads return at once, so threads rarely interleave between a read and the
+# write that depends on it; set `read_delay` (seconds) to sleep after every
+# document read the way a network round trip would, and let races show.
+DOCUMENT_ID = '__name__'
+DEFAULT_MAX_ATTEMPTS = 5
+# Seconds a transaction waits for a document another one holds before aborting
+LOCK_TIMEOUT = 20
+
+ASCENDING = 'ASCENDING'
+DESCENDING = 'DESCENDING'
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+def _store_value(value):
+    """Copy a value the way Firestore stores it: datetimes become UTC-aware"""
+    if isinstance(value, datetime.datetime):
+        return value if value.tzinfo else value.replace(tzinfo=datetime.timezone.utc)
+    if isinstance(value, dict):
+        return {key: _store_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_store_value(item) for item in value]
+    return copy.deepcopy(value)
+
+def _sort_key(value):
+    """Firestore's cross-type value ordering"""
+    if value is None:
+        return (0,)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value != value, value if value == value else 0)  # NaN sorts first
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return (3, value.timestamp())
+    if isinstance(value, str):
+        return (4, value)
+    if isinstance(value, bytes):
+        return (5, value)
+    if isinstance(value, MemoryDocumentReference):
+        return (6, tuple(value._path))
+    if isinstance(value, (list, tuple)):
+        return (8, tuple(_sort_key(item) for item in value))
+    if isinstance(value, dict):
+        return (9, tuple((key, _sort_key(value[key])) for key in sorted(value)))
+    return (7, str(value))
+
+class _Descending:
+    """Reverses the comparison of a sort key"""
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+def _split_path(path):
+    if isinstance(path, (list, tuple)):
+        return list(path)
+    return [segment for segment in path.strip('/').split('/') if segment]
+
+def _field_parts(field_path):
+    if isinstance(field_path, FieldPath):
+        return tuple(field_path.parts)
+    return _parse_field_path(field_path)
+
+@functools.lru_cache(maxsize=1024)
+def _parse_field_path(field_path):
+    return tuple(FieldPath.from_string(field_path).parts)
+
+_MISSING = object()
+
+def _get_field(data, parts):
+    for part in parts:
+        if not isinstance(data, dict) or part not in data:
+            return _MISSING
+        data = data[part]
+    return data
+
+def _delete_field(data, parts):
+    for part in parts[:-1]:
+        data = data.get(part)
+        if not isinstance(data, dict):
+            return
+    data.pop(parts[-1], None)
+
+def _apply_field(data, parts, value):
+    """Set one field path in place, evaluating a transform against its current value"""
+    if value is transforms.DELETE_FIELD:
+        _delete_field(data, parts)
+        return
+
+    current = _get_field(data, parts)
+    if value is transforms.SERVER_TIMESTAMP:
+        value = _now()
+    elif isinstance(value, transforms.Increment):
+        number = current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0
+        value = number + value.value
+    elif isinstance(value, transforms.Maximum):
+        value = max(current, value.value) if isinstance(current, (int, float)) else value.value
+    elif isinstance(value, transforms.Minimum):
+        value = min(current, value.value) if isinstance(current, (int, float)) else value.value
+    elif isinstance(value, transforms.ArrayUnion):
+        items = list(current) if isinstance(current, list) else []
+        keys = [_sort_key(item) for item in items]
+        for item in _store_value(value.values):
+            if _sort_key(item) not in keys:
+                items.append(item)
+                keys.append(_sort_key(item))
+        value = items
+    elif isinstance(value, transforms.ArrayRemove):
+        removed = [_sort_key(item) for item in value.values]
+        value = [item for item in current if _sort_key(item) not in removed] if isinstance(current, list) else []
+    else:
+        value = _store_value(value)
+
+    for part in parts[:-1]:
+        child = data.get(part)
+        if not isinstance(child, dict):
+            child = data[part] = {}
+        data = child
+    data[parts[-1]] = value
+
+def _leaves(data, prefix=()):
+    """(field path parts, value) for set(): nested non-empty maps are descended into"""
+    for key, value in data.items():
+        parts = prefix + (key,)
+        if isinstance(value, dict) and value:
+            yield from _leaves(value, parts)
+        else:
+            yield parts, value
+
+class _Document:
+    __slots__ = ('data', 'create_time', 'update_time', 'version')
+
+    def __init__(self, data, create_time, version):
+        self.data = data
+        self.create_time = create_time
+        self.update_time = create_time
+        self.version = version
+
+class MemoryDocumentSnapshot:
+    def __init__(self, reference, data, create_time=None, update_time=None, read_time=None):
+        self.reference = reference
+        self._data = data
+        self.create_time = create_time
+        self.update_time = update_time
+        self.read_time = read_time
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        value = _get_field(self._data or {}, _field_parts(field_path))
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+class MemoryQuery:
+    def __init__(self, client, parent_path, all_descendants=False, filters=(), orders=(),
+                 limit=None, limit_to_last=False, offset=0, projection=None,
+                 start=None, end=None):
+        self._client = client
+        self._parent_path = parent_path  # Collection path, or the collection id for a group
+        self._all_descendants = all_descendants
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._limit_to_last = limit_to_last
+        self._offset = offset
+        self._projection = projection
+        self._start = start  # (values or snapshot, before)
+        self._end = end
+
+    def _copy(self, **changes):
+        state = dict(client=self._client, parent_path=self._parent_path, all_descendants=self._all_descendants,
+                     filters=self._filters, orders=self._orders, limit=self._limit,
+                     limit_to_last=self._limit_to_last, offset=self._offset, projection=self._projection,
+                     start=self._start, end=self._end)
+        state.update(changes)
+        return MemoryQuery(**state)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is None:
+            filter = (field_path, op_string, value)
+        return self._copy(filters=self._filters + (filter,))
+
+    def order_by(self, field_path, direction=ASCENDING):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copy(limit=count, limit_to_last=False)
+
+    def limit_to_last(self, count):
+        return self._copy(limit=count, limit_to_last=True)
+
+    def offset(self, num_to_skip):
+        return self._copy(offset=num_to_skip)
+
+    def select(self, field_paths):
+        return self._copy(projection=[_field_parts(field) for field in field_paths])
+
+    def start_at(self, document_fields_or_snapshot):
+        return self._copy(start=(document_fields_or_snapshot, True))
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy(start=(document_fields_or_snapshot, False))
+
+    def end_at(self, document_fields_or_snapshot):
+        return self._copy(end=(document_fields_or_snapshot, True))
+
+    def end_before(self, document_fields_or_snapshot):
+        return self._copy(end=(document_fields_or_snapshot, False))
+
+    def count(self, alias=None):
+        return MemoryAggregationQuery(self).count(alias)
+
+    def sum(self, field_ref, alias=None):
+        return MemoryAggregationQuery(self).sum(field_ref, alias)
+
+    def avg(self, field_ref, alias=None):
+        return MemoryAggregationQuery(self).avg(field_ref, alias)
+
+    # Evaluation
+
+    def _flat_filters(self):
+        """(parts, op, value) for every field filter, for implicit ordering"""
+        pending = list(self._filters)
+        while pending:
+            item = pending.pop(0)
+            if isinstance(item, tuple):
+                yield _field_parts(item[0]), item[1], item[2]
+            elif hasattr(item, 'filters'):
+                pending.extend(item.filters)
+            else:
+                yield _field_parts(item.field_path), item.op_string, item.value
+
+    def _effective_orders(self):
+        orders = [(_field_parts(field), direction) for field, direction in self._orders]
+        ordered = {parts for parts, _ in orders}
+        for parts, op, _ in self._flat_filters():
+            if op in ('<', '<=', '>', '>=', '!=', 'not-in') and parts not in ordered:
+                orders.append((parts, ASCENDING))
+                ordered.add(parts)
+        if (DOCUMENT_ID,) not in ordered:
+            orders.append(((DOCUMENT_ID,), orders[-1][1] if orders else ASCENDING))
+        return orders
+
+    def _value(self, path, data, parts):
+        if parts == (DOCUMENT_ID,):
+            return self._client.document(path)
+        return _get_field(data, parts)
+
+    def _name_value(self, value):
+        """A __name__ filter or cursor value as a document reference"""
+        if isinstance(value, MemoryDocumentReference):
+            return value
+        if isinstance(value, str) and '/' not in value and not self._all_descendants:
+            return self._client.document(self._parent_path + '/' + value)
+        return self._client.document(value)
+
+    def _matches(self, path, data, item):
+        if isinstance(item, tuple):
+            field, op, expected = item
+        elif hasattr(item, 'filters'):
+            results = (self._matches(path, data, nested) for nested in item.filters)
+            return any(results) if type(item).__name__ == 'Or' else all(results)
+        else:
+            field, op, expected = item.field_path, item.op_string, item.value
+
+        parts = _field_parts(field)
+        value = self._value(path, data, parts)
+        if value is _MISSING:
+            return False
+        if parts == (DOCUMENT_ID,):
+            expected = ([self._name_value(item) for item in expected] if op in ('in', 'not-in')
+                        else self._name_value(expected))
+
+        key = _sort_key(value)
+        if op == '==':
+            return key == _sort_key(expected)
+        if op == '!=':
+            return value is not None and key != _sort_key(expected)
+        if op == 'in':
+            return key in [_sort_key(item) for item in expected]
+        if op == 'not-in':
+            return value is not None and key not in [_sort_key(item) for item in expected]
+        if op == 'array_contains':
+            return isinstance(value, list) and _sort_key(expected) in [_sort_key(item) for item in value]
+        if op == 'array_contains_any':
+            wanted = [_sort_key(item) for item in expected]
+            return isinstance(value, list) and any(_sort_key(item) in wanted for item in value)
+
+        expected_key = _sort_key(expected)
+        if key[0] != expected_key[0]:
+            return False  # Range filters only match values of the same type
+        if op == '<':
+            return key < expected_key
+        if op == '<=':
+            return key <= expected_key
+        if op == '>':
+            return key > expected_key
+        if op == '>=':
+            return key >= expected_key
+        raise ValueError(f"Unsupported operator {op}")
+
+    def _cursor_key(self, cursor, orders):
+        values, before = cursor
+        if isinstance(values, MemoryDocumentSnapshot):
+            snapshot = values
+            if not snapshot.exists:
+                raise ValueError("Cannot use a missing document as a query cursor")
+            values = [self._value(snapshot.reference.path, snapshot._data, parts) for parts, _ in orders]
+        elif isinstance(values, dict):
+            values = [self._value('', values, parts) if parts != (DOCUMENT_ID,) else _MISSING
+                      for parts, _ in orders]
+            while values and values[-1] is _MISSING:
+                values.pop()
+        else:
+            values = list(values)
+        keys = []
+        for (parts, direction), value in zip(orders, values):
+            if parts == (DOCUMENT_ID,):
+                value = self._name_value(value)
+            keys.append(_sort_key(value) if direction == ASCENDING else _Descending(_sort_key(value)))
+        return tuple(keys), before
+
+    def _candidates(self):
+        client = self._client
+        if self._all_descendants:
+            collection_paths = [path for path in client._collections
+                                if path.rsplit('/', 1)[-1] == self._parent_path]
+        else:
+            collection_paths = [self._parent_path]
+        for collection_path in collection_paths:
+            for document_id, document in client._collections.get(collection_path, {}).items():
+                yield collection_path + '/' + document_id, document
+
+    def _rows(self):
+        """Matching (path, document) pairs in query order, after cursors, offset and limit"""
+        orders = self._effective_orders()
+        start = self._cursor_key(self._start, orders) if self._start else None
+        end = self._cursor_key(self._end, orders) if self._end else None
+
+        def sort_key(path, data):
+            keys = []
+            for parts, direction in orders:
+                if parts == (DOCUMENT_ID,):
+                    key = (6, tuple(path.split('/')))  # Same as _sort_key of its reference
+                else:
+                    value = _get_field(data, parts)
+                    if value is _MISSING:
+                        return None
+                    key = _sort_key(value)
+                keys.append(key if direction == ASCENDING else _Descending(key))
+            return tuple(keys)
+
+        def matching():
+            for path, document in self._candidates():
+                if not all(self._matches(path, document.data, item) for item in self._filters):
+                    continue
+                key = sort_key(path, document.data)
+                if key is None:
+                    continue  # Missing an ordered field
+                if start is not None:
+                    prefix = key[:len(start[0])]
+                    if prefix < start[0] or (prefix == start[0] and not start[1]):
+                        continue
+                if end is not None:
+                    prefix = key[:len(end[0])]
+                    if end[0] < prefix or (prefix == end[0] and not end[1]):
+                        continue
+                yield key, path, document
+
+        with self._client._lock:
+            if self._limit is not None and not self._limit_to_last:
+                # Keeps only offset + limit rows in memory however many match
+                rows = heapq.nsmallest(self._offset + self._limit, matching(), key=lambda row: row[0])
+            else:
+                rows = sorted(matching(), key=lambda row: row[0])
+            rows = rows[self._offset:]
+            if self._limit is not None:
+                rows = rows[-self._limit:] if self._limit_to_last else rows[:self._limit]
+            return [(path, document) for _, path, document in rows]
+
+    def _snapshot(self, path, document, read_time):
+        data = copy.deepcopy(document.data)
+        if self._projection is not None:
+            projected = {}
+            for parts in self._projection:
+                value = _get_field(data, parts)
+                if value is not _MISSING:
+                    _apply_field(projected, parts, value)
+            data = projected
+        return MemoryDocumentSnapshot(self._client.document(path), data,
+                                      document.create_time, document.update_time, read_time)
+
+    def _run(self):
+        """Snapshots of the matching documents, counted as reads"""
+        with self._client._lock:
+            read_time = _now()
+            results = [self._snapshot(path, document, read_time) for path, document in self._rows()]
+            self._client.reads += len(results)
+            return results
+
+    def _watches(self, paths):
+        """Whether a write to any of these document paths can change the results"""
+        for path in paths:
+            collection_path = path.rpartition('/')[0]
+            if self._all_descendants:
+                if collection_path.rsplit('/', 1)[-1] == self._parent_path:
+                    return True
+            elif collection_path == self._parent_path:
+                return True
+        return False
+
+    def stream(self, transaction=None):
+        return iter(self._run())
+
+    def get(self, transaction=None):
+        return self._run()
+
+    def on_snapshot(self, callback):
+        return MemoryWatch(self, callback)
+
+class MemoryCollectionReference(MemoryQuery):
+    def __init__(self, client, path):
+        self._path = _split_path(path)
+        super().__init__(client, '/'.join(self._path))
+
+    @property
+    def id(self):
+        return self._path[-1]
+
+    @property
+    def path(self):
+        return '/'.join(self._path)
+
+    @property
+    def parent(self):
+        return self._client.document(self._path[:-1]) if len(self._path) > 1 else None
+
+    def document(self, document_id=None):
+        return self._client.document(self._path + [document_id or uuid.uuid4().hex[:20]])
+
+    def add(self, document_data, document_id=None):
+        reference = self.document(document_id)
+        update_time = reference.create(document_data)
+        return update_time, reference
+
+    def list_documents(self, page_size=None):
+        with self._client._lock:
+            ids = list(self._client._collections.get(self.path, {}))
+        return (self.document(document_id) for document_id in ids)
+
+    def __eq__(self, other):
+        return isinstance(other, MemoryCollectionReference) and other._path == self._path
+
+    def __hash__(self):
+        return hash(self.path)
+
+class MemoryDocumentReference:
+    def __init__(self, client, path):
+        self._client = client
+        self._path = _split_path(path)
+
+    @property
+    def id(self):
+        return self._path[-1]
+
+    @property
+    def path(self):
+        return '/'.join(self._path)
+
+    @property
+    def parent(self):
+        return self._client.collection(self._path[:-1])
+
+    def collection(self, collection_id):
+        return self._client.collection(self._path + [collection_id])
+
+    def collections(self, page_size=None):
+        with self._client._lock:
+            ids = sorted(self._client._subcollections.get(self.path, ()))
+        return (self.collection(collection_id) for collection_id in ids)
+
+    def get(self, field_paths=None, transaction=None):
+        with self._client._lock:
+            if transaction is not None:
+                transaction._lock_document(self.path)
+            document = self._client._document(self.path)
+            if transaction is not None:
+                transaction._read(self.path, document)
+            self._client.reads += 1
+            data = copy.deepcopy(document.data) if document is not None else None
+        if self._client.read_delay:
+            time.sleep(self._client.read_delay)
+        if document is None:
+            return MemoryDocumentSnapshot(self, None, read_time=_now())
+        if field_paths is not None:
+            projected = {}
+            for field in field_paths:
+                value = _get_field(data, _field_parts(field))
+                if value is not _MISSING:
+                    _apply_field(projected, _field_parts(field), value)
+            data = projected
+        return MemoryDocumentSnapshot(self, data, document.create_time, document.update_time, _now())
+
+    def set(self, document_data, merge=False):
+        return self._client._commit([('set', self.path, document_data, merge)])
+
+    def create(self, document_data):
+        return self._client._commit([('create', self.path, document_data, False)])
+
+    def update(self, field_updates):
+        return self._client._commit([('update', self.path, field_updates, False)])
+
+    def delete(self):
+        return self._client._commit([('delete', self.path, None, False)])
+
+    def __eq__(self, other):
+        return isinstance(other, MemoryDocumentReference) and other._path == self._path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def __repr__(self):
+        return f"MemoryDocumentReference({self.path!r})"
+
+class MemoryWatch:
+    """
+    A query listener. callback(docs, changes, read_time) runs on the watch
+    thread with the initial results, then after each write that changes them;
+    writes in quick succession are delivered together. Like Firestore, only
+    the documents added or modified count as reads.
+    """
+
+    def __init__(self, query, callback):
+        self._query = query
+        self._callback = callback
+        self._versions = {}  # path -> version of the current results
+        self._order = []
+        self._pending = threading.Event()
+        self._active = True
+        with query._client._lock:
+            query._client._watches.append(self)
+        self._pending.set()
+        threading.Thread(target=self._deliver, name="memory-watch", daemon=True).start()
+
+    def _notify(self, paths):
+        if paths is None or self._query._watches(paths):
+            self._pending.set()
+
+    def _changes(self):
+        client = self._query._client
+        with client._lock:
+            rows = self._query._rows()
+            read_time = _now()
+            versions = {path: document.version for path, document in rows}
+            changed = [(index, path, document) for index, (path, document) in enumerate(rows)
+                       if self._versions.get(path) != document.version]
+            removed = [path for path in self._order if path not in versions]
+            if not changed and not removed and self._order:
+                return None
+            snapshots = {path: self._query._snapshot(path, document, read_time)
+                         for path, document in rows}
+            client.reads += len(changed)
+
+        changes = [DocumentChange(ChangeType.REMOVED, MemoryDocumentSnapshot(client.document(path), None),
+                                  self._order.index(path), -1) for path in removed]
+        for index, path, _ in changed:
+            kind = ChangeType.MODIFIED if path in self._versions else ChangeType.ADDED
+            old_index = self._order.index(path) if kind == ChangeType.MODIFIED else -1
+            changes.append(DocumentChange(kind, snapshots[path], old_index, index))
+        self._versions = versions
+        self._order = [path for path, _ in rows]
+        return [snapshots[path] for path in self._order], changes, read_time
+
+    def _deliver(self):
+        while True:
+            self._pending.wait()
+            self._pending.clear()
+            if not self._active:
+                return
+            update = self._changes()
+            if update is not None:
+                try:
+                    self._callback(*update)
+                except Exception as e:
+                    print(f"Memory listener callback failed: {str(e)}")
+
+    @property
+    def is_active(self):
+        return self._active
+
+    def unsubscribe(self):
+        self._active = False
+        with self._query._client._lock:
+            if self in self._query._client._watches:
+                self._query._client._watches.remove(self)
+        self._pending.set()
+
+    close = unsubscribe
+
+class MemoryAggregationQuery:
+    def __init__(self, query):
+        self._query = query
+        self._aggregations = []
+
+    def _add(self, kind, parts, alias):
+        self._aggregations.append((kind, parts, alias or f"field_{len(self._aggregations) + 1}"))
+        return self
+
+    def count(self, alias=None):
+        return self._add('count', None, alias)
+
+    def sum(self, field_ref, alias=None):
+        return self._add('sum', _field_parts(field_ref), alias)
+
+    def avg(self, field_ref, alias=None):
+        return self._add('avg', _field_parts(field_ref), alias)
+
+    def get(self, transaction=None):
+        # Billed as one read per 1000 index entries matched, not per document
+        client = self._query._client
+        with client._lock:
+            rows = self._query._rows()
+            client.reads += max(1, -(-len(rows) // 1000))
+            read_time = _now()
+            results = []
+            for kind, parts, alias in self._aggregations:
+                results.append(AggregationResult(alias=alias, value=self._aggregate(kind, parts, rows),
+                                                 read_time=read_time))
+        return [results]
+
+    @staticmethod
+    def _aggregate(kind, parts, rows):
+        if kind == 'count':
+            return len(rows)
+        numbers = [value for value in (_get_field(document.data, parts) for _, document in rows)
+                   if isinstance(value, (int, float)) and not isinstance(value, bool)]
+        if kind == 'sum':
+            return sum(numbers) if numbers else 0
+        return sum(numbers) / len(numbers) if numbers else None
+
+    def stream(self, transaction=None):
+        return iter(self.get(transaction))
+
+class MemoryWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append(('set', reference.path, document_data, merge))
+        return self
+
+    def create(self, reference, document_data):
+        self._writes.append(('create', reference.path, document_data, False))
+        return self
+
+    def update(self, reference, field_updates):
+        self._writes.append(('update', reference.path, field_updates, False))
+        return self
+
+    def delete(self, reference):
+        self._writes.append(('delete', reference.path, None, False))
+        return self
+
+    def __len__(self):
+        return len(self._writes)
+
+    def commit(self):
+        writes, self._writes = self._writes, []
+        return self._client._commit(writes)
+
+class MemoryTransaction(MemoryWriteBatch):
+    """Optimistic transaction: commit aborts if a document it read has changed since"""
+
+    def __init__(self, client, max_attempts=DEFAULT_MAX_ATTEMPTS, read_only=False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+        self._read_versions = {}
+        self._locked = set()
+
+    @property
+    def in_progress(self):
+        return self._id is not None
+
+    @property
+    def id(self):
+        return self._id
+
+    def _begin(self, retry_id=None):
+        self._id = uuid.uuid4().bytes
+        self._read_versions = {}
+        self._writes = []
+
+    def _clean_up(self):
+        self._id = None
+        self._writes = []
+        self._unlock()
+
+    def _rollback(self):
+        self._clean_up()
+        self._read_versions = {}
+
+    def _lock_document(self, path):
+        """Hold a document until this transaction ends; call with the client's lock held"""
+        client = self._client
+        if self._read_only:
+            return
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while client._locks.get(path, self) is not self:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise Aborted(f"Timed out waiting for a lock on {path}")
+            client._unlocked.wait(remaining)
+        client._locks[path] = self
+        self._locked.add(path)
+
+    def _unlock(self):
+        if not self._locked:
+            return
+        client = self._client
+        with client._lock:
+            for path in self._locked:
+                if client._locks.get(path) is self:
+                    del client._locks[path]
+            self._locked = set()
+            client._unlocked.notify_all()
+
+    def _read(self, path, document):
+        self._read_versions.setdefault(path, document.version if document is not None else 0)
+
+    def _commit(self):
+        writes, self._writes = self._writes, []
+        try:
+            return self._client._commit(writes, self._read_versions)
+        finally:
+            self._clean_up()
+
+    def get(self, ref_or_query):
+        if isinstance(ref_or_query, MemoryDocumentReference):
+            return iter([ref_or_query.get(transaction=self)])
+        snapshots = ref_or_query._run()
+        with self._client._lock:
+            for snapshot in snapshots:
+                self._lock_document(snapshot.reference.path)
+                self._read(snapshot.reference.path, self._client._document(snapshot.reference.path))
+        return iter(snapshots)
+
+    def get_all(self, references):
+        return self._client.get_all(references, transaction=self)
+
+class MemoryFirestore:
+    """Thread-safe in-memory client; see the module comment for what it covers"""
+
+    def __init__(self, project='memory'):
+        self.project = project
+        self._lock = threading.RLock()
+        self._unlocked = threading.Condition(self._lock)
+        self._locks = {}  # document path -> transaction holding it
+        self._collections = {}  # collection path -> {document id: _Document}
+        self._subcollections = collections.defaultdict(collections.Counter)  # parent doc path -> collection ids
+        self._version = 0
+        self._watches = []
+        self.reads = 0
+        self.writes = 0
+        self.read_delay = 0
+
+    # References
+
+    def collection(self, *path):
+        segments = _split_path('/'.join(path) if path and isinstance(path[0], str) else path[0])
+        return MemoryCollectionReference(self, segments)
+
+    def document(self, *path):
+        segments = _split_path('/'.join(path) if path and isinstance(path[0], str) else path[0])
+        return MemoryDocumentReference(self, segments)
+
+    def collection_group(self, collection_id):
+        return MemoryQuery(self, collection_id, all_descendants=True)
+
+    def collections(self):
+        with self._lock:
+            ids = sorted(self._subcollections.get('', ()))
+        return (self.collection(collection_id) for collection_id in ids)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        for reference in references:
+            yield reference.get(field_paths, transaction)
+
+    def batch(self):
+        return MemoryWriteBatch(self)
+
+    def transaction(self, max_attempts=DEFAULT_MAX_ATTEMPTS, read_only=False):
+        return MemoryTransaction(self, max_attempts, read_only)
+
+    def close(self):
+        pass
+
+    # Storage
+
+    def _document(self, path):
+        collection_path, _, document_id = path.rpartition('/')
+        return self._collections.get(collection_path, {}).get(document_id)
+
+    def _link(self, collection_path, delta):
+        parent, _, collection_id = collection_path.rpartition('/')
+        counts = self._subcollections[parent]
+        counts[collection_id] += delta
+        if counts[collection_id] <= 0:
+            del counts[collection_id]
+
+    def _commit(self, writes, read_versions=None):
+        """Apply writes atomically; with read_versions, abort if any of those documents changed"""
+        with self._lock:
+            for path, version in (read_versions or {}).items():
+                document = self._document(path)
+                if (document.version if document is not None else 0) != version:
+                    raise Aborted(f"Document {path} changed during the transaction")
+
+            # Validate before applying anything, so a failed batch leaves no partial writes
+            staged = {}
+            for kind, path, data, merge in writes:
+                exists = staged[path] is not None if path in staged else self._document(path) is not None
+                if kind == 'create' and exists:
+                    raise AlreadyExists(f"Document already exists: {path}")
+                if kind == 'update' and not exists:
+                    raise NotFound(f"No document to update: {path}")
+                staged[path] = None if kind == 'delete' else True
+
+            commit_time = _now()
+            for kind, path, data, merge in writes:
+                self._apply(kind, path, data, merge, commit_time)
+            self.writes += len(writes)
+            for watch in self._watches:
+                watch._notify(staged)
+            return commit_time
+
+    def _apply(self, kind, path, data, merge, commit_time):
+        collection_path, _, document_id = path.rpartition('/')
+        documents = self._collections.get(collection_path)
+        document = documents.get(document_id) if documents is not None else None
+
+        if kind == 'delete':
+            if document is not None:
+                del documents[document_id]
+                if not documents:
+                    del self._collections[collection_path]
+                self._link(collection_path, -1)
+            return
+
+        if kind == 'update':
+            fields = copy.deepcopy(document.data)
+            for key, value in data.items():
+                _apply_field(fields, _field_parts(key), value)
+        else:
+            fields = copy.deepcopy(document.data) if merge and document is not None else {}
+            for parts, value in _leaves(data):
+                _apply_field(fields, parts, value)
+
+        self._version += 1
+        if document is None:
+            if documents is None:
+                documents = self._collections[collection_path] = {}
+            documents[document_id] = _Document(fields, commit_time, self._version)
+            self._link(collection_path, 1)
+        else:
+            document.data = fields
+            document.update_time = commit_time
+            document.version = self._version
+
+    def load(self, documents):
+        """Bulk insert {path: data} without transforms or validation, for seeding"""
+        with self._lock:
+            commit_time = _now()
+            for path, data in documents.items():
+                collection_path, _, document_id = path.rpartition('/')
+                existing = self._collections.setdefault(collection_path, {})
+                self._version += 1
+                if document_id not in existing:
+                    self._link(collection_path, 1)
+                existing[document_id] = _Document(_store_value(data), commit_time, self._version)
+            for watch in self._watches:
+                watch._notify(None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'collections': len(self._collections),
+                'documents': sum(len(documents) for documents in self._collections.values()),
+                'reads': self.reads,
+                'writes': self.writes,
+            }
+
+class _AsyncProxy:
+    """Async view of a memory reference, query or aggregation"""
+    _COROUTINES = ('get', 'set', 'update', 'create', 'delete', 'add', 'commit')
+    _GENERATORS = ('stream', 'collections', 'get_all', 'list_documents')
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if not callable(attribute):
+            return attribute
+        if name in self._COROUTINES:
+            async def coroutine(*args, **kwargs):
+                return _wrap(attribute(*_unwrap(args), **_unwrap(kwargs)))
+            return coroutine
+        if name in self._GENERATORS:
+            async def generator(*args, **kwargs):
+                for item in attribute(*_unwrap(args), **_unwrap(kwargs)):
+                    yield _wrap(item)
+            return generator
+
+        @functools.wraps(attribute)
+        def method(*args, **kwargs):
+            return _wrap(attribute(*_unwrap(args), **_unwrap(kwargs)))
+        return method
+
+def _wrap(value):
+    if isinstance(value, (MemoryQuery, MemoryDocumentReference, MemoryAggregationQuery, MemoryWriteBatch)):
+        return _AsyncProxy(value)
+    return value
+
+def _unwrap(value):
+    if isinstance(value, _AsyncProxy):
+        return value._target
+    if isinstance(value, dict):
+        return {key: _unwrap(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_unwrap(item) for item in value)
+    return value
+
+class MemoryAsyncFirestore(_AsyncProxy):
+    """The AsyncClient counterpart of a MemoryFirestore, sharing its data"""
+
+    def __init__(self, client):
+        super().__init__(client)
@@ -0,0 +1,298 @@
+import re
+import sys
+import functools
+import unicodedata
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Canonical values for the questionnaire answers (config.STEPS). The bot
+# stores what the athlete typed ("sim!", "masc", "75 kg", "1,80"), so the
+# answers are mapped to:
+#
+#   age, weight, height, training_hours    numbers in years, kg, cm, hours/week
+#                                          (None when unparseable or implausible)
+#   experience, gender, diet, carb_adapted,
+#   cramps, plan_type                      one of CATEGORIES[field], OTHER, or None
+#   sports                                 SPORTS names, OTHER for the rest
+#
+# Categorical answers are matched case- and accent-insensitively against the
+# canonical answers and ALIASES, then by their words, unless the answer hedges
+# ("não sei", "talvez": no answer) or negates ("não sou vegano": other). Each
+# distinct raw answer is parsed once
+# (memoized), so bulk normalization is a dictionary lookup per answer plus a
+# NumPy gather per column.
+#
+# save_user_data stores normalize_profile() of the answers it writes under
+# the user's 'normalized' map; backfill() normalizes every user document.
+NUMERIC_FIELDS = ('age', 'weight', 'height', 'training_hours')
+
+# Plausible range of each numeric answer; anything outside is treated as unparseable
+NUMERIC_RANGES = {
+    'age': (5, 100),
+    'weight': (25, 250),
+    'height': (100, 230),
+    'training_hours': (0, 80),
+}
+
+# Canonical answers, in code order (code 0 is "no answer", the last code is "other")
+CATEGORIES = {
+    'experience': ['Iniciante', 'Intermediário', 'Avançado'],
+    'gender': ['Masculino', 'Feminino'],
+    'diet': ['Como de tudo', 'Vegetariano', 'Vegano', 'Low carb'],
+    'carb_adapted': ['Sim', 'Não'],
+    'cramps': ['Sim', 'Não'],
+    'plan_type': ['Diário', 'Semanal'],
+}
+NO_ANSWER = 'Sem resposta'
+OTHER = 'Outro'
+
+# Folded answers that also mean a canonical answer
+ALIASES = {
+    'experience': {'basico': 'Iniciante', 'novato': 'Iniciante', 'comecando': 'Iniciante',
+                   'medio': 'Intermediário', 'intermedio': 'Intermediário',
+                   'avancada': 'Avançado', 'experiente': 'Avançado', 'profissional': 'Avançado', 'elite': 'Avançado'},
+    'gender': {'m': 'Masculino', 'masc': 'Masculino', 'homem': 'Masculino', 'male': 'Masculino',
+               'f': 'Feminino', 'fem': 'Feminino', 'mulher': 'Feminino', 'female': 'Feminino'},
+    'diet': {'tudo': 'Como de tudo', 'onivoro': 'Como de tudo', 'normal': 'Como de tudo',
+             'vegetariana': 'Vegetariano', 'vegana': 'Vegano', 'lowcarb': 'Low carb', 'cetogenica': 'Low carb'},
+    'carb_adapted': {'s': 'Sim', 'yes': 'Sim', 'n': 'Não', 'no': 'Não'},
+    'cramps': {'s': 'Sim', 'yes': 'Sim', 'n': 'Não', 'no': 'Não', 'as vezes': 'Sim', 'raramente': 'Sim',
+               'sempre': 'Sim', 'nunca': 'Não'},
+    'plan_type': {'diaria': 'Diário', 'dia': 'Diário', 'semana': 'Semanal'},
+}
+
+# Folded phrases that leave a categorical answer unanswered wherever they appear
+NO_ANSWER_PHRASES = ('nao sei', 'sei la', 'talvez', 'nao lembro', 'nao tenho certeza', 'prefiro nao',
+                     'tanto faz', 'depende')
+# Words that make an answer's other words unreliable ("não sou vegano")
+NEGATIONS = frozenset(['nao', 'nem', 'nunca'])
+
+SPORTS = ['Ciclismo', 'Corrida', 'Natação', 'Triathlon', 'MTB', 'Musculação']
+SPORT_ALIASES = {
+    'ciclismo': 'Ciclismo', 'bike': 'Ciclismo', 'pedal': 'Ciclismo', 'speed': 'Ciclismo',
+    'corrida': 'Corrida', 'running': 'Corrida', 'maratona': 'Corrida',
+    'natacao': 'Natação', 'swim': 'Natação',
+    'triathlon': 'Triathlon', 'triatlo': 'Triathlon',
+    'mtb': 'MTB', 'mountain bike': 'MTB',
+    'musculacao': 'Musculação', 'academia': 'Musculação', 'crossfit': 'Musculação',
+}
+OTHER_SPORT_BIT = len(SPORTS)
+
+NUMBER = re.compile(r'\d+(?:[.,]\d+)?')
+RANGE_SEPARATOR = re.compile(r'^\s*(?:-|–|a|ate|ou|/)\s*$')
+HOURS_MINUTES = re.compile(r'^\s*(\d+)\s*h\s*(\d{2})\b')
+SPORT_SEPARATOR = re.compile(r'\s*(?:,|/|;|\+|\be\b)\s*')
+
+def _strip_accents(text):
+    return unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii').lower()
+
+def _fold(text):
+    """Lowercase without accents or punctuation, for matching free-text answers"""
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', _strip_accents(text)).split())
+
+def _lookup(field):
+    lookup = {_fold(category): category for category in CATEGORIES[field]}
+    lookup.update(ALIASES.get(field, {}))
+    return lookup
+
+LOOKUPS = {field: _lookup(field) for field in CATEGORIES}
+
+def _hashable(value):
+    return value if value is None or isinstance(value, (str, int, float, bool)) else str(value)
+
+@functools.lru_cache(maxsize=65536)
+def category_code(field, answer):
+    """Code of a free-text answer in CATEGORIES[field]: 0 for none, len + 1 for other"""
+    categories = CATEGORIES[field]
+    folded = _fold(answer) if answer is not None else ''
+    if not folded:
+        return 0
+    lookup = LOOKUPS[field]
+    match = lookup.get(folded)
+    if match is None:
+        if any(f" {phrase} " in f" {folded} " for phrase in NO_ANSWER_PHRASES):
+            return 0
+        words = folded.split()
+        if NEGATIONS.isdisjoint(words):
+            match = next((lookup[word] for word in words if word in lookup), None)
+    return categories.index(match) + 1 if match is not None else len(categories) + 1
+
+@functools.lru_cache(maxsize=65536)
+def parse_number(field, answer):
+    """A numeric answer ("75kg", "1,80", "6 a 8h", "1h30") in the field's unit, or NaN"""
+    if isinstance(answer, bool) or answer is None:
+        return float('nan')
+    if isinstance(answer, (int, float)):
+        value = float(answer)
+    else:
+        text = _strip_accents(answer)
+        hours = HOURS_MINUTES.match(text) if field == 'training_hours' else None
+        matches = list(NUMBER.finditer(text))
+        if hours:
+            value = int(hours.group(1)) + int(hours.group(2)) / 60
+        elif not matches:
+            return float('nan')
+        elif len(matches) > 1 and RANGE_SEPARATOR.match(text[matches[0].end():matches[1].start()]):
+            # "6-8" means about 7
+            value = sum(float(match.group().replace(',', '.')) for match in matches[:2]) / 2
+        else:
+            value = float(matches[0].group().replace(',', '.'))
+    if field == 'height' and value < 3:
+        value *= 100  # Given in meters
+    low, high = NUMERIC_RANGES[field]
+    return value if low <= value <= high else float('nan')
+
+@functools.lru_cache(maxsize=65536)
+def sports_mask(answer):
+    """Bitmask over SPORTS (and OTHER_SPORT_BIT) of a list of sports"""
+    mask = 0
+    for part in SPORT_SEPARATOR.split(_strip_accents(answer) if answer is not None else ''):
+        part = _fold(part)
+        if not part:
+            continue
+        sport = SPORT_ALIASES.get(part) or next(
+            (SPORT_ALIASES[word] for word in part.split() if word in SPORT_ALIASES), None)
+        mask |= 1 << (SPORTS.index(sport) if sport else OTHER_SPORT_BIT)
+    return mask
+
+def category_label(field, code):
+    """The canonical answer for a code; None for no answer"""
+    categories = CATEGORIES[field]
+    return None if code == 0 else categories[code - 1] if code <= len(categories) else OTHER
+
+def sports_labels(mask):
+    return [sport for bit, sport in enumerate(SPORTS + [OTHER]) if mask & (1 << bit)]
+
+def normalize_value(field, answer):
+    """Canonical value of one answer, or None when the field is not normalized"""
+    answer = _hashable(answer)
+    if field in NUMERIC_FIELDS:
+        value = parse_number(field, answer)
+        return None if value != value else round(value, 2)
+    if field in CATEGORIES:
+        return category_label(field, category_code(field, answer))
+    if field == 'sports':
+        return sports_labels(sports_mask(answer))
+    return None
+
+NORMALIZED_FIELDS = NUMERIC_FIELDS + tuple(CATEGORIES) + ('sports',)
+
+def normalize_profile(profile, fields=NORMALIZED_FIELDS):
+    """{field: canonical value} for the normalized fields of a profile"""
+    profile = profile if isinstance(profile, dict) else {}
+    return {field: normalize_value(field, profile.get(field)) for field in fields}
+
+# Bulk normalization
+
+def _factorize(values):
+    """(codes, distinct values) with codes[i] the position of values[i] in distinct"""
+    try:
+        distinct = list(dict.fromkeys(values))
+    except TypeError:
+        values = [_hashable(value) for value in values]  # Lists or maps instead of text
+        distinct = list(dict.fromkeys(values))
+    index = {value: position for position, value in enumerate(distinct)}
+    codes = np.fromiter(map(index.__getitem__, values), dtype=np.int64, count=len(values))
+    return codes, distinct
+
+def normalize_column(field, answers):
+    """
+    Typed array for one field over many answers: float32 with NaN for the
+    numeric fields, uint8 category codes, or a uint16 sports bitmask
+    """
+    codes, distinct = _factorize(answers)
+    if field in NUMERIC_FIELDS:
+        parsed = np.array([parse_number(field, answer) for answer in distinct], dtype=np.float32)
+    elif field in CATEGORIES:
+        parsed = np.array([category_code(field, answer) for answer in distinct], dtype=np.uint8)
+    elif field == 'sports':
+        parsed = np.array([sports_mask(answer) for answer in distinct], dtype=np.uint16)
+    else:
+        raise ValueError(f"{field} is not a normalized field")
+    return parsed[codes] if len(distinct) else parsed[:0]
+
+def normalize_columns(profiles, fields=NORMALIZED_FIELDS):
+    """{field: typed array} for a sequence of profile maps (see normalize_column)"""
+    if np is None:
+        raise RuntimeError("Bulk normalization needs the numpy package")
+    profiles = [profile if isinstance(profile, dict) else {} for profile in profiles]
+    return {field: normalize_column(field, [profile.get(field) for profile in profiles]) for field in fields}
+
+def normalize_profiles(profiles, fields=NORMALIZED_FIELDS):
+    """normalize_profile() of every profile, in bulk when numpy is installed"""
+    if np is None:
+        return [normalize_profile(profile, fields) for profile in profiles]
+
+    columns = normalize_columns(profiles, fields)
+    values = {}
+    for field, column in columns.items():
+        if field in NUMERIC_FIELDS:
+            rounded = np.round(column.astype(np.float64), 2)
+            values[field] = np.where(np.isnan(rounded), None, rounded.astype(object)).tolist()
+        elif field in CATEGORIES:
+            labels = np.array([category_label(field, code) for code in range(len(CATEGORIES[field]) + 2)], dtype=object)
+            values[field] = labels[column].tolist()
+        else:
+            distinct, inverse = np.unique(column, return_inverse=True)
+            labels = [sports_labels(int(mask)) for mask in distinct]
+            values[field] = [list(labels[position]) for position in inverse.ravel().tolist()]
+    return [dict(zip(values, row)) for row in zip(*values.values())]
+
+def normalized_update(user_data):
+    """
+    Fields to merge into a user document saved with user_data: the
+    normalized values of the profile answers it carries
+    """
+    profile = user_data.get('profile')
+    if not isinstance(profile, dict):
+        return {}
+    fields = [field for field in NORMALIZED_FIELDS if field in profile]
+    return {'normalized': normalize_profile(profile, fields)} if fields else {}
+
+def backfill(db, page_size=500, log_message=print):
+    """Set 'normalized' on every user whose stored values differ from their profile's"""
+    updated = 0
+    scanned = 0
+    last = None
+    query = db.collection('users').order_by('__name__').limit(page_size)
+
+    while True:
+        page = list((query.start_after(last) if last is not None else query).stream())
+        if not page:
+            break
+        scanned += len(page)
+        last = page[-1]
+
+        documents = [snapshot.to_dict() or {} for snapshot in page]
+        normalized = normalize_profiles([data.get('profile') for data in documents])
+        batch = db.batch()
+        pending = 0
+        for snapshot, data, values in zip(page, documents, normalized):
+            if data.get('normalized') != values:
+                batch.update(snapshot.reference, {'normalized': values})
+                pending += 1
+        if pending:
+            batch.commit()
+            updated += pending
+        if len(page) < page_size:
+            break
+
+    log_message(f">>> Normalized profiles on {updated} of {scanned} users")
+    return updated
+
+# Backfill normalized profiles: python -m services.normalization_service backfill
+if __name__ == "__main__":
+    from services.firebase_service import get_db
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'backfill':
+        print("Usage: python -m services.normalization_service backfill")
+        sys.exit(1)
+
+    database = get_db()
+    if database is None:
+        print("Firebase initialization failed")
+        sys.exit(1)
+
+    backfill(database)
@@ -0,0 +1,129 @@
+import sys
+import uuid
+import datetime
+from firebase_admin import firestore
+
+# Top-level index of generated plans, one document per upload, written
+# alongside the pdf_plans array embedded in each user document. Lets /plans run
+# an ordered, paged query instead of flattening every user.
+#
+# PDFs are stored content-addressed, so two uploads (of one athlete or of two)
+# can share a filename; the index document id is the user plus the upload id
+# each plan carries, keeping one index document per pdf_plans element.
+PLANS_COLLECTION = 'plans'
+
+PAGE_SIZE = 50
+
+def new_upload_id():
+    return uuid.uuid4().hex
+
+def plan_doc_id(user_id, plan):
+    """Stable document id for a user's plan, so re-running the backfill is idempotent"""
+    if plan.get('id'):
+        return f"{user_id}_{plan['id']}"
+    if plan.get('sha256'):
+        # Content-addressed but recorded without an upload id: the upload time tells them apart
+        created_at = plan.get('created_at')
+        stamp = int(created_at.timestamp() * 1000000) if hasattr(created_at, 'timestamp') else 0
+        return f"{user_id}_{plan['sha256']}_{stamp}"
+    # Older filenames are unique per upload
+    return plan['filename'].replace('/', '_')
+
+def plan_ref(db, user_id, plan):
+    return db.collection(PLANS_COLLECTION).document(plan_doc_id(user_id, plan))
+
+def plan_index_entry(user_id, user_name, plan, size=None):
+    return {
+        'user_id': user_id,
+        'user_name': user_name or 'Unknown',
+        'filename': plan.get('filename'),
+        'url': plan.get('url'),
+        'created_at': plan.get('created_at'),
+        'size': size
+    }
+
+def record_plan(writer, db, user_id, user_name, plan, size=None):
+    """Queue the index document for a plan on a transaction or batch"""
+    writer.set(plan_ref(db, user_id, plan), plan_index_entry(user_id, user_name, plan, size))
+
+def list_plans_page(db, page_size=PAGE_SIZE, cursor=None):
+    """
+    Return (plans, next_cursor) for one page of plans, newest first.
+    `cursor` is the document id of the last plan on the previous page.
+    """
+    query = (
+        db.collection(PLANS_COLLECTION)
+        .order_by('created_at', direction=firestore.Query.DESCENDING)
+    )
+
+    if cursor:
+        cursor_doc = db.collection(PLANS_COLLECTION).document(cursor).get()
+        if cursor_doc.exists:
+            query = query.start_after(cursor_doc)
+
+    plans = []
+    last_doc = None
+    for doc in query.limit(page_size).stream():
+        plan = doc.to_dict()
+        plan['id'] = doc.id
+        plans.append(plan)
+        last_doc = doc
+
+    next_cursor = last_doc.id if last_doc is not None and len(plans) == page_size else None
+    return plans, next_cursor
+
+def backfill_plans_index(db, log_message=print):
+    """Create index documents for every plan embedded in user documents"""
+    batch = db.batch()
+    pending = 0
+    written = 0
+    skipped = 0
+
+    for user in db.collection('users').stream():
+        user_data = user.to_dict() or {}
+        pdf_plans = user_data.get('pdf_plans', [])
+        if not isinstance(pdf_plans, list):
+            continue
+
+        profile = user_data.get('profile')
+        user_name = profile.get('name') if isinstance(profile, dict) else None
+
+        for plan in pdf_plans:
+            if not isinstance(plan, dict) or not plan.get('filename'):
+                skipped += 1
+                continue
+
+            entry = plan_index_entry(user.id, user_name, plan)
+            del entry['size']  # Unknown here; keep any size already recorded
+            if entry['created_at'] is None:
+                # Documents without the ordered field would never be listed
+                entry['created_at'] = datetime.datetime.fromtimestamp(0, datetime.timezone.utc)
+
+            batch.set(plan_ref(db, user.id, plan), entry, merge=True)
+            pending += 1
+            written += 1
+            if pending >= 500:
+                batch.commit()
+                batch = db.batch()
+                pending = 0
+
+    if pending:
+        batch.commit()
+
+    log_message(f">>> Backfilled {written} plan index documents ({skipped} malformed plans skipped)")
+    return written
+
+# Backfill the plans index: python -m services.plan_service backfill
+if __name__ == "__main__":
+    from services.firebase_service import get_db
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'backfill':
+        print("Usage: python -m services.plan_service backfill")
+        sys.exit(1)
+
+    database = get_db()
+    if database is None:
+        print("Firebase initialization failed")
+        sys.exit(1)
+
+    backfill_plans_index(database)
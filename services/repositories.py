@@ -0,0 +1,139 @@
+from firebase_admin import firestore
+from services import plan_service, user_service
+
+# Data access for the admin pages, one repository per collection. Each takes
+# the client it reads from: the shared Firestore client from get_db(), or a
+# memory_firestore.MemoryFirestore when running without a project
+# (FIRESTORE_BACKEND=memory) or in a benchmark.
+
+class AdminRepository:
+    """Console logins in admin_users"""
+    COLLECTION = 'admin_users'
+    # The setup script creates the first admin under a known document id
+    DEFAULT_ADMIN_ID = 'admin_user'
+
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.collection(self.COLLECTION)
+
+    def find_by_username(self, username):
+        """Snapshot of the admin with this username, or None"""
+        default_admin = self.collection.document(self.DEFAULT_ADMIN_ID).get()
+        if default_admin.exists and (default_admin.to_dict() or {}).get('username') == username:
+            return default_admin
+        matches = self.collection.where('username', '==', username).limit(1).get()
+        return next(iter(matches), None)
+
+    def list(self):
+        """Every admin without the password hash"""
+        admins = []
+        for admin in self.collection.stream():
+            admin_data = admin.to_dict()
+            admin_data['id'] = admin.id
+            admin_data.pop('password', None)
+            admins.append(admin_data)
+        return admins
+
+    def get(self, admin_id):
+        snapshot = self.collection.document(admin_id).get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+    def add(self, username, password_hash, name, email):
+        _, admin_ref = self.collection.add({
+            'username': username,
+            'password': password_hash,
+            'name': name,
+            'email': email,
+            'created_at': firestore.SERVER_TIMESTAMP,
+            'last_login': None
+        })
+        return admin_ref.id
+
+    def update(self, admin_id, fields):
+        self.collection.document(admin_id).update(dict(fields, updated_at=firestore.SERVER_TIMESTAMP))
+
+    def record_login(self, admin_id):
+        self.collection.document(admin_id).update({'last_login': firestore.SERVER_TIMESTAMP})
+
+    def delete(self, admin_id):
+        self.collection.document(admin_id).delete()
+
+class UserRepository:
+    """Athlete documents in users"""
+    COLLECTION = 'users'
+
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.collection(self.COLLECTION)
+
+    def get(self, user_id):
+        snapshot = self.collection.document(user_id).get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+    def list_page(self, sort='last_updated', direction='desc', filters=None,
+                  page_size=user_service.DEFAULT_PAGE_SIZE, cursor=None):
+        """(users, next_cursor, scanned); see user_service.list_users_page"""
+        return user_service.list_users_page(self.db, sort=sort, direction=direction, filters=filters,
+                                            page_size=page_size, cursor=cursor)
+
+    def stream(self):
+        """Every user snapshot; full scans are for diagnostics and backfills only"""
+        return self.collection.stream()
+
+    def with_plans(self, limit=user_service.DIAGNOSTIC_MAX_USERS):
+        """Snapshots of up to `limit` users with a positive plan_count"""
+        return self.collection.where('plan_count', '>', 0).limit(limit).stream()
+
+    def count(self):
+        return self.collection.count().get()[0][0].value
+
+class PlanRepository:
+    """The plans index (see plan_service)"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def list_page(self, page_size=plan_service.PAGE_SIZE, cursor=None):
+        """(plans, next_cursor), newest first"""
+        return plan_service.list_plans_page(self.db, page_size=page_size, cursor=cursor)
+
+    def get(self, plan_id):
+        """One index document by the id list_page returns"""
+        snapshot = self.db.collection(plan_service.PLANS_COLLECTION).document(plan_id).get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+class InteractionRepository:
+    """
+    Bot interactions, stored under users/<id>/interactions. Also takes an
+    AsyncClient (async_repository) or a client whose queries are listened to
+    (live_service): recent_query() builds the same query for both.
+    """
+    COLLECTION = 'interactions'
+
+    def __init__(self, db):
+        self.db = db
+
+    def document(self, user_id, interaction_id):
+        return (self.db.collection(UserRepository.COLLECTION).document(user_id)
+                .collection(self.COLLECTION).document(interaction_id))
+
+    def recent_query(self, limit=20):
+        """Query for the newest interactions across every user"""
+        return (
+            self.db.collection_group(self.COLLECTION)
+            .order_by('timestamp', direction=firestore.Query.DESCENDING)
+            .limit(limit)
+        )
+
+    def recent(self, limit=20):
+        """Newest interactions across every user"""
+        return [interaction.to_dict() for interaction in self.recent_query(limit).stream()]
+
+    def for_user(self, user_id, limit=50):
+        query = (
+            self.db.collection(UserRepository.COLLECTION).document(user_id)
+            .collection(self.COLLECTION)
+            .order_by('timestamp', direction=firestore.Query.DESCENDING)
+            .limit(limit)
+        )
+        return [interaction.to_dict() for interaction in query.stream()]
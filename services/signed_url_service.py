@@ -0,0 +1,105 @@
+import os
+import time
+import datetime
+import threading
+import collections
+import google.auth.transport.requests
+from google.oauth2 import service_account
+
+# Signed download URLs for stored PDFs, minted when a link is followed rather
+# than when a page is rendered, and cached until SIGNED_URL_REFRESH_MARGIN
+# seconds before they expire.
+#
+# With a service account key the URLs are signed locally (RSA, no network).
+# With token-only credentials (Cloud Run, GCE) the IAM signBlob API signs each
+# URL; the access token is fetched once and reused for a whole batch.
+SIGNED_URL_TTL = int(os.getenv("SIGNED_URL_TTL", str(7 * 24 * 3600)))  # v4 allows at most 7 days
+SIGNED_URL_REFRESH_MARGIN = int(os.getenv("SIGNED_URL_REFRESH_MARGIN", "3600"))
+SIGNED_URL_CACHE_SIZE = int(os.getenv("SIGNED_URL_CACHE_SIZE", "5000"))
+
+_lock = threading.Lock()
+_cache = collections.OrderedDict()  # (bucket, filename) -> (url, expires_at)
+_stats = collections.Counter()
+
+def _signing_kwargs(bucket):
+    """generate_signed_url arguments that avoid a credential lookup per URL"""
+    credentials = bucket.client._credentials
+    if isinstance(credentials, service_account.Credentials):
+        return {'credentials': credentials}
+
+    if not credentials.valid:
+        credentials.refresh(google.auth.transport.requests.Request())
+    return {
+        'service_account_email': credentials.service_account_email,
+        'access_token': credentials.token
+    }
+
+def _cached(key, now):
+    entry = _cache.get(key)
+    if entry is None:
+        return None
+    if entry[1] - SIGNED_URL_REFRESH_MARGIN <= now:
+        del _cache[key]
+        _stats['expired'] += 1
+        return None
+    _cache.move_to_end(key)
+    return entry[0]
+
+def sign_urls(bucket, filenames):
+    """
+    Return {filename: signed URL} for a batch of objects, signing only the
+    ones that are not cached (or close to expiry) with one set of credentials.
+    """
+    now = time.time()
+    urls = {}
+    missing = []
+
+    with _lock:
+        for filename in filenames:
+            url = _cached((bucket.name, filename), now)
+            if url is None:
+                missing.append(filename)
+            else:
+                urls[filename] = url
+                _stats['hits'] += 1
+
+    if not missing:
+        return urls
+
+    kwargs = _signing_kwargs(bucket)
+    expiration = datetime.timedelta(seconds=SIGNED_URL_TTL)
+    signed = {}
+    for filename in missing:
+        signed[filename] = bucket.blob(filename).generate_signed_url(
+            version="v4",
+            expiration=expiration,
+            method="GET",
+            **kwargs
+        )
+
+    with _lock:
+        for filename, url in signed.items():
+            _cache[(bucket.name, filename)] = (url, now + SIGNED_URL_TTL)
+            _cache.move_to_end((bucket.name, filename))
+        while len(_cache) > SIGNED_URL_CACHE_SIZE:
+            _cache.popitem(last=False)
+            _stats['evictions'] += 1
+        _stats['signed'] += len(signed)
+
+    urls.update(signed)
+    return urls
+
+def get_signed_url(bucket, filename):
+    """Signed GET URL for one object, from the cache when still valid"""
+    return sign_urls(bucket, [filename])[filename]
+
+def signed_url_stats():
+    """Counters for the signed URL cache, for diagnostics"""
+    with _lock:
+        return {
+            'cached': len(_cache),
+            'hits': _stats['hits'],
+            'signed': _stats['signed'],
+            'expired': _stats['expired'],
+            'evictions': _stats['evictions'],
+        }
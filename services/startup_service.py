@@ -0,0 +1,88 @@
+import os
+import time
+import threading
+import config
+from services import firebase_service
+
+# Backends are connected lazily on first use. STARTUP_WARMUP decides whether a
+# worker also connects them ahead of the first request:
+#   background  connect on daemon threads while the worker starts serving
+#   blocking    connect before the app finishes importing (the old behaviour)
+#   off         connect only when a request needs them
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "background")
+
+_lock = threading.Lock()
+_started_pid = None
+_warmup = {}  # backend -> {'state', 'duration_ms', 'error'}
+
+def _connect_firestore(log_message):
+    return firebase_service.ensure_firebase(log_message)
+
+def _connect_storage(log_message):
+    return config.get_storage_bucket() is not None
+
+BACKENDS = {
+    'firestore': _connect_firestore,
+    'storage': _connect_storage,
+}
+
+def _warm(name, connect, log_message):
+    started = time.perf_counter()
+    try:
+        connected = connect(log_message)
+        error = None
+    except Exception as e:
+        connected = False
+        error = str(e)
+    duration = round((time.perf_counter() - started) * 1000, 1)
+    _warmup[name] = {'state': 'connected' if connected else 'failed', 'duration_ms': duration, 'error': error}
+    log_message(f"Warm-up: {name} {'connected' if connected else 'unavailable'} after {duration} ms")
+
+def start_warmup(log_message=print):
+    """Connect every backend once per worker process, as STARTUP_WARMUP says"""
+    global _started_pid
+
+    if STARTUP_WARMUP == 'off' or _started_pid == os.getpid():
+        return
+    with _lock:
+        if _started_pid == os.getpid():
+            return
+        _started_pid = os.getpid()
+        for name in BACKENDS:
+            _warmup[name] = {'state': 'pending', 'duration_ms': None, 'error': None}
+
+    threads = [threading.Thread(target=_warm, args=(name, connect, log_message),
+                                name=f"warmup-{name}", daemon=True)
+               for name, connect in BACKENDS.items()]
+    for thread in threads:
+        thread.start()
+    if STARTUP_WARMUP == 'blocking':
+        for thread in threads:
+            thread.join()
+
+def readiness():
+    """
+    Which backends are connected right now. The worker is ready once Firestore
+    is; storage only backs PDF downloads and uploads.
+    """
+    storage = config.storage_status()
+    firestore = firebase_service.firebase_status()
+    backends = {
+        'firestore': {
+            'connected': firestore['initialized'],
+            'connect_ms': firestore['init_duration_ms'],
+        },
+        'storage': {
+            'connected': storage['connected'],
+            'bucket': storage['bucket'],
+            'connect_ms': storage['connect_ms'],
+            'error': storage['error'],
+        },
+    }
+    for name, backend in backends.items():
+        backend['warmup'] = _warmup.get(name, {}).get('state', 'not started')
+    return {
+        'ready': backends['firestore']['connected'],
+        'warmup': STARTUP_WARMUP,
+        'backends': backends,
+    }
@@ -0,0 +1,215 @@
+import os
+import sys
+import random
+import threading
+import datetime
+import collections
+from firebase_admin import firestore
+
+# Aggregate dashboard statistics, maintained incrementally by the write paths.
+#
+#   stats/global/shards/{n}              total_users, total_plans
+#   stats_daily/{YYYY-MM-DD}/shards/{n}  active_users, plans
+#   stats_daily/{YYYY-MM-DD}/active/{id} marker: user already counted as active that day
+#
+# Counters are spread over NUM_SHARDS documents so concurrent writers rarely
+# contend on the same document; readers sum the shards.
+NUM_SHARDS = int(os.getenv("STATS_NUM_SHARDS", "10"))
+
+STATS_COLLECTION = 'stats'
+DAILY_COLLECTION = 'stats_daily'
+
+def day_key(day=None):
+    """Bucket key for a day, using the same local date the dashboard uses"""
+    day = day or datetime.datetime.now().date()
+    return day.strftime('%Y-%m-%d')
+
+def _global_shard_ref(db, shard):
+    return db.collection(STATS_COLLECTION).document('global').collection('shards').document(str(shard))
+
+def _daily_shard_ref(db, day, shard):
+    return db.collection(DAILY_COLLECTION).document(day).collection('shards').document(str(shard))
+
+def active_marker_ref(db, user_id, day=None):
+    """Marker document recording that a user was already counted active on a day"""
+    return db.collection(DAILY_COLLECTION).document(day or day_key()).collection('active').document(user_id)
+
+# Users this process has already seen counted active today. Only ever used to
+# skip the marker read: a user missing here still goes through the
+# transaction, which checks the marker itself.
+_active_lock = threading.Lock()
+_active_day = None
+_active_users = set()
+
+def known_active(user_id, day=None):
+    """Whether this process already recorded the user as active on `day`"""
+    day = day or day_key()
+    with _active_lock:
+        return _active_day == day and user_id in _active_users
+
+def remember_active(user_id, day=None):
+    global _active_day, _active_users
+    day = day or day_key()
+    with _active_lock:
+        if _active_day != day:
+            _active_day = day
+            _active_users = set()
+        _active_users.add(user_id)
+
+def _increment(writer, ref, counts):
+    counts = {field: firestore.Increment(value) for field, value in counts.items() if value}
+    if counts:
+        writer.set(ref, counts, merge=True)
+
+def record_user_saved(writer, db, user_id, is_new, first_today, day=None):
+    """
+    Queue counter updates for a user profile write on a transaction or batch.
+    The caller decides is_new/first_today from reads made in the same transaction.
+    """
+    day = day or day_key()
+    shard = random.randrange(NUM_SHARDS)
+
+    if is_new:
+        _increment(writer, _global_shard_ref(db, shard), {'total_users': 1})
+
+    if first_today:
+        writer.set(active_marker_ref(db, user_id, day), {'at': firestore.SERVER_TIMESTAMP})
+        _increment(writer, _daily_shard_ref(db, day, shard), {'active_users': 1})
+
+def record_plan_created(writer, db, day=None, count=1):
+    """Queue counter updates for newly stored PDF plans on a transaction or batch"""
+    day = day or day_key()
+    shard = random.randrange(NUM_SHARDS)
+    _increment(writer, _global_shard_ref(db, shard), {'total_plans': count})
+    _increment(writer, _daily_shard_ref(db, day, shard), {'plans': count})
+
+def _dashboard_refs(db, day):
+    refs = [_global_shard_ref(db, n) for n in range(NUM_SHARDS)]
+    refs += [_daily_shard_ref(db, day, n) for n in range(NUM_SHARDS)]
+    return refs
+
+def shard_collections(db, day=None):
+    """The collections of global and daily counter shards, for listeners"""
+    return (db.collection(STATS_COLLECTION).document('global').collection('shards'),
+            db.collection(DAILY_COLLECTION).document(day or day_key()).collection('shards'))
+
+def sum_dashboard_shards(snapshots):
+    """Dashboard counters from global and daily shard snapshots"""
+    totals = collections.Counter()
+    for snapshot in snapshots:
+        if snapshot.exists:
+            for field, value in (snapshot.to_dict() or {}).items():
+                if isinstance(value, (int, float)):
+                    totals[field] += value
+
+    return {
+        'total_users': int(totals['total_users']),
+        'total_plans': int(totals['total_plans']),
+        'active_today': int(totals['active_users']),
+        'plans_today': int(totals['plans'])
+    }
+
+def get_dashboard_stats(db, day=None):
+    """
+    Read the dashboard counters. Costs 2 * NUM_SHARDS document reads in a single
+    batched get, independent of the number of users.
+    """
+    return sum_dashboard_shards(db.get_all(_dashboard_refs(db, day or day_key())))
+
+async def get_dashboard_stats_async(db, day=None):
+    """get_dashboard_stats for an AsyncClient"""
+    refs = _dashboard_refs(db, day or day_key())
+    return sum_dashboard_shards([snapshot async for snapshot in db.get_all(refs)])
+
+def _to_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return None
+
+def _write_shards(batch_writer, db, shard_ref, counts):
+    """Store the full count on shard 0 and reset the remaining shards"""
+    batch_writer(shard_ref(0), counts)
+    zeroes = {field: 0 for field in counts}
+    for shard in range(1, NUM_SHARDS):
+        batch_writer(shard_ref(shard), zeroes)
+
+def rebuild_stats(db, log_message=print):
+    """
+    Backfill/reconcile the counters from a full scan of the users collection.
+    Safe to re-run; concurrent writes during the scan may need another pass.
+    """
+    today = datetime.datetime.now().date()
+    total_users = 0
+    total_plans = 0
+    plans_per_day = collections.Counter()
+    active_per_day = collections.Counter()
+    active_today_ids = []
+
+    for user in db.collection('users').stream():
+        user_data = user.to_dict() or {}
+        total_users += 1
+
+        last_updated = _to_date(user_data.get('last_updated'))
+        if last_updated:
+            # Only the most recent activity day is known for each user
+            active_per_day[day_key(last_updated)] += 1
+            if last_updated == today:
+                active_today_ids.append(user.id)
+
+        pdf_plans = user_data.get('pdf_plans', [])
+        if not isinstance(pdf_plans, list):
+            continue
+        for plan in pdf_plans:
+            if not isinstance(plan, dict):
+                continue
+            total_plans += 1
+            created = _to_date(plan.get('created_at'))
+            if created:
+                plans_per_day[day_key(created)] += 1
+
+    batch = db.batch()
+    pending = 0
+
+    def write(ref, data):
+        nonlocal batch, pending
+        batch.set(ref, data)
+        pending += 1
+        if pending >= 500:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+
+    _write_shards(write, db, lambda n: _global_shard_ref(db, n),
+                  {'total_users': total_users, 'total_plans': total_plans})
+
+    days = set(plans_per_day) | set(active_per_day)
+    for day in days:
+        _write_shards(write, db, lambda n, day=day: _daily_shard_ref(db, day, n),
+                      {'active_users': active_per_day[day], 'plans': plans_per_day[day]})
+
+    for user_id in active_today_ids:
+        write(active_marker_ref(db, user_id, day_key(today)), {'at': firestore.SERVER_TIMESTAMP})
+
+    if pending:
+        batch.commit()
+
+    log_message(f">>> Rebuilt stats: {total_users} users, {total_plans} plans, "
+                f"{len(days)} daily buckets")
+    return {'total_users': total_users, 'total_plans': total_plans}
+
+# Backfill or reconcile the counters: python -m services.stats_service rebuild
+if __name__ == "__main__":
+    from services.firebase_service import get_db
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print("Usage: python -m services.stats_service rebuild")
+        sys.exit(1)
+
+    database = get_db()
+    if database is None:
+        print("Firebase initialization failed")
+        sys.exit(1)
+
+    print(rebuild_stats(database))
@@ -1,7 +1,7 @@
-import time
-import uuid
+import os
 import datetime
 import config
+from services import upload_service
 
 # In storage_service.py
 def upload_pdf_to_storage(pdf_bytes, user_profile, log_message=print):
@@ -13,13 +13,9 @@ def upload_pdf_to_storage(pdf_bytes, user_profile, log_message=print):
         return None
     
     try:
-        # Generate a unique filename
-        filename = f"plan_{user_profile.get('name', 'user')}_{int(time.time())}_{str(uuid.uuid4())[:8]}.pdf"
-        filename = filename.replace(' ', '_').lower()
-        
-        # Create a new blob and upload the PDF
-        blob = bucket.blob(filename)
-        blob.upload_from_string(pdf_bytes, content_type='application/pdf')
+        # Stored under its content hash on the upload pool; identical PDFs are stored once
+        result = upload_service.submit_upload(bucket, pdf_bytes, prefix='', log_message=log_message).result()
+        filename = result['filename']
         
         # Create a download URL through our own application
         # This assumes our app is deployed at a URL like https://fuelqpro-xxxx-xx.a.run.app
@@ -0,0 +1,161 @@
+import os
+import sys
+import random
+import datetime
+import bcrypt
+from services import normalization_service, plan_service, stats_service
+from services.interaction_recorder import new_interaction
+
+# Synthetic athletes for the memory backend and for benchmarks: users with the
+# profile the bot collects (config.STEPS), their plans (embedded in pdf_plans
+# and in the plans index) and their interactions, plus the dashboard counters
+# and an 'admin' console login. Output is deterministic for a given seed.
+#
+# A MemoryFirestore is filled in bulk with load(); any other client gets
+# batched writes, so the same data can be seeded into the emulator.
+BATCH_SIZE = 500
+
+EXPERIENCE = ['Iniciante', 'Intermediário', 'Avançado']
+SPORTS = ['Ciclismo', 'Corrida', 'Natação', 'Triathlon', 'MTB', 'Musculação']
+EVENTS = ['Corrida 5k', 'Corrida 10k', 'Meia maratona', 'Maratona', 'Ciclismo', 'MTB', 'Triathlon']
+GENDERS = ['Masculino', 'Feminino']
+DIETS = ['Como de tudo', 'Vegano', 'Vegetariano', 'Low carb']
+ALLERGIES = ['Nenhuma', 'Lactose', 'Glúten', 'Amendoim']
+NAMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Felipe', 'Gabriela', 'Heitor', 'Isabela', 'João',
+         'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sofia', 'Tiago', 'Vitória', 'Yuri']
+
+MESSAGE_TYPES = ['text', 'text', 'text', 'button', 'document']
+
+def _profile(rng, user_id):
+    return {
+        'name': f"{rng.choice(NAMES)} {user_id[-4:]}",
+        'age': str(rng.randint(16, 70)),
+        'experience': rng.choice(EXPERIENCE),
+        'sports': ', '.join(rng.sample(SPORTS, rng.randint(1, 3))),
+        'events': rng.choice(EVENTS),
+        'gender': rng.choice(GENDERS),
+        'weight': str(rng.randint(45, 110)),
+        'height': str(rng.randint(150, 200)),
+        'diet': rng.choice(DIETS),
+        'allergies': rng.choice(ALLERGIES),
+        'carb_adapted': rng.choice(['Sim', 'Não']),
+        'training_hours': str(rng.randint(2, 20)),
+        'cramps': rng.choice(['Sim', 'Não']),
+        'plan_type': rng.choice(['Diário', 'Semanal']),
+        'whatsapp_id': user_id
+    }
+
+def _moment(rng, now, days):
+    return now - datetime.timedelta(seconds=rng.randint(0, days * 86400))
+
+def _user_documents(rng, index, now, plans_per_user, interactions_per_user):
+    """{path: data} for one user with their plans and interactions"""
+    user_id = f"55{11900000000 + index}"
+    profile = _profile(rng, user_id)
+    created_at = _moment(rng, now, 365)
+
+    plans = []
+    for _ in range(rng.randint(0, 2 * plans_per_user)):
+        filename = f"plans/{rng.getrandbits(256):064x}.pdf"
+        plans.append({
+            'id': f"{rng.getrandbits(128):032x}",
+            'filename': filename,
+            'created_at': created_at + (now - created_at) * rng.random(),
+            'url': f"https://storage.googleapis.com/fuelqpro.firebasestorage.app/{filename}",
+            'sha256': filename[6:70]
+        })
+    plans.sort(key=lambda plan: plan['created_at'])
+
+    documents = {f"users/{user_id}": {
+        'profile': profile,
+        'normalized': normalization_service.normalize_profile(profile),
+        'step': len(profile) - 1,
+        'pdf_plans': plans,
+        'plan_count': len(plans),
+        'created_at': created_at,
+        'last_updated': _moment(rng, now, 30) if rng.random() > 0.1 else now
+    }}
+    for plan in plans:
+        plan_path = f"{plan_service.PLANS_COLLECTION}/{plan_service.plan_doc_id(user_id, plan)}"
+        documents[plan_path] = plan_service.plan_index_entry(
+            user_id, profile['name'], plan, size=rng.randint(40000, 400000))
+
+    for _ in range(rng.randint(0, 2 * interactions_per_user)):
+        interaction = new_interaction(user_id, rng.choice(MESSAGE_TYPES),
+                                      f"mensagem {rng.randint(0, 10 ** 6)}", f"resposta {rng.randint(0, 10 ** 6)}")
+        interaction['id'] = f"{rng.getrandbits(128):032x}"
+        interaction['data']['timestamp'] = _moment(rng, now, 90)
+        documents[f"users/{user_id}/interactions/{interaction['id']}"] = interaction['data']
+    return documents
+
+def _writer(db):
+    """Return write(documents) and flush() for the client"""
+    if hasattr(db, 'load'):
+        return db.load, lambda: None
+
+    pending = []
+
+    def flush():
+        batch = db.batch()
+        for path, data in pending:
+            batch.set(db.document(path), data)
+        batch.commit()
+        pending.clear()
+
+    def write(documents):
+        for item in documents.items():
+            pending.append(item)
+            if len(pending) >= BATCH_SIZE:
+                flush()
+
+    return write, lambda: pending and flush()
+
+def generate(db, users, plans_per_user=2, interactions_per_user=10, seed=1,
+             admin_password='admin', log_message=print):
+    """
+    Seed `users` athletes (on average plans_per_user plans and
+    interactions_per_user interactions each), rebuild the counters and
+    create the 'admin' login. Returns the number of documents written.
+    """
+    rng = random.Random(seed)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    write, flush = _writer(db)
+    written = 0
+
+    for index in range(users):
+        documents = _user_documents(rng, index, now, plans_per_user, interactions_per_user)
+        write(documents)
+        written += len(documents)
+        if (index + 1) % 100000 == 0:
+            log_message(f">>> Generated {index + 1} of {users} users")
+
+    write({'admin_users/admin_user': {
+        'username': 'admin',
+        'password': bcrypt.hashpw(admin_password.encode('utf-8'), bcrypt.gensalt(rounds=4)).decode('utf-8'),
+        'name': 'Administrator',
+        'email': 'admin@example.com',
+        'created_at': now,
+        'last_login': None
+    }})
+    flush()
+
+    stats_service.rebuild_stats(db, log_message=log_message)
+    log_message(f">>> Generated {users} users ({written + 1} documents)")
+    return written + 1
+
+# Seed the emulator: FIRESTORE_EMULATOR_HOST=localhost:8080 python -m services.synthetic_data 10000
+if __name__ == "__main__":
+    from services.firebase_service import get_db
+
+    if len(sys.argv) < 2 or not sys.argv[1].isdigit():
+        print("Usage: python -m services.synthetic_data <users> [plans_per_user] [interactions_per_user]")
+        sys.exit(1)
+    if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        print("Refusing to write synthetic data without FIRESTORE_EMULATOR_HOST")
+        sys.exit(1)
+
+    db = get_db()
+    if db is None:
+        print("Firebase is not available")
+        sys.exit(1)
+    generate(db, int(sys.argv[1]), *(int(arg) for arg in sys.argv[2:4]))
@@ -0,0 +1,138 @@
+import io
+import os
+import time
+import hashlib
+import threading
+import collections
+import concurrent.futures
+from google.api_core.exceptions import PreconditionFailed
+
+# Background PDF uploads. Uploads run on a bounded thread pool; objects are
+# named after the SHA-256 of their content and written with
+# if_generation_match=0, so an identical PDF is stored once and a second upload
+# of it costs a single rejected request. Reports above UPLOAD_RESUMABLE_THRESHOLD
+# go up as resumable uploads in UPLOAD_CHUNK_SIZE chunks, so a failed chunk is
+# retried on its own instead of restarting the whole file.
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+# Uploads accepted beyond the running ones before submit_upload blocks
+UPLOAD_QUEUE_SIZE = int(os.getenv("UPLOAD_QUEUE_SIZE", "32"))
+# Must be a multiple of 256 KiB
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(4 * 1024 * 1024)))
+UPLOAD_RESUMABLE_THRESHOLD = int(os.getenv("UPLOAD_RESUMABLE_THRESHOLD", str(8 * 1024 * 1024)))
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(UPLOAD_WORKERS + UPLOAD_QUEUE_SIZE)
+_stats_lock = threading.Lock()
+_stats = collections.Counter()
+
+def _get_executor():
+    """One pool per worker process; a forked child gets a fresh one"""
+    global _executor, _executor_pid, _slots
+
+    if _executor_pid == os.getpid():
+        return _executor
+    with _executor_lock:
+        if _executor_pid != os.getpid():
+            _executor = concurrent.futures.ThreadPoolExecutor(max_workers=UPLOAD_WORKERS,
+                                                              thread_name_prefix="upload")
+            _slots = threading.BoundedSemaphore(UPLOAD_WORKERS + UPLOAD_QUEUE_SIZE)
+            _executor_pid = os.getpid()
+    return _executor
+
+def _count(**counts):
+    with _stats_lock:
+        _stats.update(counts)
+
+def content_name(data, prefix='plans', extension='.pdf'):
+    """Content-addressed object name: <prefix>/<sha256><extension>"""
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{prefix}/{digest}{extension}" if prefix else f"{digest}{extension}", digest
+
+def upload_bytes(bucket, data, prefix='plans', content_type='application/pdf', log_message=print):
+    """
+    Store `data` under its content hash unless an identical object exists.
+    Returns {'filename', 'sha256', 'size', 'deduplicated', 'resumable', 'duration'}.
+    """
+    started = time.perf_counter()
+    filename, digest = content_name(data, prefix)
+    blob = bucket.blob(filename)
+    resumable = len(data) >= UPLOAD_RESUMABLE_THRESHOLD
+    deduplicated = False
+
+    if resumable:
+        # Skip the transfer entirely when a large object is already stored
+        blob.chunk_size = UPLOAD_CHUNK_SIZE
+        deduplicated = blob.exists()
+
+    if not deduplicated:
+        try:
+            blob.upload_from_file(io.BytesIO(data), size=len(data), content_type=content_type,
+                                  if_generation_match=0)
+        except PreconditionFailed:
+            deduplicated = True  # Uploaded earlier, or concurrently by another worker
+
+    duration = time.perf_counter() - started
+    _count(uploads=1, deduplicated=int(deduplicated), resumable=int(resumable),
+           bytes_uploaded=0 if deduplicated else len(data))
+    if deduplicated:
+        log_message(f">>> Reusing stored object {filename}")
+    return {
+        'filename': filename,
+        'sha256': digest,
+        'size': len(data),
+        'deduplicated': deduplicated,
+        'resumable': resumable,
+        'duration': duration
+    }
+
+def submit_upload(bucket, data, prefix='plans', content_type='application/pdf',
+                  on_success=None, on_error=None, log_message=print):
+    """
+    Queue an upload on the pool and return a Future for its result.
+
+    on_success(result) runs on the upload thread once the object is stored;
+    whatever it returns becomes the Future's result (the upload result when it
+    returns None). on_error(exception) runs if the upload or on_success fails.
+    Blocks while UPLOAD_WORKERS + UPLOAD_QUEUE_SIZE uploads are pending.
+    """
+    executor = _get_executor()
+    slots = _slots
+    slots.acquire()
+    _count(submitted=1, in_flight=1)
+
+    def run():
+        try:
+            result = upload_bytes(bucket, data, prefix, content_type, log_message)
+            if on_success is not None:
+                returned = on_success(result)
+                if returned is not None:
+                    return returned
+            return result
+        except Exception as e:
+            _count(failed=1)
+            log_message(f">>> ERROR uploading {len(data)} bytes: {str(e)}")
+            if on_error is not None:
+                try:
+                    on_error(e)
+                except Exception as callback_error:
+                    log_message(f">>> ERROR in upload error callback: {str(callback_error)}")
+            raise
+        finally:
+            _count(in_flight=-1)
+            slots.release()
+
+    try:
+        return executor.submit(run)
+    except Exception:
+        _count(in_flight=-1)
+        slots.release()
+        raise
+
+def upload_stats():
+    """Counters for the upload pool, for diagnostics"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['workers'] = UPLOAD_WORKERS
+    return stats
@@ -0,0 +1,278 @@
+import os
+import copy
+import time
+import pickle
+import datetime
+import threading
+import collections
+from firebase_admin import firestore
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Read-through cache of user documents keyed by user id, so a conversation turn
+# costs the write only. Writes merge their changes into a cached copy instead of
+# dropping it; changes the cache cannot apply locally (ArrayUnion, Increment)
+# invalidate the entry.
+#
+# USER_CACHE_BACKEND:
+#   memory  bounded LRU per worker process; other workers may serve a copy up
+#           to USER_CACHE_TTL seconds old after a write
+#   redis   shared by every worker (needs the redis package and REDIS_URL)
+#   off     no caching
+USER_CACHE_BACKEND = os.getenv("USER_CACHE_BACKEND", "memory")
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_PREFIX = "fuelqpro:user:"
+
+_stats = collections.Counter()
+
+_TRANSFORMS = (firestore.ArrayUnion, firestore.ArrayRemove, firestore.Increment,
+               firestore.Maximum, firestore.Minimum)
+
+def _merge_into(document, changes):
+    """
+    Apply a set(merge=True) payload to a cached document in place. Returns
+    False when the payload holds a transform that cannot be applied locally.
+    """
+    for key, value in changes.items():
+        if value is firestore.SERVER_TIMESTAMP:
+            document[key] = datetime.datetime.now(datetime.timezone.utc)
+        elif value is firestore.DELETE_FIELD:
+            document.pop(key, None)
+        elif isinstance(value, dict) and value:
+            nested = document.get(key)
+            if not isinstance(nested, dict):
+                nested = document[key] = {}
+            if not _merge_into(nested, value):
+                return False
+        elif isinstance(value, _TRANSFORMS):
+            return False  # Applied by the server against the stored value
+        else:
+            document[key] = copy.deepcopy(value)
+    return True
+
+class _MemoryBackend:
+    """LRU of (expires_at, document) with a per-key generation to reject stale fills"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.generations = collections.OrderedDict()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[user_id]
+                _stats['expired'] += 1
+                return None
+            self.entries.move_to_end(user_id)
+            return copy.deepcopy(entry[1])
+
+    def generation(self, user_id):
+        with self.lock:
+            return self.generations.get(user_id, 0)
+
+    def _bump(self, user_id):
+        self.generations[user_id] = self.generations.get(user_id, 0) + 1
+        self.generations.move_to_end(user_id)
+        while len(self.generations) > 2 * self.max_size:
+            self.generations.popitem(last=False)
+
+    def put(self, user_id, document, generation):
+        with self.lock:
+            if self.generations.get(user_id, 0) != generation:
+                return False  # Written while this copy was being read
+            self.entries[user_id] = (time.monotonic() + self.ttl, copy.deepcopy(document))
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                _stats['evictions'] += 1
+            return True
+
+    def merge(self, user_id, changes):
+        with self.lock:
+            self._bump(user_id)
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return False
+            document = copy.deepcopy(entry[1])
+            if not _merge_into(document, changes):
+                del self.entries[user_id]
+                return False
+            self.entries[user_id] = (entry[0], document)
+            return True
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self._bump(user_id)
+            return self.entries.pop(user_id, None) is not None
+
+    def size(self):
+        return len(self.entries)
+
+class _RedisBackend:
+    """Documents pickled under REDIS_PREFIX with a TTL; a generation key guards fills"""
+
+    def __init__(self, url, ttl):
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def _key(self, user_id):
+        return REDIS_PREFIX + user_id
+
+    def _generation_key(self, user_id):
+        return REDIS_PREFIX + "gen:" + user_id
+
+    def get(self, user_id):
+        data = self.client.get(self._key(user_id))
+        return pickle.loads(data) if data is not None else None
+
+    def generation(self, user_id):
+        return int(self.client.get(self._generation_key(user_id)) or 0)
+
+    def put(self, user_id, document, generation):
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(self._generation_key(user_id))
+                if int(pipe.get(self._generation_key(user_id)) or 0) != generation:
+                    return False
+                pipe.multi()
+                pipe.set(self._key(user_id), pickle.dumps(document), ex=max(int(self.ttl), 1))
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def merge(self, user_id, changes):
+        key = self._key(user_id)
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                data = pipe.get(key)
+                document = pickle.loads(data) if data is not None else None
+                pipe.multi()
+                pipe.incr(self._generation_key(user_id))
+                pipe.expire(self._generation_key(user_id), max(int(self.ttl), 1) * 2)
+                if document is not None and _merge_into(document, changes):
+                    pipe.set(key, pickle.dumps(document), keepttl=True)
+                    merged = True
+                else:
+                    pipe.delete(key)
+                    merged = False
+                pipe.execute()
+                return merged
+            except redis.WatchError:
+                self.invalidate(user_id)
+                return False
+
+    def invalidate(self, user_id):
+        with self.client.pipeline() as pipe:
+            pipe.incr(self._generation_key(user_id))
+            pipe.expire(self._generation_key(user_id), max(int(self.ttl), 1) * 2)
+            pipe.delete(self._key(user_id))
+            return bool(pipe.execute()[-1])
+
+    def size(self):
+        return None  # Not tracked for the shared backend
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def _get_backend():
+    global _backend, USER_CACHE_BACKEND
+    if _backend is not None or USER_CACHE_BACKEND == 'off':
+        return _backend
+
+    with _backend_lock:
+        if _backend is None:
+            if USER_CACHE_BACKEND == 'redis' and redis is not None:
+                try:
+                    backend = _RedisBackend(REDIS_URL, USER_CACHE_TTL)
+                    backend.client.ping()
+                    _backend = backend
+                except Exception as e:
+                    print(f"Redis user cache unavailable, using the in-process cache: {str(e)}")
+            elif USER_CACHE_BACKEND == 'redis':
+                print("The redis package is not installed, using the in-process user cache")
+            if _backend is None:
+                USER_CACHE_BACKEND = 'memory'
+                _backend = _MemoryBackend(USER_CACHE_SIZE, USER_CACHE_TTL)
+    return _backend
+
+def _safely(operation, default=None):
+    """Cache failures must never fail the Firestore operation they front"""
+    try:
+        return operation()
+    except Exception as e:
+        _stats['errors'] += 1
+        print(f"User cache error: {str(e)}")
+        return default
+
+def get_user(user_id, loader):
+    """
+    Return a user document from the cache, or call loader() to read it from
+    Firestore and cache the result. Callers get their own copy.
+    """
+    backend = _get_backend()
+    if backend is None:
+        return loader()
+
+    document = _safely(lambda: backend.get(user_id))
+    if document is not None:
+        _stats['hits'] += 1
+        return document
+
+    _stats['misses'] += 1
+    generation = _safely(lambda: backend.generation(user_id), 0)
+    document = loader()
+    if document is not None:
+        _safely(lambda: backend.put(user_id, document, generation))
+    return document
+
+def record_write(user_id, changes):
+    """Apply a merge write to the cached copy, or invalidate it"""
+    backend = _get_backend()
+    if backend is None:
+        return
+    if _safely(lambda: backend.merge(user_id, changes), False):
+        _stats['updates'] += 1
+    else:
+        _stats['invalidations'] += 1
+
+def invalidate(user_id):
+    backend = _get_backend()
+    if backend is not None:
+        _safely(lambda: backend.invalidate(user_id))
+        _stats['invalidations'] += 1
+
+def cache_stats():
+    """
+    Counters for the user cache, shown on the dashboard. They count this
+    worker process's lookups only; entries are the shared backend's with redis.
+    """
+    backend = _get_backend()
+    lookups = _stats['hits'] + _stats['misses']
+    return {
+        'backend': USER_CACHE_BACKEND,
+        'pid': os.getpid(),
+        'lookups': lookups,
+        'size': _safely(backend.size) if backend is not None else 0,
+        'capacity': USER_CACHE_SIZE if USER_CACHE_BACKEND == 'memory' else None,
+        'ttl': USER_CACHE_TTL,
+        'hits': _stats['hits'],
+        'misses': _stats['misses'],
+        'hit_rate': round(_stats['hits'] / lookups * 100, 1) if lookups else None,
+        'evictions': _stats['evictions'],
+        'expired': _stats['expired'],
+        'updates': _stats['updates'],
+        'invalidations': _stats['invalidations'],
+        'errors': _stats['errors'],
+    }
@@ -0,0 +1,163 @@
+import os
+import sys
+from firebase_admin import firestore
+from services import normalization_service
+
+# Sort keys offered on the users page. Firestore only returns documents that
+# have the ordered field, so plan_count must be backfilled on older users.
+SORT_FIELDS = {
+    'last_updated': 'last_updated',
+    'created_at': 'created_at',
+    'plan_count': 'plan_count'
+}
+
+PAGE_SIZES = [25, 50, 100, 200]
+DEFAULT_PAGE_SIZE = 50
+
+# Filters that cannot be expressed as Firestore equality queries are applied
+# while scanning; this caps how many documents one page may scan.
+MAX_SCAN_MULTIPLIER = 10
+
+# Users with plans whose plans /plans-diagnostic inspects per page load
+DIAGNOSTIC_MAX_USERS = int(os.getenv("DIAGNOSTIC_MAX_USERS", "500"))
+
+def _matches_sport(user_data, sport):
+    profile = user_data.get('profile')
+    if not isinstance(profile, dict):
+        return False
+    return sport.lower() in str(profile.get('sports', '')).lower()
+
+def _has_plans(user_data):
+    plan_count = user_data.get('plan_count')
+    if plan_count is None:
+        pdf_plans = user_data.get('pdf_plans')
+        plan_count = len(pdf_plans) if isinstance(pdf_plans, list) else 0
+    return plan_count > 0
+
+def list_users_page(db, sort='last_updated', direction='desc', filters=None,
+                    page_size=DEFAULT_PAGE_SIZE, cursor=None):
+    """
+    Return one page of users ordered by `sort`, starting after the document id
+    in `cursor`. Memory and reads are bounded by the page size (times
+    MAX_SCAN_MULTIPLIER when the sport/has-plans filters are used).
+
+    Returns (users, next_cursor, scanned).
+    """
+    filters = filters or {}
+    sort_field = SORT_FIELDS.get(sort, 'last_updated')
+    order = firestore.Query.ASCENDING if direction == 'asc' else firestore.Query.DESCENDING
+    page_size = page_size if page_size in PAGE_SIZES else DEFAULT_PAGE_SIZE
+
+    query = db.collection('users')
+
+    # Equality filters run server-side, on the canonical answers save_user_data
+    # stores under 'normalized' (users saved before it need the normalization backfill)
+    for field in ('experience', 'gender'):
+        if filters.get(field):
+            value = normalization_service.normalize_value(field, filters[field])
+            query = query.where(f"normalized.{field}", '==', value)
+
+    post_filters = []
+    if filters.get('sport'):
+        post_filters.append(lambda data, sport=filters['sport']: _matches_sport(data, sport))
+
+    has_plans = filters.get('has_plans')
+    if has_plans == 'no':
+        query = query.where('plan_count', '==', 0)
+    elif has_plans == 'yes':
+        if sort_field == 'plan_count':
+            # An inequality is only allowed on the first ordered field
+            query = query.where('plan_count', '>', 0)
+        else:
+            post_filters.append(_has_plans)
+
+    query = query.order_by(sort_field, direction=order)
+
+    if cursor:
+        cursor_doc = db.collection('users').document(cursor).get()
+        if cursor_doc.exists:
+            query = query.start_after(cursor_doc)
+
+    users = []
+    scanned = 0
+    last_doc = None
+    exhausted = False
+    max_scan = page_size * (MAX_SCAN_MULTIPLIER if post_filters else 1)
+
+    while len(users) < page_size and scanned < max_scan:
+        batch_query = query.start_after(last_doc) if last_doc else query
+        batch = list(batch_query.limit(page_size).stream())
+        if not batch:
+            exhausted = True
+            break
+
+        for doc in batch:
+            scanned += 1
+            last_doc = doc
+            user_data = doc.to_dict()
+            if not user_data:
+                continue
+            if not all(check(user_data) for check in post_filters):
+                continue
+
+            user_data['id'] = doc.id
+
+            # Sanitize user data to prevent template rendering errors
+            if 'profile' in user_data and not isinstance(user_data['profile'], dict):
+                user_data['profile'] = {}
+            if 'pdf_plans' in user_data and not isinstance(user_data['pdf_plans'], list):
+                user_data['pdf_plans'] = []
+
+            users.append(user_data)
+            if len(users) >= page_size:
+                break
+
+        if len(batch) < page_size:
+            # End of the collection, unless the page filled up mid-batch
+            exhausted = last_doc is batch[-1]
+            break
+
+    next_cursor = None if exhausted or last_doc is None else last_doc.id
+    return users, next_cursor, scanned
+
+def backfill_plan_counts(db, log_message=print):
+    """Set plan_count on every user document so it can be sorted and filtered on"""
+    batch = db.batch()
+    pending = 0
+    updated = 0
+
+    for user in db.collection('users').stream():
+        user_data = user.to_dict() or {}
+        pdf_plans = user_data.get('pdf_plans', [])
+        plan_count = len(pdf_plans) if isinstance(pdf_plans, list) else 0
+        if user_data.get('plan_count') == plan_count:
+            continue
+
+        batch.update(user.reference, {'plan_count': plan_count})
+        pending += 1
+        updated += 1
+        if pending >= 500:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+
+    if pending:
+        batch.commit()
+
+    log_message(f">>> Backfilled plan_count on {updated} users")
+    return updated
+
+# Backfill plan_count: python -m services.user_service backfill-plan-counts
+if __name__ == "__main__":
+    from services.firebase_service import get_db
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'backfill-plan-counts':
+        print("Usage: python -m services.user_service backfill-plan-counts")
+        sys.exit(1)
+
+    database = get_db()
+    if database is None:
+        print("Firebase initialization failed")
+        sys.exit(1)
+
+    backfill_plan_counts(database)